@@ -0,0 +1,185 @@
+import functools
+import os
+import signal
+import tempfile
+import time
+import unittest
+import numpy as np
+import simpleGA as ga
+from testfunctions import Rastrigin
+
+
+class Sphere:
+    def evaluatePopulation(self, v):
+        return np.sum(np.asarray(v)**2, axis = 1)
+
+
+class CrashOnce:
+    # Sphere whose first batch kills the worker process evaluating it
+    def __init__(self, flag: str) -> None:
+        self.flag = flag
+
+    def evaluatePopulation(self, v):
+        if(not os.path.exists(self.flag)):
+            open(self.flag, 'w').close()
+            os._exit(1)
+
+        return Sphere().evaluatePopulation(v)
+
+
+class RejectNaN:
+    def evaluatePopulation(self, v):
+        if(np.isnan(v).any()):
+            raise ValueError('nan in the population')
+
+        return Sphere().evaluatePopulation(v)
+
+
+class CrashAlways:
+    def evaluatePopulation(self, v):
+        os._exit(1)
+
+
+class VectorPopulationTest(unittest.TestCase):
+    def setUp(self):
+        self.chromosomes = np.array([[3.0, 0.0], [1.0, 0.0], [0.0, 2.0], [0.0, 0.0], [4.0, 4.0]])
+        self.population = ga.VectorPopulation(self.chromosomes.copy(), Sphere())
+
+    def testTruncationSelection(self):
+        parents, rejected = self.population.truncationSelection(2)
+
+        # lowest fitness first, every organism in one of the two
+        self.assertEqual(parents.shape, (2, 2))
+        self.assertEqual(rejected.shape, (3, 2))
+        np.testing.assert_array_equal(parents, [[0.0, 0.0], [1.0, 0.0]])
+        np.testing.assert_array_equal(rejected, [[0.0, 2.0], [3.0, 0.0], [4.0, 4.0]])
+        np.testing.assert_array_equal(self.population.fitness, [9.0, 1.0, 4.0, 0.0, 32.0])
+
+    def testGeneration(self):
+        algorithm = ga.VectorGeneticAlgorithm(self.population, selectPer = 0.4, seed = 1)
+        parents, _ = algorithm.generation()
+
+        self.assertEqual(self.population.chromosomes.shape, (5, 2))
+        np.testing.assert_array_equal(self.population.chromosomes[:2], parents)
+
+    def testSeeded(self):
+        runs = []
+        for _ in range(2):
+            algorithm = ga.VectorGeneticAlgorithm.initRandomPop(
+                50, {'len': 3, 'min': -5.0, 'max': 5.0}, Sphere(), seed = 7
+            )
+            for _ in range(5):
+                algorithm.generation()
+
+            runs.append(algorithm.population.chromosomes)
+
+        np.testing.assert_array_equal(runs[0], runs[1])
+
+
+class VectorDifferentialEvolutionTest(unittest.TestCase):
+    def makeDE(self, popSize: int, seed: int = 3):
+        chromosomes = np.zeros((popSize, 2))
+        return ga.VectorDifferentialEvolution(ga.VectorPopulation(chromosomes, Sphere()), p = 0.9, w = 0.5, seed = seed)
+
+    def testDonorIndices(self):
+        for popSize in [4, 5, 30]:
+            donors = self.makeDE(popSize).donorIndices(3)
+
+            self.assertEqual(donors.shape, (popSize, 3))
+            self.assertTrue(np.all((donors >= 0) & (donors < popSize)))
+            # never the organism itself, never the same donor twice
+            self.assertFalse(np.any(donors == np.arange(popSize)[:, None]))
+            self.assertTrue(np.all(np.sort(donors, axis = 1)[:, 1:] != np.sort(donors, axis = 1)[:, :-1]))
+
+    def testDonorsUniform(self):
+        de = self.makeDE(5)
+        counts = np.zeros((5, 5))
+        for _ in range(2000):
+            donors = de.donorIndices(3)
+            for k in range(3):
+                counts[np.arange(5), donors[:, k]] += 1
+
+        # 3 of the 4 other organisms, each chosen in 3/4 of the draws
+        np.testing.assert_array_equal(np.diag(counts), 0)
+        offDiagonal = counts[~np.eye(5, dtype = bool)]
+        self.assertTrue(np.all(np.abs(offDiagonal / 2000 - 0.75) < 0.05))
+
+    def testPopulationTooSmall(self):
+        with self.assertRaises(ValueError):
+            self.makeDE(3).donorIndices(3)
+
+
+class EvaluatorTest(unittest.TestCase):
+    BACKENDS = ['serial', 'threads', 'processes', 'workers']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.v = np.random.default_rng(2).uniform(-5.0, 5.0, size = (200, 4))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testAbstract(self):
+        with self.assertRaises(TypeError):
+            ga.Evaluator(Sphere)
+
+    def testSameRunOnAllBackends(self):
+        runs = []
+        for backend in self.BACKENDS:
+            factory = functools.partial(Rastrigin, 4, None, None, True)
+            with ga.makeEvaluator(backend, factory, workers = 2, batchSize = 16) as evaluator:
+                de = ga.VectorDifferentialEvolution.initRandomPop(
+                    40, {'len': 4, 'min': -5.12, 'max': 5.12}, evaluator, p = 0.9, w = 0.5, seed = 11
+                )
+                for _ in range(5):
+                    de.crossover()
+
+                runs.append(de.population.chromosomes)
+
+        for backend, run in zip(self.BACKENDS[1:], runs[1:]):
+            with self.subTest(backend = backend):
+                np.testing.assert_array_equal(run, runs[0])
+
+    def testCrashRetried(self):
+        for backend in ['processes', 'workers']:
+            with self.subTest(backend = backend):
+                factory = functools.partial(CrashOnce, os.path.join(self.tmp.name, backend))
+                with ga.makeEvaluator(backend, factory, workers = 2, batchSize = 16) as evaluator:
+                    np.testing.assert_array_equal(evaluator.evaluatePopulation(self.v), Sphere().evaluatePopulation(self.v))
+                    self.assertGreaterEqual(evaluator.restarts, 1)
+
+    def testIdleWorkerKilled(self):
+        expected = Sphere().evaluatePopulation(self.v)
+        for backend in ['processes', 'workers']:
+            with self.subTest(backend = backend):
+                with ga.makeEvaluator(backend, Sphere, workers = 2, batchSize = 16) as evaluator:
+                    np.testing.assert_array_equal(evaluator.evaluatePopulation(self.v), expected)
+
+                    processes = evaluator.context.processes if backend == 'processes' else [p for p, _ in evaluator.workers]
+                    os.kill(processes[0].pid, signal.SIGKILL)
+                    processes[0].join()
+                    time.sleep(0.1)
+
+                    np.testing.assert_array_equal(evaluator.evaluatePopulation(self.v), expected)
+
+    def testFitnessError(self):
+        bad = self.v.copy()
+        bad[5, 0] = np.nan
+        for backend in ['processes', 'workers']:
+            with self.subTest(backend = backend):
+                with ga.makeEvaluator(backend, RejectNaN, workers = 2, batchSize = 16) as evaluator:
+                    with self.assertRaises((ValueError, RuntimeError)):
+                        evaluator.evaluatePopulation(bad)
+
+                    np.testing.assert_array_equal(evaluator.evaluatePopulation(self.v), Sphere().evaluatePopulation(self.v))
+
+    def testRetriesExhausted(self):
+        for backend in ['processes', 'workers']:
+            with self.subTest(backend = backend):
+                with ga.makeEvaluator(backend, CrashAlways, workers = 2, retries = 1) as evaluator:
+                    with self.assertRaises(RuntimeError):
+                        evaluator.evaluatePopulation(self.v)
+
+
+if __name__ == '__main__':
+    unittest.main()
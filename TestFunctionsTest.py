@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+import simpleGA as ga
+import testfunctions as tf
+
+
+class SingleOnly:
+    # fitness function without a batched evaluatePopulation
+    def __init__(self, function: tf.Function2D) -> None:
+        self.function = function
+
+    def evaluateSingle(self, v):
+        return self.function.evaluateSingle(v)
+
+
+class Function2DTest(unittest.TestCase):
+    def testEvaluatePopulation(self):
+        generator = np.random.default_rng(5)
+        for function in [tf.ShafferF62D(3.0, -2.0), tf.Rastrigin2D(1.5, 0.5)]:
+            # about a third of the rows out of range
+            v = generator.uniform(function.xmin * 1.2, function.xmax * 1.2, size = (200, 2))
+            original = v.copy()
+
+            fitness = function.evaluatePopulation(v)
+            np.testing.assert_array_equal(v, original)
+
+            for row, value in zip(v, fitness):
+                try:
+                    self.assertAlmostEqual(value, function.evaluateSingle(row))
+                except tf.ValueOutOFRange:
+                    self.assertEqual(value, np.finfo('float32').min)
+
+            np.testing.assert_array_equal(v, original)
+
+    def testPenalty(self):
+        function = tf.Rastrigin2D()
+        fitness = function.evaluatePopulation(np.array([[0.0, 0.0], [200.0, 0.0], [0.0, -200.0]]), penalty = -1.0)
+
+        np.testing.assert_array_equal(fitness[1:], [-1.0, -1.0])
+        self.assertNotEqual(fitness[0], -1.0)
+
+    def testSameAsSingleFallback(self):
+        function = tf.Rastrigin2D()
+        v = np.random.default_rng(6).uniform(-6.0, 6.0, size = (100, 2))
+
+        np.testing.assert_array_equal(ga.evaluatePopulation(function, v), ga.evaluatePopulation(SingleOnly(function), v))
+
+
+class FunctionNDTest(unittest.TestCase):
+    def testErrorAtOptimum(self):
+        for name, functionClass in tf.FUNCTIONS_ND.items():
+            for dim in [2, 10, 25]:
+                for rotate in [False, True]:
+                    for maximize in [False, True]:
+                        with self.subTest(name = name, dim = dim, rotate = rotate, maximize = maximize):
+                            function = functionClass.shiftedRotated(dim, dim, rotate, maximize)
+                            optimum = function.optimum
+
+                            self.assertTrue(np.all(np.abs(optimum) <= function.bound))
+                            self.assertAlmostEqual(function.error(function.evaluatePopulation(optimum[None, :]))[0], 0.0, places = 6)
+                            self.assertAlmostEqual(function.error(function.evaluateSingle(optimum)), 0.0, places = 6)
+
+    def testSchwefelNotRotated(self):
+        self.assertIsNone(tf.Schwefel.shiftedRotated(10, 3, True).rotation)
+
+        with self.assertRaises(ValueError):
+            tf.Schwefel(10, None, tf.randomRotation(10, np.random.default_rng(3)))
+
+    def testPenalty(self):
+        for maximize in [False, True]:
+            function = tf.Sphere(3, maximize = maximize)
+            v = np.array([[0.0, 0.0, 0.0], [6.0, 0.0, 0.0], [1.0, 1.0, 1.0]])
+            original = v.copy()
+
+            fitness = function.evaluatePopulation(v)
+            worst = np.finfo('float32').min if maximize else np.finfo('float32').max
+
+            np.testing.assert_array_equal(fitness, [0.0, worst, -3.0 if maximize else 3.0])
+            np.testing.assert_array_equal(v, original)
+
+            with self.assertRaises(tf.ValueOutOFRange):
+                function.evaluateSingle(v[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
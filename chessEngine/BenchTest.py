@@ -0,0 +1,40 @@
+import unittest
+import chess
+import search as s
+from bench import PERFT_SUITE, perft, divide, runBench
+
+
+class PerftTest(unittest.TestCase):
+    def testSuite(self):
+        for name, fen, expected in PERFT_SUITE:
+            with self.subTest(name = name):
+                self.assertEqual(perft(chess.Board(fen), 2), expected[1])
+
+    def testHashVerified(self):
+        # castling, en passant and promotions below the roots
+        zobrist = s.ZobristHash()
+        for name, fen, expected in PERFT_SUITE[1:4]:
+            with self.subTest(name = name):
+                self.assertEqual(perft(chess.Board(fen), 2, zobrist), expected[1])
+
+    def testDivide(self):
+        counts = divide(chess.Board(), 2)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(counts['e2e4'], 20)
+        self.assertEqual(sum(counts.values()), 400)
+
+    def testBenchDeterministic(self):
+        fens = [PERFT_SUITE[0][1], PERFT_SUITE[1][1]]
+        self.assertEqual(runBench(fens, 2, 1)[0], runBench(fens, 2, 1)[0])
+
+    def testBenchIndependentOfOrder(self):
+        fens = [
+            '2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28',
+            '4rr2/1p1bqnk1/p1p2n2/2Pp1ppp/1P1P1N1P/3BPRQ1/P5P1/4RNK1 b - - 0 27',
+            'r1bq1rk1/1pp1p1bp/n2p1np1/p2P1p2/2PN4/6P1/PP2PPBP/RNBQ1RK1 w - - 2 9'
+        ]
+        self.assertEqual(runBench(fens, 3, 1)[0], runBench(fens[::-1], 3, 1)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import chess
+import evalfuction as ef
+from engine import Engine
+
+
+class EngineTest(unittest.TestCase):
+    FENS = [
+        '6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1',
+        '4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1',
+        '2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28',
+        # checkmated, no move
+        'R5k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1',
+    ]
+
+    def setUp(self):
+        self.e = Engine(2, hashSizeMB = 1)
+
+    def testBestMove(self):
+        self.assertEqual(self.e.bestmove(self.FENS[0]), 'Ra8#')
+
+    def testBatchSameAsSerial(self):
+        serial = list(self.e.analyseBatch(self.FENS, processes = 1))
+        parallel = list(self.e.analyseBatch(self.FENS, processes = 2, ordered = False))
+        parallel = sorted(parallel, key = lambda r: r.index)
+
+        self.assertEqual([r.uci for r in serial], [r.uci for r in parallel])
+        self.assertEqual([r.score for r in serial], [r.score for r in parallel])
+        self.assertEqual(serial[0].san, 'Ra8#')
+        self.assertEqual(serial[0].depth, 2)
+        self.assertIsNone(serial[3].uci)
+
+    def testIndependentOfOrder(self):
+        forward = list(self.e.analyseBatch(self.FENS[:3], processes = 1))
+        backward = list(self.e.analyseBatch(self.FENS[2::-1], processes = 1))[::-1]
+
+        self.assertEqual([(r.uci, r.score, r.nodes) for r in forward], [(r.uci, r.score, r.nodes) for r in backward])
+
+    def testWorkersConfigured(self):
+        self.e.ns.evaluation = ef.EvalFunc(ef.Parameters(pPass = 0), mobility = ef.EvalFunc.MOBILITY_LEGAL, pawnHashEntries = 0)
+        self.e.ns.qsearchChecks = True
+
+        serial = list(self.e.analyseBatch(self.FENS, processes = 1))
+        parallel = list(self.e.analyseBatch(self.FENS, processes = 2))
+
+        self.assertEqual([(r.score, r.nodes) for r in serial], [(r.score, r.nodes) for r in parallel])
+
+    def testFindMoves(self):
+        self.assertEqual(self.e.findmoves(self.FENS[:1]), ['Ra8#'])
+
+
+if __name__ == '__main__':
+    unittest.main()
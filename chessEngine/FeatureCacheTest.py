@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+import chess
+import numpy as np
+import evalfuction as ef
+from featurecache import FeatureCache, MoveMatchFitness
+
+
+class FeatureCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dataset = os.path.join(self.dir, 'dataset.csv')
+
+        with open('../dataset.csv') as fp:
+            lines = fp.readlines()[:21]
+
+        with open(self.dataset, 'w') as fp:
+            fp.writelines(lines)
+
+        self.rows = [line.strip().split(',') for line in lines[1:]]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def bestMove(self, evaluation, fen):
+        # one ply search with testEval2, first best move
+        board = chess.Board(fen)
+        best, bestValue = None, float('-inf')
+        for move in board.legal_moves:
+            board.push(move)
+            value = -evaluation.testEval2(board)
+            board.pop()
+
+            if(value > bestValue):
+                best, bestValue = move, value
+
+        return best.uci()
+
+    def testSameAsEvaluation(self):
+        cache = FeatureCache.load(self.dataset, cacheDir = self.dir)
+        self.assertEqual(cache.numPositions, len(self.rows))
+
+        population = [ef.Parameters(), ef.Parameters(pPass = 200, kMob = 0, pstWeight = 1)]
+        W = np.stack([p.toVector() for p in population], axis = 1)
+        accuracy = cache.accuracy(W)
+
+        for i, params in enumerate(population):
+            evaluation = ef.EvalFunc(params)
+            matches = [self.bestMove(evaluation, fen) == uci for _, fen, uci in self.rows]
+
+            self.assertAlmostEqual(accuracy[i], np.mean(matches))
+            self.assertAlmostEqual(cache.accuracy(W[:, i]), np.mean(matches))
+
+    def testCached(self):
+        FeatureCache.load(self.dataset, cacheDir = self.dir)
+        files = [os.path.join(root, f) for root, _, fs in os.walk(self.dir) for f in fs if f.endswith('.npy')]
+        self.assertEqual(len(files), 3)
+
+        mtimes = [os.path.getmtime(f) for f in files]
+        cache = FeatureCache.load(self.dataset, cacheDir = self.dir)
+        self.assertEqual(mtimes, [os.path.getmtime(f) for f in files])
+        self.assertIsInstance(cache.features, np.memmap)
+
+    def testFitness(self):
+        cache = FeatureCache.load(self.dataset, cacheDir = self.dir)
+        v = ef.Parameters().toVector()
+
+        loss = MoveMatchFitness(cache)
+        gain = MoveMatchFitness(cache, maximize = True)
+
+        self.assertAlmostEqual(loss.evaluateSingle(v), 1 - gain.evaluateSingle(v))
+        self.assertEqual(loss.evaluatePopulation(np.stack([v, v, v])).shape, (3,))
+        self.assertEqual(MoveMatchFitness.load(self.dataset, cacheDir = self.dir).evaluateSingle(v), loss.evaluateSingle(v))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import bz2
+import csv
+import glob
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import chess
+import search as s
+from pgnpipeline import GameFilter, SamplingRules, iterGames, samplePositions, runPipeline
+
+MOVES = '1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Nb8 10. d4 Nbd7'
+
+def game(result, whiteElo = 2000, moves = MOVES):
+    return (
+        f'[Event "Rated Blitz game"]\n[White "a"]\n[Black "b"]\n[Result "{result}"]\n'
+        f'[WhiteElo "{whiteElo}"]\n[BlackElo "2000"]\n\n{moves} {result}\n\n'
+    )
+
+PGN = game('1-0') + game('1/2-1/2') + game('0-1', whiteElo = 1200) + game('0-1') + game('1-0', moves = '1. e4 e5')
+
+
+class PGNPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pgn = os.path.join(self.dir, 'games.pgn')
+        with open(self.pgn, 'w') as fp:
+            fp.write(PGN)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rows(self, outDir):
+        rows = []
+        for path in sorted(glob.glob(os.path.join(outDir, '*.csv'))):
+            with open(path) as fp:
+                rows += list(csv.DictReader(fp))
+
+        return rows
+
+    def testIterGames(self):
+        games = list(iterGames(io.StringIO(PGN)))
+
+        self.assertEqual(len(games), 5)
+        self.assertEqual([h['Result'] for h, _ in games], ['1-0', '1/2-1/2', '0-1', '0-1', '1-0'])
+        self.assertEqual(''.join(text for _, text in games), PGN)
+
+    def testFilter(self):
+        headers = [h for h, _ in iterGames(io.StringIO(PGN))]
+        matches = [GameFilter(minElo = 1500).matches(h) for h in headers]
+
+        self.assertEqual(matches, [True, False, False, True, True])
+        self.assertFalse(GameFilter(event = 'Bullet').matches(headers[0]))
+
+    def testSampling(self):
+        rules = SamplingRules(perGame = 100, minPly = 4)
+        positions = samplePositions(game('0-1'), rules, s.ZobristHash())
+
+        # black to move from the fourth ply on
+        self.assertEqual(len(positions), 8)
+        for key, (san, fen, uci, result) in positions:
+            board = chess.Board(fen)
+            self.assertEqual(board.turn, chess.BLACK)
+            self.assertEqual(board.san(chess.Move.from_uci(uci)), san)
+            self.assertEqual(key, s.ZobristHash().hashOfPosition(board))
+            self.assertEqual(result, '0-1')
+
+    def testPipeline(self):
+        outDir = os.path.join(self.dir, 'out')
+        rules = SamplingRules(perGame = 100, minPly = 4, winnerToMove = False)
+        stats = runPipeline([self.pgn], outDir, rules = rules, processes = 1, shardSize = 5)
+        rows = self.rows(outDir)
+
+        # the two decisive games with the same moves share their positions
+        self.assertEqual((stats.games, stats.matched), (5, 4))
+        self.assertEqual(stats.positions, len(rows))
+        self.assertGreater(stats.duplicates, 0)
+        self.assertEqual(len(set(r['Fen'] for r in rows)), len(rows))
+        self.assertEqual(len(glob.glob(os.path.join(outDir, '*.csv'))), -(-len(rows) // 5))
+
+    def testCompressedAndProcesses(self):
+        compressed = os.path.join(self.dir, 'games.pgn.bz2')
+        with bz2.open(compressed, 'wt') as fp:
+            fp.write(PGN)
+
+        serial = os.path.join(self.dir, 'serial')
+        parallel = os.path.join(self.dir, 'parallel')
+        rules = SamplingRules(perGame = 3, minPly = 4)
+        runPipeline([self.pgn], serial, rules = rules, processes = 1)
+        runPipeline([compressed], parallel, rules = rules, processes = 2, chunkGames = 1)
+
+        self.assertGreater(len(self.rows(serial)), 0)
+        self.assertEqual(self.rows(serial), self.rows(parallel))
+
+
+if __name__ == '__main__':
+    unittest.main()
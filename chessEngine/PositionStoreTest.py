@@ -0,0 +1,78 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import chess
+import numpy as np
+from positionstore import PositionStore, PositionWriter, convertCSV, decodeBoard, encode
+
+
+class PositionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = os.path.join(self.dir, 'dataset.pos')
+
+        with open('../dataset.csv') as fp:
+            self.rows = list(csv.DictReader(fp))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testConvert(self):
+        self.assertEqual(convertCSV('../dataset.csv', self.store), len(self.rows))
+        self.assertLess(os.path.getsize(self.store), os.path.getsize('../dataset.csv'))
+
+        store = PositionStore(self.store)
+        self.assertEqual(len(store), len(self.rows))
+
+        for row, (board, move) in zip(self.rows, store.samples()):
+            self.assertEqual(board, chess.Board(row['Fen']))
+            self.assertEqual(move.uci(), row['UCI'])
+
+        self.assertTrue(np.isnan(store.results).all())
+
+    def testBitboards(self):
+        convertCSV('../dataset.csv', self.store)
+        bitboards = PositionStore(self.store).bitboards()
+
+        for row, boards in zip(self.rows, bitboards):
+            board = chess.Board(row['Fen'])
+            expected = [board.pieces_mask(pt, color) for color in chess.COLORS for pt in chess.PIECE_TYPES]
+            self.assertEqual([int(bb) for bb in boards], expected)
+
+    def testResultColumn(self):
+        dataset = os.path.join(self.dir, 'results.csv')
+        with open(dataset, 'w', newline = '') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['San', 'Fen', 'UCI', 'Result'])
+            for row, result in zip(self.rows[:4], ['1-0', '0-1', '1/2-1/2', '*']):
+                writer.writerow([row['San'], row['Fen'], row['UCI'], result])
+
+        convertCSV(dataset, self.store)
+        results = PositionStore(self.store).results
+        self.assertEqual(list(results[:3]), [1.0, 0.0, 0.5])
+        self.assertTrue(np.isnan(results[3]))
+
+    def testEncodeRecord(self):
+        board = chess.Board(self.rows[0]['Fen'])
+        self.assertEqual(decodeBoard(encode(board)), board)
+
+    def testSpecialFields(self):
+        board = chess.Board('r3k2r/1P6/8/3pP3/8/8/8/R3K2R w Kq d6 3 40')
+        move = chess.Move.from_uci('b7b8n')
+
+        with PositionWriter(self.store, bufferSize = 2) as writer:
+            for i in range(5):
+                writer.write(board, move, score = -i, result = 0.5)
+
+        store = PositionStore(self.store)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.board(4).fen(en_passant = 'fen'), board.fen(en_passant = 'fen'))
+        self.assertEqual(store.move(4), move)
+        self.assertEqual(list(store.scores), [0, -1, -2, -3, -4])
+        self.assertEqual(list(store.results), [0.5] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import csv
+import json
+import unittest
+import threading
+import time
+import chess
+from search import NegaSearch, TranspositionTable, TTEntry, NodeType, SearchStats, EvalCache
+from lazysmp import LazySMP
+
+
+class IterativeDeepeningTest(unittest.TestCase):
+    def setUp(self):
+        self.ns = NegaSearch(3)
+
+    def testFindsMateInOne(self):
+        board = chess.Board('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        line = self.ns.iterativeSearch(board, maxDepth = 3)
+
+        self.assertEqual(line[0][0], chess.Move.from_uci('a1a8'))
+        self.assertEqual(self.ns.completedDepth, 3)
+
+    def testSameMoveAsFixedDepth(self):
+        fen = '2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28'
+        fixed = NegaSearch(2).search(chess.Board(fen))
+        iterative = NegaSearch(2).iterativeSearch(chess.Board(fen))
+
+        self.assertEqual(fixed[0], iterative[0])
+
+    def testMovetime(self):
+        board = chess.Board()
+        start = time.perf_counter()
+        line = self.ns.iterativeSearch(board, maxDepth = 20, movetime = 300)
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(len(line) > 0)
+        self.assertIn(line[0][0], board.legal_moves)
+        self.assertLess(self.ns.completedDepth, 20)
+        self.assertLess(elapsed, 2.0)
+
+    def testStop(self):
+        board = chess.Board()
+        timer = threading.Timer(0.3, self.ns.stop)
+        timer.start()
+        line = self.ns.iterativeSearch(board, maxDepth = 20)
+        timer.join()
+
+        self.assertTrue(self.ns.stopped)
+        self.assertIn(line[0][0], board.legal_moves)
+        self.assertEqual(board, chess.Board())
+
+
+class QuiescenceTest(unittest.TestCase):
+    # the pawn on d5 is defended, taking it loses the queen
+    FEN = '4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1'
+
+    def testHorizonEffect(self):
+        withoutQs = NegaSearch(1, quiescence = False).search(chess.Board(self.FEN))
+        withQs = NegaSearch(1).search(chess.Board(self.FEN))
+
+        self.assertEqual(withoutQs[0][0], chess.Move.from_uci('d1d5'))
+        self.assertNotEqual(withQs[0][0], chess.Move.from_uci('d1d5'))
+
+    def testStandPat(self):
+        ns = NegaSearch(1)
+        board = chess.Board(self.FEN)
+        staticEval = ns.evaluation.testEval2(board)
+
+        # white can only lose material by capturing
+        self.assertEqual(ns.quiesce(board, float('-inf'), float('inf')), staticEval)
+        # root, Qxd5, exd5
+        self.assertEqual(ns.qnodes, 3)
+
+    def testChecks(self):
+        # mate in one is only found by a quiescence search with checks
+        board = chess.Board('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        ns = NegaSearch(1, qsearchChecks = True)
+        value = ns.quiesce(board, float('-inf'), float('inf'))
+
+        self.assertGreater(value, 1e30)
+
+
+class SearchStatsTest(unittest.TestCase):
+    def testCollected(self):
+        ns = NegaSearch(3)
+        ns.iterativeSearch(chess.Board('2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28'))
+        stats = ns.stats
+
+        self.assertEqual(stats.ttProbes, stats.nodes)
+        self.assertGreater(stats.ttHits, 0)
+        self.assertLessEqual(stats.ttCutoffs, stats.ttHits)
+        self.assertLessEqual(stats.nullMoveCutoffs, stats.nullMoveTries)
+        self.assertLessEqual(stats.failHighsFirst, stats.failHighs)
+        self.assertEqual(sum(stats.iterationNodes), stats.totalNodes)
+        self.assertEqual(len(stats.branchingFactors), 2)
+        self.assertGreater(stats.nps, 0)
+
+        d = json.loads(stats.toJSON())
+        self.assertEqual(SearchStats.fromDict(d), stats)
+
+    def testMerge(self):
+        a = SearchStats(nodes = 10, qnodes = 5, ttProbes = 10, ttHits = 4, time = 1.0, iterationNodes = [3, 12])
+        b = SearchStats(nodes = 20, qnodes = 5, ttProbes = 20, ttHits = 2, time = 2.0, iterationNodes = [25])
+        c = a.merge(b)
+
+        self.assertEqual(c.totalNodes, 40)
+        self.assertEqual(c.ttHitRate, 0.2)
+        self.assertEqual(c.iterationNodes, [28, 12])
+        self.assertAlmostEqual(c.nps, 40 / 3.0)
+
+
+class IncrementalEvalTest(unittest.TestCase):
+    def testSameAsFullEvaluation(self):
+        with open('../dataset.csv') as fp:
+            fens = [row['Fen'] for row in csv.DictReader(fp)][:5]
+
+        for fen in fens:
+            incremental = NegaSearch(2, debugEval = True)
+            incremental.evaluation.parameters.pstWeight = 0.25
+            full = NegaSearch(2, incrementalEval = False)
+            full.evaluation.parameters.pstWeight = 0.25
+
+            # debugEval asserts at every evaluation
+            self.assertEqual(
+                incremental.search(chess.Board(fen)),
+                full.search(chess.Board(fen))
+            )
+
+
+class EvalCacheTest(unittest.TestCase):
+    def testKeyVerified(self):
+        cache = EvalCache(1 / 1024)
+        cache.add(0x1234, 55.0)
+
+        self.assertEqual(cache.get(0x1234), 55.0)
+        # same slot, other position
+        self.assertIsNone(cache.get(0x1234 + cache.size))
+
+    def testSearch(self):
+        board = chess.Board('2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28')
+        cached = NegaSearch(3)
+        uncached = NegaSearch(3, evalCacheSizeMB = 0)
+
+        self.assertEqual(cached.search(board), uncached.search(board))
+        self.assertEqual(uncached.stats.evalProbes, 0)
+
+        # the leaves of a repeated search are (nearly, the killer moves 
+        # change the tree) all cached
+        cached.tt.clear()
+        cached.search(board)
+        self.assertGreater(cached.stats.evalHitRate, 0.9)
+
+        # new parameters invalidate the cache
+        cached.tt.clear()
+        cached.evaluation.parameters.rMob += 1
+        cached.search(board)
+        self.assertLess(cached.stats.evalHitRate, 0.5)
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tt = TranspositionTable(1)
+
+    def testSize(self):
+        self.assertEqual(self.tt.size, 2 * self.tt.numBuckets)
+        self.assertLessEqual(len(self.tt.buffer), 1024 * 1024)
+        self.assertEqual(self.tt.numBuckets & self.tt.mask, 0)
+
+    def testStoreAndGet(self):
+        move = chess.Move.from_uci('a7a8q')
+        self.tt.add(12345, TTEntry(-1.5, 7, NodeType.LOWERBOUND, move))
+        e = self.tt.get(12345)
+
+        self.assertEqual(e, TTEntry(-1.5, 7, NodeType.LOWERBOUND, move))
+        self.assertIsNone(self.tt.get(12345 + self.tt.numBuckets))
+        self.assertFalse(self.tt.isInTable(54321))
+
+    def testReplacement(self):
+        h1 = 5
+        h2 = 5 + self.tt.numBuckets
+        h3 = 5 + 2 * self.tt.numBuckets
+
+        # same bucket, the deeper entry stays in the depth-preferred slot
+        self.tt.add(h1, TTEntry(1.0, 6, NodeType.EXACT, None))
+        self.tt.add(h2, TTEntry(2.0, 2, NodeType.EXACT, None))
+        self.tt.add(h3, TTEntry(3.0, 1, NodeType.EXACT, None))
+
+        self.assertEqual(self.tt.get(h1).value, 1.0)
+        self.assertIsNone(self.tt.get(h2))
+        self.assertEqual(self.tt.get(h3).value, 3.0)
+
+        # entries from an older search are replaced
+        self.tt.newSearch()
+        self.tt.add(h2, TTEntry(2.0, 2, NodeType.EXACT, None))
+        self.assertIsNone(self.tt.get(h1))
+        self.assertEqual(self.tt.get(h2).value, 2.0)
+
+    def testTornEntry(self):
+        self.tt.add(77, TTEntry(1.0, 3, NodeType.EXACT, None))
+        index = (77 & self.tt.mask) << 1
+
+        # data written by another process after the key check word
+        self.tt.data[index] ^= 1 << 16
+        self.assertIsNone(self.tt.get(77))
+
+
+class LazySMPTest(unittest.TestCase):
+    def testMateInOne(self):
+        smp = LazySMP(3, threads = 2, hashSizeMB = 1)
+        try:
+            line = smp.search(chess.Board('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1'))
+        finally:
+            smp.close()
+
+        self.assertEqual(line[0][0], chess.Move.from_uci('a1a8'))
+        self.assertEqual(smp.completedDepth, 3)
+        self.assertEqual(len(smp.workerNodes), 2)
+        self.assertEqual(smp.nodes + smp.qnodes, sum(smp.workerNodes.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
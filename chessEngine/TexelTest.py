@@ -0,0 +1,85 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import chess
+import numpy as np
+import evalfuction as ef
+from texel import buildTrainingSet, batchGradient, TexelTuner
+
+
+class TexelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+
+        # the positions of dataset.csv come before a winning move, the
+        # side to move is given the win, every fifth row has no result
+        with open('../dataset.csv') as fp:
+            rows = list(csv.DictReader(fp))
+
+        cls.dataset = os.path.join(cls.dir, 'dataset.csv')
+        with open(cls.dataset, 'w', newline = '') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['San', 'Fen', 'UCI', 'Result'])
+            for i, row in enumerate(rows):
+                whiteToMove = chess.Board(row['Fen']).turn == chess.WHITE
+                result = '' if i % 5 == 0 else ('1-0' if whiteToMove else '0-1')
+                writer.writerow([row['San'], row['Fen'], row['UCI'], result])
+
+        cls.paths = buildTrainingSet(cls.dataset, cls.dir, processes = 1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def testQuietPositions(self):
+        features = np.load(self.paths[0])
+        results = np.load(self.paths[1])
+
+        self.assertEqual(features.shape[0], results.shape[0])
+        self.assertEqual(features.shape[1], len(ef.Parameters.names()))
+        self.assertGreater(len(results), 0)
+        self.assertLess(len(results), 80)
+
+    def testNeedsResults(self):
+        with self.assertRaises(ValueError):
+            buildTrainingSet('../dataset.csv', self.dir, processes = 1)
+
+    def testGradient(self):
+        rng = np.random.default_rng(1)
+        F = rng.integers(-5, 5, size = (50, 4))
+        r = rng.integers(0, 2, size = 50).astype(float)
+        w = rng.normal(size = 4)
+
+        gradient, loss = batchGradient(F, r, w, 0.3)
+        for i in range(4):
+            dw = np.zeros(4)
+            dw[i] = 1e-6
+            numeric = (batchGradient(F, r, w + dw, 0.3)[1] - batchGradient(F, r, w - dw, 0.3)[1]) / 2e-6
+            self.assertAlmostEqual(gradient[i], numeric, places = 4)
+
+    def testTrain(self):
+        tuner = TexelTuner(*self.paths, batchSize = 16, learningRate = 2.0)
+        tuner.fitScale()
+        before = tuner.loss()
+
+        params = tuner.train(5)
+
+        self.assertLess(tuner.loss(), before)
+        self.assertIsInstance(params, ef.Parameters)
+        self.assertEqual(params.pValue, 100)
+
+    def testProcesses(self):
+        serial = TexelTuner(*self.paths)
+        parallel = TexelTuner(*self.paths, processes = 2)
+
+        try:
+            self.assertAlmostEqual(serial.loss(), parallel.loss())
+        finally:
+            parallel.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
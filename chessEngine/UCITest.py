@@ -0,0 +1,88 @@
+import io
+import time
+import unittest
+from uci import UCIEngine
+
+
+class UCITest(unittest.TestCase):
+    def setUp(self):
+        self.out = io.StringIO()
+        self.e = UCIEngine(self.out)
+
+    def lines(self):
+        return self.out.getvalue().splitlines()
+
+    def testHandshake(self):
+        self.e.handle('uci')
+        self.e.handle('isready')
+
+        self.assertIn('option name Hash type spin default 16 min 1 max 4096', self.lines())
+        self.assertEqual(self.lines()[-2:], ['uciok', 'readyok'])
+
+    def testGoDepth(self):
+        self.e.handle('position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        self.e.handle('go depth 2')
+        self.e.wait()
+
+        lines = self.lines()
+        self.assertTrue(lines[0].startswith('info depth 1 '))
+        self.assertTrue(lines[1].startswith('info depth 2 score mate 1 '))
+        self.assertEqual(lines[-1], 'bestmove a1a8')
+
+    def testPositionMoves(self):
+        self.e.handle('position startpos moves e2e4 e7e5 g1f3')
+        self.assertEqual(
+            self.e.board.fen(),
+            'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2'
+        )
+
+    def testStopInfinite(self):
+        self.e.handle('position startpos')
+        self.e.handle('go infinite')
+        time.sleep(0.3)
+
+        # answered while searching
+        self.e.handle('isready')
+        self.assertIn('readyok', self.lines())
+
+        self.e.handle('stop')
+        self.assertTrue(self.lines()[-1].startswith('bestmove '))
+
+    def _nodes(self, engine, out, fen):
+        engine.handle(f'position fen {fen}')
+        engine.handle('go depth 3')
+        engine.wait()
+
+        info = [l for l in out.getvalue().splitlines() if l.startswith('info depth 3 ')][-1].split()
+        return int(info[info.index('nodes') + 1])
+
+    def testNewGame(self):
+        fens = [
+            '2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28',
+            'r1bq1rk1/1pp1p1bp/n2p1np1/p2P1p2/2PN4/6P1/PP2PPBP/RNBQ1RK1 w - - 2 9'
+        ]
+        self._nodes(self.e, self.out, fens[0])
+        self.e.handle('ucinewgame')
+        self.assertEqual(self.e.ns.ordering.killerMoves, {})
+
+        out = io.StringIO()
+        self.assertEqual(self._nodes(self.e, self.out, fens[1]), self._nodes(UCIEngine(out), out, fens[1]))
+
+    def testSetOption(self):
+        self.e.handle('setoption name Hash value 1')
+        self.assertLessEqual(len(self.e.ns.tt.buffer), 1024 * 1024)
+
+        self.e.handle('setoption name Threads value 2')
+        self.assertIsNotNone(self.e.smp)
+
+        self.e.handle('position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        self.e.handle('go depth 2')
+        self.e.wait()
+        self.assertEqual(self.lines()[-1], 'bestmove a1a8')
+
+        self.e.handle('quit')
+        self.assertIsNone(self.e.smp)
+
+
+if __name__ == '__main__':
+    unittest.main()
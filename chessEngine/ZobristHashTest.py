@@ -1,6 +1,8 @@
 from re import M
 import unittest
 import chess
+import random
+import chess.polyglot
 from search import ZobristHash
 
 
@@ -52,6 +54,78 @@ class ZobristHashTest(unittest.TestCase):
         self.assertNotEqual(h1, h2)
         self.assertEqual(h2, h3)
 
+    def _assertIncremental(self, fen, uci):
+        board = chess.Board(fen)
+        move = chess.Move.from_uci(uci)
+        h = self.z.makeMove(board, move, self.z.hashOfPosition(board))
+        board.push(move)
+
+        self.assertEqual(h, self.z.hashOfPosition(board))
+
+    def testSpecialMoves(self):
+        # castling both sides
+        self._assertIncremental('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'e1g1')
+        self._assertIncremental('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1', 'e8c8')
+        # rook moves and rook captures remove castling rights
+        self._assertIncremental('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'h1h8')
+        # en passant capture
+        self._assertIncremental('rnbqkbnr/pp1p1ppp/8/2pPp3/8/8/PPP1PPPP/RNBQKBNR w KQkq e6 0 3', 'd5e6')
+        # double push with and without possible en passant capture
+        self._assertIncremental('rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 3', 'e2e4')
+        self._assertIncremental('rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 3', 'a2a4')
+        # promotion with capture
+        self._assertIncremental('1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7b8q')
+        # null move
+        self._assertIncremental('rnbqkbnr/pp1p1ppp/8/2pPp3/8/8/PPP1PPPP/RNBQKBNR w KQkq e6 0 3', '0000')
+
+    def testDirtyCastlingRights(self):
+        # the FEN gives rights without the rook on its corner
+        self._assertIncremental('r3k3/8/8/8/8/8/8/4K2R w KQq - 0 1', 'e1f1')
+        self._assertIncremental('r3k3/8/8/8/8/8/8/4K2R w KQq - 0 1', 'h1h2')
+        self._assertIncremental('r3k3/8/8/8/8/8/8/R3K3 w KQkq - 0 1', 'a1a8')
+
+        z = ZobristHash(debug = True)
+        board = chess.Board('r3k3/8/8/8/8/8/8/4K2R w KQq - 0 1')
+        z.makeMove(board, chess.Move.from_uci('e1g1'), z.hashOfPosition(board))
+
+    def testRandomGames(self):
+        z = ZobristHash(debug = True)
+        rand = random.Random(0)
+
+        for _ in range(20):
+            board = chess.Board()
+            h = z.hashOfPosition(board)
+
+            while(not board.is_game_over() and len(board.move_stack) < 150):
+                move = rand.choice(list(board.legal_moves))
+                h = z.makeMove(board, move, h)
+                board.push(move)
+
+            self.assertEqual(h, z.hashOfPosition(board))
+
+    def testDeterministicKeys(self):
+        self.assertEqual(ZobristHash().pieceSquareHash, self.z.pieceSquareHash)
+        self.assertNotEqual(ZobristHash(seed = 1).pieceSquareHash, self.z.pieceSquareHash)
+
+        keys = self.z.pieceSquareHash + self.z.castlingRightsHash + self.z.passantFileHash
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def testPolyglotKeys(self):
+        z = ZobristHash(debug = True, polyglot = True)
+        rand = random.Random(1)
+        board = chess.Board()
+        h = z.getInitalZobristKey()
+
+        # known key of the starting position
+        self.assertEqual(h, 0x463b96181691fc9c)
+
+        while(not board.is_game_over() and len(board.move_stack) < 200):
+            move = rand.choice(list(board.legal_moves))
+            h = z.makeMove(board, move, h)
+            board.push(move)
+
+            self.assertEqual(h, chess.polyglot.zobrist_hash(board))
+
 
 if __name__ == '__main__':
     unittest.main()
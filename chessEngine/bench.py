@@ -0,0 +1,233 @@
+import chess
+import evalfuction as ef
+import search as s
+
+import argparse
+import csv
+import time
+import typing as t
+
+# Perft counts the leaf nodes of the legal move tree, the counts of the
+# positions below are known and catch move generation bugs. With a hash
+# the incremental Zobrist key is carried along and compared with the key
+# computed from scratch at every node.
+
+# (name, fen, node counts for depth 1, 2, ...)
+PERFT_SUITE: t.List[t.Tuple[str, str, t.List[int]]] = [
+    (
+        'startpos',
+        chess.STARTING_FEN,
+        [20, 400, 8902, 197281, 4865609]
+    ),
+    (
+        'kiwipete',
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        [48, 2039, 97862, 4085603]
+    ),
+    (
+        'position3',
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        [14, 191, 2812, 43238, 674624]
+    ),
+    (
+        'position4',
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        [6, 264, 9467, 422333]
+    ),
+    (
+        'position5',
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        [44, 1486, 62379, 2103487]
+    ),
+]
+
+
+class HashMismatch(Exception):
+    pass
+
+
+def perft(
+    board: chess.Board,
+    depth: int,
+    zobrist: t.Union[s.ZobristHash, None] = None,
+    key: int = None
+    ) -> int:
+
+    # zobrist: verify the incremental key at every node, key is the key
+    #          of board (computed when None)
+    if(zobrist != None and key == None):
+        key = zobrist.hashOfPosition(board)
+
+    if(depth == 0):
+        return 1
+
+    # the leaves are only counted, no need to make the moves
+    if(depth == 1 and zobrist == None):
+        return board.legal_moves.count()
+
+    nodes: int = 0
+    for move in board.legal_moves:
+        newKey: int = None
+
+        if(zobrist != None):
+            newKey = zobrist.makeMove(board, move, key)
+
+        board.push(move)
+
+        if(zobrist != None and newKey != zobrist.hashOfPosition(board)):
+            fen: str = board.fen()
+            board.pop()
+            raise HashMismatch(f'incremental key differs after {move.uci()} in {board.fen()} -> {fen}')
+
+        nodes += perft(board, depth - 1, zobrist, newKey)
+        board.pop()
+
+    return nodes
+
+
+def divide(
+    board: chess.Board,
+    depth: int,
+    zobrist: t.Union[s.ZobristHash, None] = None
+    ) -> t.Dict[str, int]:
+
+    # node count below each root move
+    key: int = zobrist.hashOfPosition(board) if zobrist != None else None
+    counts: t.Dict[str, int] = {}
+
+    for move in board.legal_moves:
+        newKey: int = zobrist.makeMove(board, move, key) if zobrist != None else None
+        board.push(move)
+        counts[move.uci()] = perft(board, depth - 1, zobrist, newKey)
+        board.pop()
+
+    return counts
+
+
+def runPerft(maxDepth: int, verifyHash: bool = False, names: t.List[str] = None) -> bool:
+    # perft of the suite up to maxDepth, returns False if a count is wrong
+    zobrist: t.Union[s.ZobristHash, None] = s.ZobristHash() if verifyHash else None
+    ok: bool = True
+
+    totalNodes: int = 0
+    start: float = time.perf_counter()
+
+    print(f'{"position":<10} {"depth":>5} {"nodes":>10} {"expected":>10} {"nps":>9}')
+    for name, fen, expected in PERFT_SUITE:
+        if(names != None and name not in names):
+            continue
+
+        for depth in range(1, min(maxDepth, len(expected)) + 1):
+            board = chess.Board(fen)
+
+            posStart: float = time.perf_counter()
+            nodes: int = perft(board, depth, zobrist)
+            elapsed: float = time.perf_counter() - posStart
+
+            totalNodes += nodes
+            status: str = '' if nodes == expected[depth - 1] else ' FAIL'
+            ok = ok and status == ''
+
+            print(
+                f'{name:<10} {depth:>5} {nodes:>10} {expected[depth - 1]:>10} '
+                f'{int(nodes / max(elapsed, 1e-9)):>9}{status}'
+            )
+
+    elapsed: float = time.perf_counter() - start
+    print(f'total nodes {totalNodes} time {elapsed:.2f}s nps {int(totalNodes / max(elapsed, 1e-9))}')
+
+    return ok
+
+
+def runBench(fens: t.List[str], depth: int, hashSizeMB: float = 16) -> t.Tuple[int, float]:
+    # fixed depth search of every position from a clean search state, the
+    # node total changes only when the search does, returns (nodes, seconds)
+    ns = s.NegaSearch(depth, hashSizeMB)
+    stats = s.SearchStats()
+
+    for fen in fens:
+        ns.clear()
+        ns.iterativeSearch(chess.Board(fen))
+        stats = stats.merge(ns.stats)
+
+    return stats.totalNodes, stats.time
+
+
+def runMobility(fens: t.List[str], repeat: int = 10) -> t.Dict[str, float]:
+    # time per call of both mobility terms, in microseconds
+    evaluation = ef.EvalFunc()
+    boards: t.List[chess.Board] = [chess.Board(fen) for fen in fens]
+    times: t.Dict[str, float] = {}
+
+    for name, func in [
+        (ef.EvalFunc.MOBILITY_LEGAL, evaluation.mobEvaluation),
+        (ef.EvalFunc.MOBILITY_ATTACKS, evaluation.attackMobEvaluation)
+    ]:
+        start: float = time.perf_counter()
+        for _ in range(repeat):
+            for board in boards:
+                func(board)
+
+        times[name] = (time.perf_counter() - start) / (repeat * len(boards)) * 1e6
+
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Move generation and search benchmarks')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    perftParser = commands.add_parser('perft', help = 'perft of the standard suite')
+    perftParser.add_argument('--depth', type = int, default = 3)
+    perftParser.add_argument('--hash', action = 'store_true', help = 'verify the Zobrist key at every node')
+    perftParser.add_argument('--positions', nargs = '+', default = None, help = 'names of the suite positions')
+
+    divideParser = commands.add_parser('divide', help = 'perft split by root move')
+    divideParser.add_argument('--fen', default = chess.STARTING_FEN)
+    divideParser.add_argument('--depth', type = int, default = 3)
+    divideParser.add_argument('--hash', action = 'store_true', help = 'verify the Zobrist key at every node')
+
+    benchParser = commands.add_parser('bench', help = 'fixed depth search of a dataset')
+    benchParser.add_argument('--dataset', default = '../dataset.csv')
+    benchParser.add_argument('--depth', type = int, default = 3)
+    benchParser.add_argument('--positions', type = int, default = None)
+    benchParser.add_argument('--hashsize', type = float, default = 16, help = 'table size in MB')
+
+    mobilityParser = commands.add_parser('mobility', help = 'cost of the mobility terms')
+    mobilityParser.add_argument('--dataset', default = '../dataset.csv')
+    mobilityParser.add_argument('--repeat', type = int, default = 10)
+
+    args = parser.parse_args()
+
+    if(args.command == 'perft'):
+        if(not runPerft(args.depth, args.hash, args.positions)):
+            raise SystemExit(1)
+    elif(args.command == 'divide'):
+        zobrist = s.ZobristHash() if args.hash else None
+
+        start = time.perf_counter()
+        counts = divide(chess.Board(args.fen), args.depth, zobrist)
+        elapsed = time.perf_counter() - start
+
+        for move, nodes in sorted(counts.items()):
+            print(f'{move}: {nodes}')
+
+        total = sum(counts.values())
+        print(f'\nmoves {len(counts)} nodes {total} nps {int(total / max(elapsed, 1e-9))}')
+    elif(args.command == 'mobility'):
+        with open(args.dataset) as fp:
+            fens = [row['Fen'] for row in csv.DictReader(fp)]
+
+        times = runMobility(fens, args.repeat)
+        for name, us in times.items():
+            print(f'{name:<8} {us:>8.1f} us/position')
+
+        legal, attacks = times[ef.EvalFunc.MOBILITY_LEGAL], times[ef.EvalFunc.MOBILITY_ATTACKS]
+        print(f'speedup {legal / attacks:.1f}x')
+    else:
+        with open(args.dataset) as fp:
+            fens = [row['Fen'] for row in csv.DictReader(fp)][:args.positions]
+
+        nodes, elapsed = runBench(fens, args.depth, args.hashsize)
+        print(f'positions {len(fens)} depth {args.depth}')
+        print(f'nodes {nodes} time {elapsed:.2f}s nps {int(nodes / max(elapsed, 1e-9))}')
@@ -2,17 +2,89 @@ import chess
 import oldevalfuction as oef
 import search as s
 from collections import defaultdict
+from dataclasses import dataclass, asdict
+import argparse
 import csv
+import json
+import multiprocessing as mp
+import time
+import typing as t
 
 
+@dataclass
+class AnalysisResult:
+    index: int
+    fen: str
+    san: t.Union[str, None]
+    uci: t.Union[str, None]
+    score: float
+    depth: int
+    nodes: int
+    time: float
+    stats: t.Dict[str, t.Any]
+
+
+def analysePosition(
+    ns: s.NegaSearch,
+    index: int,
+    fen: str,
+    movetime: int = None,
+    clearHash: bool = True
+    ) -> AnalysisResult:
+
+    board = chess.Board(fen)
+
+    # results do not depend on the positions searched before
+    if(clearHash):
+        ns.clear()
+
+    start = time.perf_counter()
+    line = ns.iterativeSearch(board, movetime = movetime)
+    elapsed = time.perf_counter() - start
+
+    # no legal moves
+    if(len(line) == 0):
+        return AnalysisResult(
+            index, fen, None, None, 0.0, 0, ns.nodes + ns.qnodes, elapsed, ns.stats.toDict()
+        )
+
+    move, score = line[0]
+    return AnalysisResult(
+        index = index,
+        fen = fen,
+        san = board.san(move),
+        uci = move.uci(),
+        score = score,
+        depth = ns.completedDepth,
+        nodes = ns.nodes + ns.qnodes,
+        time = elapsed,
+        stats = ns.stats.toDict()
+    )
+
+
+# every process of the pool keeps its own search (and table)
+# between the positions it is given
+_workerSearch: s.NegaSearch = None
+
+def _initWorker(config: t.Dict[str, t.Any]) -> None:
+    # config: NegaSearch.config() of the engine search
+    global _workerSearch
+    _workerSearch = s.NegaSearch.fromConfig(config)
+
+def _analyseTask(task: t.Tuple[int, str, int, bool]) -> AnalysisResult:
+    index, fen, movetime, clearHash = task
+    return analysePosition(_workerSearch, index, fen, movetime, clearHash)
+
 
 class Engine:
-    def __init__(self, depth):
-        self.ns = s.NegaSearch(depth)
+    def __init__(self, depth, hashSizeMB: float = 16):
+        self.depth = depth
+        self.hashSizeMB = hashSizeMB
+        self.ns = s.NegaSearch(depth, hashSizeMB)
 
     def printeval(self, fen: str):
         board = chess.Board(fen)
-        
+
         print(board)
         moves = self.ns.search(board)
 
@@ -22,22 +94,77 @@ class Engine:
             print(f'board:\n{board}')
 
         print(moves)
-    
-    def findmoves(self, fens):
-        out = []
-        for i in range(len(fens)):
-            out.append(self.bestmove(fens[i]))
 
-            #print(f'fen evaluated: {i}/{len(fens)}')
+    def analyseBatch(self,
+        fens: t.Sequence[str],
+        processes: int = None,
+        chunksize: int = 1,
+        ordered: bool = True,
+        movetime: int = None,
+        clearHash: bool = True
+        ) -> t.Iterator[AnalysisResult]:
+
+        # Yields an AnalysisResult per fen as soon as it is ready.
+        # processes: size of the pool (cpu count if None), 1 searches in
+        #            this process
+        # ordered: results in the order of fens, otherwise in the order
+        #          they complete (AnalysisResult.index gives the position)
+        # movetime: time budget per position in milliseconds, the search
+        #           stops at the engine depth otherwise
+        tasks = [(i, fen, movetime, clearHash) for i, fen in enumerate(fens)]
+
+        if(processes == 1):
+            for index, fen, _, _ in tasks:
+                yield analysePosition(self.ns, index, fen, movetime, clearHash)
+            return
+
+        initargs = (self.ns.config(),)
+        with mp.Pool(processes, initializer = _initWorker, initargs = initargs) as pool:
+            mapper = pool.imap if ordered else pool.imap_unordered
+
+            for result in mapper(_analyseTask, tasks, chunksize):
+                yield result
+
+    def findmoves(self, fens, processes: int = 1):
+        return [r.san for r in self.analyseBatch(fens, processes)]
 
-        return out
-    
     def bestmove(self, fen):
         board = chess.Board(fen)
-        self.ns.search(board)
-        return board.san(self.ns.bestMove)
+        line = self.ns.search(board)
+        return board.san(line[0][0])
 
 if __name__ == '__main__':
-    e = Engine(6)
+    parser = argparse.ArgumentParser(description = 'Analyse the positions of a dataset')
+    parser.add_argument('--dataset', default = None, help = 'csv with Fen and UCI columns')
+    parser.add_argument('--depth', type = int, default = 6)
+    parser.add_argument('--processes', type = int, default = None)
+    parser.add_argument('--chunksize', type = int, default = 1)
+    parser.add_argument('--movetime', type = int, default = None, help = 'milliseconds per position')
+    parser.add_argument('--unordered', action = 'store_true')
+    args = parser.parse_args()
+
+    e = Engine(args.depth)
+
+    if(args.dataset == None):
+        e.printeval('2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28')
+    else:
+        with open(args.dataset) as fp:
+            rows = list(csv.DictReader(fp))
+
+        results = e.analyseBatch(
+            [row['Fen'] for row in rows],
+            processes = args.processes,
+            chunksize = args.chunksize,
+            ordered = not args.unordered,
+            movetime = args.movetime
+        )
+
+        correct = 0
+        total = s.SearchStats()
+        for r in results:
+            correct += int(r.uci == rows[r.index]['UCI'])
+            total = total.merge(s.SearchStats.fromDict(r.stats))
+            print(json.dumps(asdict(r)))
 
-    e.printeval('2r4r/1bn1qpk1/p3p2p/1p1pP2R/3N1QP1/8/PPP3BP/3R2K1 w - - 1 28')
+        print(f'same move as dataset: {correct}/{len(rows)}')
+        print(f'search statistics: {total.toJSON()}')
@@ -1,5 +1,7 @@
 from functools import reduce
 import chess
+import numpy as np
+import random
 import unittest
 
 import typing as t
@@ -109,7 +111,10 @@ class Parameters:
 
         ## QUEEN PARAMETERS
         qValue: float = 900,
-        qMob: float = 3
+        qMob: float = 3,
+
+        ## PIECE-SQUARE TABLES
+        pstWeight: float = 0
     ) -> None:
 
         ## ROOK PARAMETERS
@@ -148,9 +153,287 @@ class Parameters:
         self.qValue: float  = qValue
         self.qMob: float    = qMob
 
+        ## PIECE-SQUARE TABLES
+        self.pstWeight: float = pstWeight
+
+    @classmethod
+    def names(cls) -> t.List[str]:
+        # names of the parameters in the order of the vectors
+        return list(vars(cls()).keys())
+
+    def toVector(self) -> np.ndarray:
+        return np.array([getattr(self, name) for name in self.names()], dtype = np.float64)
+
+    @classmethod
+    def fromVector(cls, vector: t.Sequence[float]) -> 'Parameters':
+        names: t.List[str] = cls.names()
+        if(len(vector) != len(names)):
+            raise ValueError(f'expected {len(names)} parameters, got {len(vector)}')
+
+        return cls(**{name: float(v) for name, v in zip(names, vector)})
+
+# shifts and fills of bitboards used by the set-wise pawn evaluation,
+# east and west do not wrap around the board
+def _shiftUp(bb: int) -> int:
+    return (bb << 8) & chess.BB_ALL
+
+def _shiftDown(bb: int) -> int:
+    return bb >> 8
+
+def _shiftEast(bb: int) -> int:
+    return (bb << 1) & ~chess.BB_FILE_A & chess.BB_ALL
+
+def _shiftWest(bb: int) -> int:
+    return (bb >> 1) & ~chess.BB_FILE_H
+
+def _fillUp(bb: int) -> int:
+    bb |= bb << 8
+    bb |= bb << 16
+    bb |= bb << 32
+    return bb & chess.BB_ALL
+
+def _fillDown(bb: int) -> int:
+    bb |= bb >> 8
+    bb |= bb >> 16
+    bb |= bb >> 32
+    return bb
+
+
+# Zobrist keys of the pawns, PAWN_KEYS[color][square]
+PAWN_KEY_SEED: int = 0x5EED9A3
+PAWN_KEYS: t.List[t.List[int]] = (lambda rand: [
+    [rand.getrandbits(64) for _ in chess.SQUARES] for _ in [chess.BLACK, chess.WHITE]
+])(random.Random(PAWN_KEY_SEED))
+
+
+def pawnKeyOf(board: chess.Board) -> int:
+    key: int = 0
+    for color in [chess.WHITE, chess.BLACK]:
+        for sq in chess.scan_forward(board.pawns & board.occupied_co[color]):
+            key ^= PAWN_KEYS[color][sq]
+
+    return key
+
+
+class PawnHashTable:
+    # Pawn structure terms of both sides by pawn key. The structure
+    # changes rarely during a search so most leaves find it here. An entry
+    # is (key, score, passed, doubled), each but the key indexed by color,
+    # scores are from the point of view of that color. Terms that depend
+    # on other pieces (rook behind a passed pawn, blocked pawns) are not 
+    # cached.
+    DEFAULT_ENTRIES: int = 1 << 14
+
+    def __init__(self, entries: int = DEFAULT_ENTRIES) -> None:
+        # the number of entries is rounded down to a power of two
+        self.size: int = 1 << (max(entries, 1).bit_length() - 1)
+        self.mask: int = self.size - 1
+        self.entries: t.List[t.Union[t.Tuple, None]] = [None] * self.size
+
+        self.probes: int = 0
+        self.hits: int = 0
+
+        # parameters the entries were computed with
+        self.parameters: t.Tuple[float, ...] = ()
+
+    @property
+    def hitRate(self) -> float:
+        return self.hits / self.probes if self.probes > 0 else 0.0
+
+    def resetStats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self) -> None:
+        self.entries = [None] * self.size
+        self.resetStats()
+
+    def get(self, key: int) -> t.Union[t.Tuple, None]:
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+
+        if(entry != None and entry[0] == key):
+            self.hits += 1
+            return entry
+
+        return None
+
+    def add(self, entry: t.Tuple) -> None:
+        # always replaces
+        self.entries[entry[0] & self.mask] = entry
+
+
+class EvalState:
+    # Material and piece-square sums of both sides, updated incrementally
+    # when a move is made (push) and restored when it is taken back (pop) 
+    # so they are not recomputed at every leaf. The sums are only valid 
+    # for the board given to reset while it is changed through push/pop. 
+
+    def __init__(self, evalFunc: 'EvalFunc', debug: bool = False) -> None:
+        # debug: evaluations check the sums against a full recomputation
+        self.evalFunc: 'EvalFunc' = evalFunc
+        self.debug: bool = debug
+
+        self.pieceValues: t.Dict[int, float] = {}
+        self.material: t.List[float] = [0.0, 0.0]
+        self.pst: t.List[float] = [0.0, 0.0]
+        self.pawnKey: int = 0
+
+        # pstTables[color][pieceType][square]
+        self.pstTables: t.List[t.List[t.List[float]]] = [
+            [[]] + [
+                [evalFunc.pieceSquareValue(pt, color, sq) for sq in chess.SQUARES]
+                for pt in chess.PIECE_TYPES
+            ]
+            for color in [chess.BLACK, chess.WHITE]
+        ]
+
+        self.board: t.Union[chess.Board, None] = None
+        self.stack: t.List[t.Tuple[float, float, float, float, int]] = []
+
+    def reset(self, board: chess.Board) -> None:
+        params: Parameters = self.evalFunc.parameters
+        self.pieceValues = {
+            chess.PAWN: params.pValue,
+            chess.KNIGHT: params.kValue,
+            chess.BISHOP: params.bValue,
+            chess.ROOK: params.rValue,
+            chess.QUEEN: params.qValue,
+            chess.KING: 0
+        }
+
+        self.material, self.pst = self._sums(board)
+        self.pawnKey = pawnKeyOf(board)
+        self.board = board
+        self.stack = []
+
+    def tracks(self, board: chess.Board) -> bool:
+        return board is self.board
+
+    def _sums(self, board: chess.Board) -> t.Tuple[t.List[float], t.List[float]]:
+        material: t.List[float] = [0.0, 0.0]
+        pst: t.List[float] = [0.0, 0.0]
+
+        for s, p in board.piece_map().items():
+            material[p.color] += self.pieceValues[p.piece_type]
+            pst[p.color] += self.pstTables[p.color][p.piece_type][s]
+
+        return material, pst
+
+    def push(self, board: chess.Board, move: chess.Move) -> None:
+        # Makes move on board and updates the sums, the change is derived
+        # from the position before the move.
+        self.stack.append((self.material[0], self.material[1], self.pst[0], self.pst[1], self.pawnKey))
+
+        if(move != chess.Move.null()):
+            self._update(board, move)
+
+        board.push(move)
+
+    def pop(self, board: chess.Board) -> chess.Move:
+        self.material[0], self.material[1], self.pst[0], self.pst[1], self.pawnKey = self.stack.pop()
+        return board.pop()
+
+    def _update(self, board: chess.Board, move: chess.Move) -> None:
+        color: chess.Color = board.turn
+        tables: t.List[t.List[float]] = self.pstTables[color]
+        enemyTables: t.List[t.List[float]] = self.pstTables[not color]
+
+        fromSquare: chess.Square = move.from_square
+        toSquare: chess.Square = move.to_square
+
+        movedPiece: int = board.piece_type_at(fromSquare)
+        capturedPiece: t.Union[int, None] = board.piece_type_at(toSquare)
+        toBB: int = chess.BB_SQUARES[toSquare]
+
+        if(movedPiece == chess.KING and (
+            abs(chess.square_file(toSquare) - chess.square_file(fromSquare)) == 2
+            or board.occupied_co[color] & toBB
+        )):
+            # castling, given as e1g1 or as king takes own rook (e1h1)
+            rank: int = chess.square_rank(fromSquare)
+            aSide: bool = chess.square_file(toSquare) < chess.square_file(fromSquare)
+
+            if(board.occupied_co[color] & toBB):
+                rookFrom: chess.Square = toSquare
+            else:
+                rookFrom: chess.Square = chess.square(0 if aSide else 7, rank)
+
+            kingTo: chess.Square = chess.square(2 if aSide else 6, rank)
+            rookTo: chess.Square = chess.square(3 if aSide else 5, rank)
+
+            self.pst[color] += tables[chess.KING][kingTo] - tables[chess.KING][fromSquare] \
+                + tables[chess.ROOK][rookTo] - tables[chess.ROOK][rookFrom]
+            return
+
+        if(capturedPiece != None):
+            self.material[not color] -= self.pieceValues[capturedPiece]
+            self.pst[not color] -= enemyTables[capturedPiece][toSquare]
+
+            if(capturedPiece == chess.PAWN):
+                self.pawnKey ^= PAWN_KEYS[not color][toSquare]
+        elif(movedPiece == chess.PAWN and toSquare == board.ep_square):
+            # en passant, the captured pawn is behind the target square
+            capturedSquare = toSquare - 8 if color == chess.WHITE else toSquare + 8
+            self.material[not color] -= self.pieceValues[chess.PAWN]
+            self.pst[not color] -= enemyTables[chess.PAWN][capturedSquare]
+            self.pawnKey ^= PAWN_KEYS[not color][capturedSquare]
+
+        placedPiece: int = move.promotion if move.promotion else movedPiece
+        if(placedPiece != movedPiece):
+            self.material[color] += self.pieceValues[placedPiece] - self.pieceValues[movedPiece]
+
+        if(movedPiece == chess.PAWN):
+            self.pawnKey ^= PAWN_KEYS[color][fromSquare]
+            if(placedPiece == chess.PAWN):
+                self.pawnKey ^= PAWN_KEYS[color][toSquare]
+
+        self.pst[color] += tables[placedPiece][toSquare] - tables[movedPiece][fromSquare]
+
+    def verify(self, board: chess.Board) -> None:
+        material, pst = self._sums(board)
+
+        for color in [chess.WHITE, chess.BLACK]:
+            assert abs(material[color] - self.material[color]) < 1e-6 \
+                and abs(pst[color] - self.pst[color]) < 1e-6, \
+                f'incremental evaluation mismatch: {self.material} {self.pst} != {material} {pst} ({board.fen()})'
+
+        assert self.pawnKey == pawnKeyOf(board), f'pawn key mismatch ({board.fen()})'
+
+    def materialScore(self, color: chess.Color) -> float:
+        return self.material[color] - self.material[not color]
+
+    def pstScore(self, color: chess.Color) -> float:
+        return self.pst[color] - self.pst[not color]
+
+
 class EvalFunc:
+    # mobility terms of testEval2
+    MOBILITY_LEGAL: str   = 'legal'    # legal moves of the side to move
+    MOBILITY_ATTACKS: str = 'attacks'  # attacked squares of both sides
+
+    CENTER_MASK: int = chess.BB_E4 | chess.BB_E5 | chess.BB_D4 | chess.BB_D5
+    MAIN_DIAGONALS: int = chess.SquareSet.ray(chess.A1, chess.H8).mask \
+        | chess.SquareSet.ray(chess.H1, chess.A8).mask
+
+    # squares at distance 0, 1, 2 and 3 from the edge of the board
+    PERIPHERY_RINGS: t.List[int] = [
+        reduce(lambda bb, sq: bb | chess.BB_SQUARES[sq], [
+            sq for sq in chess.SQUARES 
+            if min(chess.square_file(sq), 7 - chess.square_file(sq), 
+                   chess.square_rank(sq), 7 - chess.square_rank(sq)) == ring
+        ], chess.BB_EMPTY)
+        for ring in range(4)
+    ]
     
-    def __init__(self, params: Parameters = None) -> None:
+    def __init__(self, 
+        params: Parameters = None, 
+        mobility: str = MOBILITY_ATTACKS,
+        pawnHashEntries: int = PawnHashTable.DEFAULT_ENTRIES
+        ) -> None:
+
+        # pawnHashEntries: size of the pawn structure cache, 0 evaluates 
+        #                  every pawn at every call
 
         self.pieceValues = { 
                 'kingpawnshield': 35,
@@ -163,6 +446,9 @@ class EvalFunc:
 
         self.VALIDRANGE = range(8)
         self.pieceTables = PieceTables()
+        self.mobility: str = mobility
+        self.pawnHash: t.Union[PawnHashTable, None] = \
+            PawnHashTable(pawnHashEntries) if pawnHashEntries > 0 else None
 
         if(params == None):
             self.parameters = Parameters()
@@ -176,11 +462,12 @@ class EvalFunc:
         eval_score = self.piecesValueEvaluation(board) 
         return eval_score
 
-    def testEval2(self, board:chess.Board) -> float:
+    def testEval2(self, board:chess.Board, state: EvalState = None) -> float:
+        # state: incrementally updated sums of board, material and 
+        #        piece-square values are computed from scratch without it
         
         EVAL_FUNCS = {
             chess.ROOK: self.rookEvaluation,
-            chess.PAWN: self.pawnEvaluation,
             chess.BISHOP: self.bishopEvaluation,
             chess.KNIGHT: self.knightEvaluation
         }
@@ -191,11 +478,29 @@ class EvalFunc:
             (not color): -1
         } 
 
-        evalScore = self.piecesValueEvaluation(board) + self.mobEvaluation(board)
+        if(state != None):
+            if(state.debug):
+                state.verify(board)
+
+            evalScore = state.materialScore(color)
+            if(self.parameters.pstWeight != 0):
+                evalScore += self.parameters.pstWeight * state.pstScore(color)
+        else:
+            evalScore = self.piecesValueEvaluation(board)
+            if(self.parameters.pstWeight != 0):
+                evalScore += self.parameters.pstWeight * self.pstEvaluation(board)
+
+        if(self.mobility == self.MOBILITY_ATTACKS):
+            evalScore += self.attackMobEvaluation(board)
+        else:
+            evalScore += self.mobEvaluation(board)
+
+        # the pawns are evaluated together
+        evalScore += self.pawnsEvaluation(board, state.pawnKey if state != None else None)
 
         piecemap = board.piece_map()
         for s, p in piecemap.items():
-            if(p.piece_type == chess.QUEEN or p.piece_type == chess.KING):
+            if(p.piece_type == chess.QUEEN or p.piece_type == chess.KING or p.piece_type == chess.PAWN):
                 continue 
 
             evalScore += contrib[p.color] * EVAL_FUNCS[p.piece_type](s, board, p.color)
@@ -258,97 +563,155 @@ class EvalFunc:
         return bonus
     
     def pawnEvaluation(self, square: int, board: chess.Board, color: bool) -> float:
-        file: int = chess.square_file(square) 
-        rank: int = chess.square_rank(square)
+        # bonus of the pawn of color on square, see pawnSets
+        sets: t.Dict[str, int] = self.pawnSets(board, color)
+        bb: int = chess.BB_SQUARES[square]
 
         bonus: float = 0
+        for name, weight in self._pawnWeights():
+            if(sets[name] & bb):
+                bonus += weight
 
-        ##
-        ## CENTER PAWN BONUS
-        ##
-        CENTER_SQUARES = [chess.E4, chess.E5, chess.D4, chess.D5]
-        isCentral = False
-        if(square in CENTER_SQUARES):
-            isCentral = True
-            bonus += self.parameters.pCenter
+        return bonus
 
-        ##
-        ## ISOLATED PAWNS
-        ##
-        adjacentPieces: t.Dict[int, chess.Piece] = self._adjacentPieces(square, board, color, board.pawns)
+    def _pawnWeights(self) -> t.List[t.Tuple[str, float]]:
+        p: Parameters = self.parameters
+        return [
+            ('center', p.pCenter),
+            ('isolated', p.pIso),
+            ('doubled', p.pDouble),
+            ('passed', p.pPass),
+            ('backward', p.pBackward),
+            ('rookBehind', p.pRookBehindPawn),
+            ('blocked', p.pBlocked),
+        ]
 
-        isIso = any(adjacentPieces.values()) == False
+    def pawnSets(self, board: chess.Board, color: bool, structureOnly: bool = False) -> t.Dict[str, int]:
+        # Bitboards of the pawns of color with each property, computed for
+        # all pawns at once with shifts and fills:
+        #   center     -> on e4, d4, e5 or d5
+        #   isolated   -> no pawn of color on the 8 neighbouring squares
+        #   doubled    -> a pawn of color behind on the same file
+        #   passed     -> no enemy pawn ahead on the same or adjacent files
+        #   backward   -> not supported from the 3 squares behind but with a 
+        #                 pawn of color diagonally ahead
+        #   rookBehind -> passed, not doubled and a rook of color behind
+        #   blocked    -> central with a piece of color ahead on the file
+        # structureOnly: only the sets that depend on the pawns alone
+        own: int = board.pawns & board.occupied_co[color]
+        enemy: int = board.pawns & board.occupied_co[not color]
+
+        if(color == chess.WHITE):
+            forward, backward = _shiftUp, _shiftDown
+            fillForward, fillBackward = _fillUp, _fillDown
+        else:
+            forward, backward = _shiftDown, _shiftUp
+            fillForward, fillBackward = _fillDown, _fillUp
+
+        sides: int = _shiftEast(own) | _shiftWest(own)
+        neighbours: int = sides | forward(own | sides) | backward(own | sides)
+
+        # squares with an enemy pawn ahead on the same or adjacent files
+        enemySpan: int = fillBackward(backward(enemy))
+        enemySpan |= _shiftEast(enemySpan) | _shiftWest(enemySpan)
+
+        isolated: int = own & ~neighbours
+        sets: t.Dict[str, int] = {
+            'center': own & self.CENTER_MASK,
+            'isolated': isolated,
+            'doubled': own & fillForward(forward(own)),
+            'passed': own & ~enemySpan,
+            'backward': own & ~isolated & ~forward(own | sides) & backward(sides),
+        }
 
-        if(isIso):
-            bonus += self.parameters.pIso
-        
-        ##
-        ## DOUBLED PAWNS
-        ## 
-        piecesAboveMask, piecesBelowMask = pnd.RANK_MASKS[rank]
+        if(structureOnly):
+            return sets
 
-        if(color == chess.BLACK):
-            piecesAboveMask, piecesBelowMask = piecesBelowMask, piecesAboveMask 
+        rooks: int = board.rooks & board.occupied_co[color]
+        supportable: int = sets['passed'] & ~sets['doubled']
 
-        piecesBehindMask = piecesBelowMask & chess.BB_FILES[file]
-        pawnsBehind =  piecesBehindMask & board.pawns & board.occupied_co[color]
-        isDouble = pawnsBehind != 0
+        sets['rookBehind'] = supportable & fillForward(forward(rooks))
+        sets['blocked'] = sets['center'] & fillBackward(backward(board.occupied_co[color]))
 
-        if(isDouble):
-            bonus += self.parameters.pDouble
+        return sets
 
-        ##
-        ## PASS PAWNS
-        ##
-        adjacentFilesMask = pnd.ADJACENT_FILES_MASK[file]
+    def pawnStructure(self, board: chess.Board, pawnKey: int = None) -> t.Tuple:
+        # (key, score, passed, doubled) of the pawn hash, computed and 
+        # stored on a miss
+        if(self.pawnHash != None):
+            # parameters can be swapped or changed between two calls
+            self._validatePawnHash()
 
-        piecesAheadOnNeighbouringFilesMask = piecesAboveMask & adjacentFilesMask
-        enemyPawnsAheadOnNeighbouringFiles =  piecesAheadOnNeighbouringFilesMask & board.pawns & board.occupied_co[not color] 
+            if(pawnKey == None):
+                pawnKey = pawnKeyOf(board)
 
-        isPassPawn = enemyPawnsAheadOnNeighbouringFiles == 0
-       
-        if(isPassPawn):
-            bonus += self.parameters.pPass
+            entry = self.pawnHash.get(pawnKey)
+            if(entry != None):
+                return entry
 
-        ##
-        ## ROOK BEHIND PASS PAWN 
-        ##
-        if(isPassPawn and (not isDouble)):
-            rooksBehind = piecesBehindMask & board.rooks & board.occupied_co[color]
+        score: t.List[float] = [0, 0]
+        passed: t.List[int] = [chess.BB_EMPTY, chess.BB_EMPTY]
+        doubled: t.List[int] = [chess.BB_EMPTY, chess.BB_EMPTY]
 
-            if(rooksBehind != 0):
-                bonus += self.parameters.pRookBehindPawn
+        for color in [chess.WHITE, chess.BLACK]:
+            sets: t.Dict[str, int] = self.pawnSets(board, color, structureOnly = True)
 
-        ##
-        ## BACKWARD PAWNS 
-        ##
-        if(not isIso):
-            b1 = adjacentPieces.get((1, -1), False)
-            b2 = adjacentPieces.get((0, -1), False)
-            b3 = adjacentPieces.get((-1, -1), False)
+            for name, weight in self._pawnWeights()[:5]:
+                score[color] += weight * chess.popcount(sets[name])
 
-            if(b1 == b2 == b3 == False):
-                a1 = adjacentPieces.get((1, 1), False)
-                a3 = adjacentPieces.get((-1, 1), False)
+            passed[color] = sets['passed']
+            doubled[color] = sets['doubled']
 
-                isBackward = a1 or a3 
+        entry = (pawnKey, tuple(score), tuple(passed), tuple(doubled))
+        if(self.pawnHash != None):
+            self.pawnHash.add(entry)
 
-                if(isBackward):
-                    bonus += self.parameters.pBackward
+        return entry
 
-        ##
-        ## BLOCKED PAWN
-        ##
-        if(isCentral):
-            piecesAhead = piecesAboveMask & chess.BB_FILES[file] & board.occupied_co[color] 
+    def _validatePawnHash(self) -> None:
+        # the cached pawn structures are dropped when a pawn parameter
+        # changed since they were computed
+        p: Parameters = self.parameters
+        pawnParams = (p.pCenter, p.pIso, p.pDouble, p.pPass, p.pBackward)
 
-            isBlocked = piecesAhead != 0 
+        if(pawnParams != self.pawnHash.parameters):
+            self.pawnHash.clear()
+            self.pawnHash.parameters = pawnParams
 
-            if(isBlocked):
-                bonus += self.parameters.pBlocked
+    def newSearch(self) -> None:
+        if(self.pawnHash == None):
+            return
 
-        return bonus
+        self._validatePawnHash()
+        self.pawnHash.resetStats()
+
+    def pawnsEvaluation(self, board: chess.Board, pawnKey: int = None) -> float:
+        # sum of pawnEvaluation over all pawns from the side to move,
+        # the structure comes from the pawn hash if there is one
+        color: bool = board.turn
+        params: Parameters = self.parameters
+        _, score, passed, doubled = self.pawnStructure(board, pawnKey)
+
+        bonus: float = score[color] - score[not color]
+
+        for c in [chess.WHITE, chess.BLACK]:
+            own: int = board.pawns & board.occupied_co[c]
+            rooks: int = board.rooks & board.occupied_co[c]
+
+            if(c == chess.WHITE):
+                rooksBehind: int = _fillUp(_shiftUp(rooks))
+                piecesAhead: int = _fillDown(_shiftDown(board.occupied_co[c]))
+            else:
+                rooksBehind: int = _fillDown(_shiftDown(rooks))
+                piecesAhead: int = _fillUp(_shiftUp(board.occupied_co[c]))
 
+            sideBonus: float = \
+                params.pRookBehindPawn * chess.popcount(passed[c] & ~doubled[c] & rooksBehind) \
+                + params.pBlocked * chess.popcount(own & self.CENTER_MASK & piecesAhead)
+
+            bonus += sideBonus if c == color else -sideBonus
+
+        return bonus
 
     def knightEvaluation(self, square: int, board: chess.Board, color: bool) -> float:
         file: int = chess.square_file(square) 
@@ -441,6 +804,39 @@ class EvalFunc:
 
         return bonus
 
+    def attackMobEvaluation(self, board: chess.Board) -> float:
+        # Mobility from the attack bitboards: squares attacked by every 
+        # knight, bishop, rook and queen that are not occupied by its own 
+        # pieces, for both sides. Pins and checks are ignored.
+        color: bool = board.turn 
+        occupied: int = board.occupied
+        params: Parameters = self.parameters
+
+        bonus: float = 0
+
+        for c in [chess.WHITE, chess.BLACK]:
+            free: int = ~board.occupied_co[c]
+            pieces: int = board.occupied_co[c]
+            sideBonus: float = 0
+
+            for sq in chess.scan_forward(board.knights & pieces):
+                sideBonus += params.kMob * chess.popcount(chess.BB_KNIGHT_ATTACKS[sq] & free)
+
+            for sq in chess.scan_forward((board.bishops | board.queens) & pieces):
+                attacks: int = chess.BB_DIAG_ATTACKS[sq][chess.BB_DIAG_MASKS[sq] & occupied]
+                weight: float = params.qMob if board.queens & chess.BB_SQUARES[sq] else params.bMob
+                sideBonus += weight * chess.popcount(attacks & free)
+
+            for sq in chess.scan_forward((board.rooks | board.queens) & pieces):
+                attacks: int = chess.BB_RANK_ATTACKS[sq][chess.BB_RANK_MASKS[sq] & occupied] \
+                    | chess.BB_FILE_ATTACKS[sq][chess.BB_FILE_MASKS[sq] & occupied]
+                weight: float = params.qMob if board.queens & chess.BB_SQUARES[sq] else params.rMob
+                sideBonus += weight * chess.popcount(attacks & free)
+
+            bonus += sideBonus if c == color else -sideBonus
+
+        return bonus
+
     def piecesValueEvaluation(self, board: chess.Board) -> float:
         color: bool = board.turn 
 
@@ -469,6 +865,150 @@ class EvalFunc:
 
         return bonus
 
+    ##
+    ## LINEAR FORM
+    ##
+    # Every term of testEval2 is a parameter times a count, features(board)
+    # gives the counts in the order of Parameters.names() (side to move 
+    # minus the other side) so that
+    #     testEval2(board) == features(board) @ parameters.toVector()
+    # The features of many positions can be kept as a matrix and scored
+    # under other parameters with a single matrix product.
+
+    def features(self, board: chess.Board) -> np.ndarray:
+        color: bool = board.turn
+        own: t.Dict[str, int] = self._sideFeatures(board, color)
+        other: t.Dict[str, int] = self._sideFeatures(board, not color)
+
+        # legal move mobility only counts the side to move
+        if(self.mobility != self.MOBILITY_ATTACKS):
+            for name in ['rMob', 'kMob', 'bMob', 'qMob']:
+                other[name] = 0
+
+        return np.array(
+            [own.get(name, 0) - other.get(name, 0) for name in Parameters.names()], 
+            dtype = np.int64
+        )
+
+    def featureMatrix(self, boards: t.Iterable[chess.Board]) -> np.ndarray:
+        # (positions, parameters) matrix of the features of every board
+        rows: t.List[np.ndarray] = [self.features(b) for b in boards]
+        if(len(rows) == 0):
+            return np.zeros((0, len(Parameters.names())), dtype = np.int64)
+
+        return np.stack(rows)
+
+    def linearEvaluation(self, board: chess.Board) -> float:
+        return float(self.features(board) @ self.parameters.toVector())
+
+    @staticmethod
+    def scoreFeatures(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        # features: (positions, parameters) matrix
+        # weights: parameter vector or (parameters, organisms) matrix 
+        #          of several parameter vectors
+        return features @ weights
+
+    def _sideFeatures(self, board: chess.Board, color: bool) -> t.Dict[str, int]:
+        pieces: int = board.occupied_co[color]
+        pawns: int = board.pawns & pieces
+        enemyPawns: int = board.pawns & board.occupied_co[not color]
+        f: t.Dict[str, int] = {}
+
+        ## material
+        f['pValue'] = chess.popcount(pawns)
+        f['kValue'] = chess.popcount(board.knights & pieces)
+        f['bValue'] = chess.popcount(board.bishops & pieces)
+        f['rValue'] = chess.popcount(board.rooks & pieces)
+        f['qValue'] = chess.popcount(board.queens & pieces)
+
+        ## piece-square tables
+        f['pstWeight'] = sum(
+            self.pieceSquareValue(p.piece_type, color, sq)
+            for sq, p in board.piece_map(mask = pieces).items()
+        )
+
+        ## mobility
+        f.update(self._mobilityCounts(board, color))
+
+        ## pawns
+        sets: t.Dict[str, int] = self.pawnSets(board, color)
+        for name, param in [
+            ('center', 'pCenter'), ('isolated', 'pIso'), ('doubled', 'pDouble'), 
+            ('passed', 'pPass'), ('backward', 'pBackward'), 
+            ('rookBehind', 'pRookBehindPawn'), ('blocked', 'pBlocked')
+        ]:
+            f[param] = chess.popcount(sets[name])
+
+        ## rooks
+        seventh: int = chess.BB_RANK_7 if color == chess.WHITE else chess.BB_RANK_2
+        f['rOpenFile'] = f['rSemiOpenFile'] = f['rClosedFile'] = 0
+        f['rSeventh'] = chess.popcount(board.rooks & pieces & seventh)
+
+        for sq in chess.scan_forward(board.rooks & pieces):
+            fileMask: int = chess.BB_FILES[chess.square_file(sq)]
+            ownOnFile: bool = pawns & fileMask != 0
+            enemyOnFile: bool = enemyPawns & fileMask != 0
+
+            if(not ownOnFile and not enemyOnFile):
+                f['rOpenFile'] += 1
+            elif(ownOnFile and not enemyOnFile):
+                f['rSemiOpenFile'] += 1
+            elif(ownOnFile and enemyOnFile):
+                f['rClosedFile'] += 1
+
+        ## knights
+        knights: int = board.knights & pieces
+        for ring in range(4):
+            f[f'kPeriphery{ring}'] = chess.popcount(knights & self.PERIPHERY_RINGS[ring])
+
+        pawnAttacks: int = _shiftEast(pawns) | _shiftWest(pawns)
+        pawnAttacks = _shiftUp(pawnAttacks) if color == chess.WHITE else _shiftDown(pawnAttacks)
+        f['kSupported'] = chess.popcount(knights & pawnAttacks)
+
+        ## bishops
+        f['bOnMainDiag'] = chess.popcount(board.bishops & pieces & self.MAIN_DIAGONALS)
+
+        return f
+
+    def _mobilityCounts(self, board: chess.Board, color: bool) -> t.Dict[str, int]:
+        counts: t.Dict[str, int] = {'rMob': 0, 'kMob': 0, 'bMob': 0, 'qMob': 0}
+        names: t.Dict[int, str] = {
+            chess.ROOK: 'rMob', chess.KNIGHT: 'kMob', chess.BISHOP: 'bMob', chess.QUEEN: 'qMob'
+        }
+
+        if(self.mobility != self.MOBILITY_ATTACKS):
+            if(color == board.turn):
+                for move in board.legal_moves:
+                    pieceType = board.piece_type_at(move.from_square)
+                    if(pieceType in names):
+                        counts[names[pieceType]] += 1
+
+            return counts
+
+        free: int = ~board.occupied_co[color]
+        for pieceType, name in names.items():
+            for sq in chess.scan_forward(board.pieces_mask(pieceType, color)):
+                counts[name] += chess.popcount(board.attacks_mask(sq) & free)
+
+        return counts
+
+    def pieceSquareValue(self, pieceType: int, color: chess.Color, square: chess.Square) -> float:
+        # the tables are given from white's point of view
+        if(color == chess.BLACK):
+            square = chess.square_mirror(square)
+
+        return self.pieceTables.PIECE_SQUARE_TABLES[pieceType][square]
+
+    def pstEvaluation(self, board: chess.Board) -> float:
+        color: bool = board.turn 
+
+        bonus: float = 0
+        for s, p in board.piece_map().items():
+            value = self.pieceSquareValue(p.piece_type, p.color, s)
+            bonus += value if p.color == color else -value
+
+        return bonus
+
     def _kingPawnShield(self, board: chess.Board, color: chess.Color) -> int:
         kposition : chess.Square = board.king(color)
 
@@ -772,6 +1312,122 @@ class EvalFuncTest(unittest.TestCase):
         v = self.ef.pawnEvaluation(chess.D4, b, chess.WHITE)
         self.assertEqual(v, -8 + 62 + -14)
 
+    def testPawnEvaluationMirrored(self):
+        # black pawns score as the white ones of the mirrored board
+        for fen in [
+            '8/8/8/4N3/3PP3/8/8/8 w - - 0 1',
+            '8/8/8/8/3P4/3P4/8/3R4 w - - 0 1',
+            '8/8/8/4P3/3P4/8/8/8 w - - 0 1',
+            '8/8/2p5/1p1P4/3PP3/3R4/8/8 w - - 0 1',
+        ]:
+            b = chess.Board(fen)
+            m = b.mirror()
+
+            for sq in chess.scan_forward(b.pawns & b.occupied_co[chess.WHITE]):
+                self.assertEqual(
+                    self.ef.pawnEvaluation(sq, b, chess.WHITE),
+                    self.ef.pawnEvaluation(chess.square_mirror(sq), m, chess.BLACK)
+                )
+
+            self.assertEqual(self.ef.pawnsEvaluation(b), self.ef.pawnsEvaluation(m))
+
+    def testFeatures(self):
+        with open('../dataset.csv') as fp:
+            boards = [chess.Board(line.split(',')[1]) for line in fp.readlines()[1:]]
+
+        params = Parameters(pstWeight = 0.5)
+        self.assertEqual(vars(Parameters.fromVector(params.toVector())), vars(params))
+
+        for mobility in [EvalFunc.MOBILITY_ATTACKS, EvalFunc.MOBILITY_LEGAL]:
+            e = EvalFunc(params, mobility)
+            F = e.featureMatrix(boards)
+            scores = EvalFunc.scoreFeatures(F, params.toVector())
+
+            for b, score in zip(boards, scores):
+                self.assertAlmostEqual(score, e.testEval2(b))
+
+        # several parameter vectors at once
+        W = np.stack([params.toVector(), Parameters().toVector()], axis = 1)
+        self.assertEqual(EvalFunc.scoreFeatures(F, W).shape, (len(boards), 2))
+
+    def testAttackMobility(self):
+        # same boards as testMobility, nothing is pinned
+        b = chess.Board('8/8/3p4/8/8/3R4/3P4/8 w - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), 10 * 9)
+
+        b = chess.Board('8/8/3p4/8/5p2/4B3/3P4/8 w - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), 13 * 7)
+
+        b = chess.Board('8/8/3p4/8/5p2/4Q3/3P4/8 w - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), 3 * 21)
+
+        b = chess.Board('8/8/8/5p2/2p5/4N3/2P5/8 w - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), 7 * 14)
+
+        # both sides count, from the side to move
+        b = chess.Board('4k3/8/8/8/8/8/8/1N2K1n1 b - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), 0)
+
+        b = chess.Board('4k3/8/8/8/8/8/8/1N2KRn1 b - - 0 1')
+        self.assertEqual(self.ef.attackMobEvaluation(b), -9 * 8)
+
+    def testPawnHash(self):
+        cached = EvalFunc()
+        uncached = EvalFunc(pawnHashEntries = 0)
+        self.assertIsNone(uncached.pawnHash)
+
+        with open('../dataset.csv') as fp:
+            boards = [chess.Board(line.split(',')[1]) for line in fp.readlines()[1:]]
+
+        for b in boards + boards:
+            self.assertEqual(cached.testEval2(b), uncached.testEval2(b))
+
+        # the second evaluation of a position finds it
+        hits = cached.pawnHash.hits
+        cached.testEval2(boards[0])
+        self.assertEqual(cached.pawnHash.hits, hits + 1)
+
+        # changed parameters are not mixed with cached structures
+        cached.parameters.pPass = 0
+        cached.newSearch()
+        self.assertEqual(cached.pawnHash.probes, 0)
+
+        b = chess.Board('8/8/8/8/3P4/8/8/3R4 w - - 0 1')
+        self.assertEqual(cached.pawnsEvaluation(b), -8 + 30 + -3)
+
+    def testPawnHashParametersSwapped(self):
+        # parameters changed between two evaluations without newSearch
+        b = chess.Board('8/5k2/8/3P4/8/8/6K1/8 w - - 0 1')
+        ef = EvalFunc()
+        ef.testEval2(b)
+
+        ef.parameters = Parameters(pPass = 0)
+        self.assertEqual(ef.testEval2(b), EvalFunc(Parameters(pPass = 0)).testEval2(b))
+
+        ef.parameters.pPass = 50
+        self.assertEqual(ef.testEval2(b), EvalFunc(Parameters(pPass = 50)).testEval2(b))
+
+    def testEvalState(self):
+        ef = EvalFunc(Parameters(pstWeight = 0.5))
+        state = EvalState(ef)
+
+        # en passant, castling on both sides, promotion, captures
+        b = chess.Board('rn2k2r/P5p1/8/3Pp3/8/8/8/R3K2R w KQkq e6 0 1')
+        state.reset(b)
+        for uci in ['d5e6', 'e8g8', 'e1c1', 'g7g5', 'a7b8q', 'a8b8']:
+            move = chess.Move.from_uci(uci)
+            self.assertTrue(b.is_legal(move))
+
+            state.push(b, move)
+            state.verify(b)
+            self.assertEqual(ef.testEval2(b, state), ef.testEval2(b))
+
+        for _ in range(6):
+            state.pop(b)
+
+        state.verify(b)
+        self.assertEqual(state.stack, [])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,201 @@
+import chess
+import evalfuction as ef
+
+import argparse
+import csv
+import hashlib
+import os
+import time
+import typing as t
+
+import numpy as np
+
+# Evaluation features of the successors of every dataset position,
+# extracted once and stored in .npy files so that a GA can score a whole
+# population with matrix products instead of evaluating positions.
+#
+# Layout, for P positions with S successors in total:
+#   features.npy -> (S, parameters) features of the position after each
+#                   legal move, from the side to move after the move
+#   offsets.npy  -> (P + 1,) successors of position i are
+#                   offsets[i]:offsets[i + 1]
+#   targets.npy  -> (P,) index in features of the dataset move
+# Positions without legal moves or whose move is not legal are skipped.
+
+CACHE_VERSION: int = 1
+CACHE_DIR: str = '.featurecache'
+
+
+def datasetHash(path: str, evaluation: ef.EvalFunc) -> str:
+    # changes with the dataset and with the layout of the features
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            h.update(chunk)
+
+    h.update(f'{CACHE_VERSION} {evaluation.mobility} {" ".join(ef.Parameters.names())}'.encode())
+    return h.hexdigest()[:16]
+
+
+def extractFeatures(
+    rows: t.Iterable[t.Dict[str, str]],
+    evaluation: ef.EvalFunc
+    ) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    # rows: dicts with the Fen and UCI columns of the dataset
+    features: t.List[np.ndarray] = []
+    offsets: t.List[int] = [0]
+    targets: t.List[int] = []
+
+    for row in rows:
+        board = chess.Board(row['Fen'])
+        moves: t.List[chess.Move] = list(board.legal_moves)
+        target: chess.Move = chess.Move.from_uci(row['UCI'])
+
+        if(target not in moves):
+            continue
+
+        targets.append(offsets[-1] + moves.index(target))
+        for move in moves:
+            board.push(move)
+            features.append(evaluation.features(board))
+            board.pop()
+
+        offsets.append(offsets[-1] + len(moves))
+
+    numParams: int = len(ef.Parameters.names())
+    matrix: np.ndarray = np.stack(features) if len(features) > 0 \
+        else np.zeros((0, numParams), dtype = np.int64)
+
+    # the counts are small, int16 keeps the file compact
+    if(matrix.size == 0 or np.abs(matrix).max() <= np.iinfo(np.int16).max):
+        matrix = matrix.astype(np.int16)
+    else:
+        matrix = matrix.astype(np.int32)
+
+    return matrix, np.array(offsets, dtype = np.int64), np.array(targets, dtype = np.int64)
+
+
+class FeatureCache:
+    def __init__(self, features: np.ndarray, offsets: np.ndarray, targets: np.ndarray) -> None:
+        self.features: np.ndarray = features
+        self.offsets: np.ndarray = offsets
+        self.targets: np.ndarray = targets
+
+        self.starts: np.ndarray = np.asarray(offsets[:-1])
+        self.counts: np.ndarray = np.diff(offsets)
+
+    @property
+    def numPositions(self) -> int:
+        return len(self.targets)
+
+    @classmethod
+    def load(cls,
+        datasetPath: str,
+        evaluation: ef.EvalFunc = None,
+        cacheDir: str = None,
+        mmap: bool = True
+        ) -> 'FeatureCache':
+
+        # Loads the features of the dataset, extracting and saving them
+        # first if there are none for this version of the dataset.
+        # cacheDir: directory of the caches, next to the dataset if None
+        # mmap: the feature matrix is memory-mapped instead of read
+        if(evaluation == None):
+            evaluation = ef.EvalFunc()
+
+        if(cacheDir == None):
+            cacheDir = os.path.join(os.path.dirname(os.path.abspath(datasetPath)), CACHE_DIR)
+
+        path: str = os.path.join(cacheDir, datasetHash(datasetPath, evaluation))
+        files: t.List[str] = [os.path.join(path, f'{name}.npy') for name in ['features', 'offsets', 'targets']]
+
+        if(not all(os.path.exists(f) for f in files)):
+            with open(datasetPath) as fp:
+                arrays = extractFeatures(csv.DictReader(fp), evaluation)
+
+            # written to a temporary name first so a reader never sees
+            # a partial cache
+            os.makedirs(path, exist_ok = True)
+            for f, array in zip(files, arrays):
+                np.save(f + '.tmp.npy', array)
+                os.replace(f + '.tmp.npy', f)
+
+        mode: t.Union[str, None] = 'r' if mmap else None
+        return cls(*[np.load(f, mmap_mode = mode) for f in files])
+
+    def scores(self, weights: np.ndarray) -> np.ndarray:
+        # value of every successor for the side that moved, weights is a
+        # parameter vector or a (parameters, organisms) matrix
+        return -(self.features @ weights)
+
+    def bestMoves(self, weights: np.ndarray) -> np.ndarray:
+        # index in features of the first best scored successor of every
+        # position, (positions,) or (positions, organisms)
+        scores: np.ndarray = self.scores(weights)
+        squeeze: bool = scores.ndim == 1
+        if(squeeze):
+            scores = scores[:, None]
+
+        best: np.ndarray = np.maximum.reduceat(scores, self.starts, axis = 0)
+        isBest: np.ndarray = scores == np.repeat(best, self.counts, axis = 0)
+
+        rows: np.ndarray = np.arange(len(scores), dtype = np.int64)[:, None]
+        candidates: np.ndarray = np.where(isBest, rows, np.iinfo(np.int64).max)
+        first: np.ndarray = np.minimum.reduceat(candidates, self.starts, axis = 0)
+
+        return first[:, 0] if squeeze else first
+
+    def accuracy(self, weights: np.ndarray) -> t.Union[float, np.ndarray]:
+        # fraction of positions where the best scored move is the dataset
+        # move, a float for a vector of weights, one per organism for a matrix
+        best: np.ndarray = self.bestMoves(weights)
+        targets: np.ndarray = self.targets if best.ndim == 1 else self.targets[:, None]
+
+        return (best == targets).mean(axis = 0)
+
+
+class MoveMatchFitness:
+    # Fitness of a chromosome (a vector of Parameters, see
+    # Parameters.toVector) for the optimizers of simpleGA: the share of
+    # dataset positions where it does not pick the dataset move, so lower
+    # is better. maximize gives the share where it does.
+    def __init__(self, cache: FeatureCache, maximize: bool = False) -> None:
+        self.cache: FeatureCache = cache
+        self.maximize: bool = maximize
+
+    @classmethod
+    def load(cls, datasetPath: str, maximize: bool = False, cacheDir: str = None) -> 'MoveMatchFitness':
+        # picklable factory for the evaluators of simpleGA, every worker
+        # maps the cache of the dataset once
+        return cls(FeatureCache.load(datasetPath, cacheDir = cacheDir), maximize)
+
+    def evaluateSingle(self, v: np.ndarray) -> float:
+        return float(self.evaluatePopulation(np.asarray(v)[None, :])[0])
+
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        # chromosomes: (organisms, parameters)
+        accuracy: np.ndarray = self.cache.accuracy(np.asarray(chromosomes, dtype = np.float64).T)
+        return accuracy if self.maximize else 1.0 - accuracy
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Feature cache of a dataset for parameter tuning')
+    parser.add_argument('--dataset', default = '../dataset.csv')
+    parser.add_argument('--cachedir', default = None)
+    parser.add_argument('--organisms', type = int, default = 100, help = 'random organisms scored in the benchmark')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = FeatureCache.load(args.dataset, cacheDir = args.cachedir)
+    print(f'positions {cache.numPositions} successors {len(cache.features)} load {time.perf_counter() - start:.2f}s')
+
+    defaults: np.ndarray = ef.Parameters().toVector()
+    print(f'default parameters pick the dataset move in {cache.accuracy(defaults):.1%} of the positions')
+
+    rng = np.random.default_rng(0)
+    population: np.ndarray = defaults * rng.uniform(0.5, 1.5, size = (args.organisms, len(defaults)))
+
+    start = time.perf_counter()
+    fitness = MoveMatchFitness(cache, maximize = True).evaluatePopulation(population)
+    print(f'{args.organisms} organisms scored in {time.perf_counter() - start:.3f}s, best {fitness.max():.1%}')
@@ -0,0 +1,13 @@
+import typing as t
+
+# Game results as written in PGN headers and dataset csv files, mapped to
+# the score of white.
+RESULTS: t.Dict[str, float] = {
+    '1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5,
+    '1': 1.0, '0': 0.0, '0.5': 0.5
+}
+
+
+def parseResult(text: t.Union[str, None]) -> t.Union[float, None]:
+    # score of white, None for an unknown or unfinished ('*') result
+    return RESULTS.get((text or '').strip(), None)
@@ -0,0 +1,217 @@
+import chess
+import search as s
+
+import argparse
+import csv
+import multiprocessing as mp
+import queue
+import time
+import typing as t
+from multiprocessing import shared_memory
+
+# Lazy SMP: every worker process runs an iterative deepening search of the
+# same root. The workers only share the transposition table, which lives in
+# shared memory, and diverge because helpers start one depth ahead and see
+# entries stored by the others at different times.
+
+REPORT = 0
+DONE = 1
+
+
+def _searchWorker(
+    workerId: int,
+    fen: str,
+    shmName: str,
+    hashSizeMB: float,
+    generation: int,
+    maxDepth: int,
+    limits: t.Dict[str, int],
+    stopEvent,
+    results
+    ) -> None:
+
+    shm = shared_memory.SharedMemory(name = shmName)
+    tt = s.TranspositionTable(hashSizeMB, shm.buf)
+    tt.generation = generation
+
+    ns = s.NegaSearch(maxDepth, tt = tt, sharedStop = stopEvent)
+    board = chess.Board(fen)
+
+    def report(depth: int, line: t.List[t.Tuple[chess.Move, float]]) -> None:
+        results.put((
+            REPORT, workerId, depth,
+            [(m.uci(), v) for m, v in line],
+            ns.nodes, ns.qnodes
+        ))
+
+    try:
+        # odd helpers search one depth ahead
+        ns.iterativeSearch(
+            board,
+            maxDepth = maxDepth,
+            startDepth = 1 + workerId % 2,
+            infoCallback = report,
+            **limits
+        )
+    finally:
+        results.put((DONE, workerId, ns.completedDepth, ns.stats.toDict(), ns.nodes, ns.qnodes))
+        tt.release()
+        shm.close()
+
+
+class LazySMP:
+    def __init__(self, maxDepth: int, threads: int = 2, hashSizeMB: float = 16) -> None:
+        self.maxDepth: int = maxDepth
+        self.threads: int = threads
+        self.hashSizeMB: float = hashSizeMB
+
+        self.shm = shared_memory.SharedMemory(
+            create = True,
+            size = s.TranspositionTable.bufferSize(hashSizeMB)
+        )
+        self.tt: s.TranspositionTable = s.TranspositionTable(hashSizeMB, self.shm.buf)
+        self.tt.clear()
+
+        self.stopEvent = mp.Event()
+        self.generation: int = 0
+
+        # results of the last search, aggregated over the workers
+        self.nodes: int = 0
+        self.qnodes: int = 0
+        self.completedDepth: int = 0
+        self.workerNodes: t.Dict[int, int] = {}
+        self.stats: s.SearchStats = s.SearchStats()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+
+    def close(self) -> None:
+        self.tt.release()
+        self.shm.close()
+        self.shm.unlink()
+
+    def search(self,
+        board: chess.Board,
+        maxDepth: int = None,
+        infoCallback: t.Callable[[int, t.List[t.Tuple[chess.Move, float]]], None] = None,
+        **limits
+        ) -> t.List[t.Tuple[chess.Move, float]]:
+
+        # limits: movetime, wtime, btime, winc, binc, movestogo as in
+        #         NegaSearch.iterativeSearch
+        # Returns the PV of the deepest iteration completed by any worker,
+        # infoCallback(depth, line) is called when it gets deeper.
+
+        if(maxDepth == None):
+            maxDepth = self.maxDepth
+
+        self.stopEvent.clear()
+        results = mp.Queue()
+
+        workers: t.List[mp.Process] = [
+            mp.Process(
+                target = _searchWorker,
+                args = (
+                    i, board.fen(), self.shm.name, self.hashSizeMB,
+                    self.generation, maxDepth, limits, self.stopEvent, results
+                ),
+                daemon = True
+            )
+            for i in range(self.threads)
+        ]
+
+        self.generation = (self.generation + 1) & s.TranspositionTable.MAX_GENERATION
+
+        for w in workers:
+            w.start()
+
+        nodes: t.Dict[int, t.Tuple[int, int]] = {}
+        done: t.Set[int] = set()
+        stats: s.SearchStats = s.SearchStats()
+
+        bestDepth: int = 0
+        bestLine: t.List[t.Tuple[chess.Move, float]] = []
+
+        while(len(done) < self.threads):
+            try:
+                # line is the PV of a report and the statistics of done
+                kind, workerId, depth, line, n, qn = results.get(timeout = 0.1)
+            except queue.Empty:
+                # a worker that died without reporting is done
+                for i, w in enumerate(workers):
+                    if(i not in done and not w.is_alive() and results.empty()):
+                        done.add(i)
+
+                        if(i == 0):
+                            self.stopEvent.set()
+                continue
+
+            nodes[workerId] = (n, qn)
+            self.nodes = sum(v[0] for v in nodes.values())
+            self.qnodes = sum(v[1] for v in nodes.values())
+
+            if(kind == REPORT and depth > bestDepth):
+                bestDepth = depth
+                bestLine = [(chess.Move.from_uci(m), v) for m, v in line]
+
+                if(infoCallback != None):
+                    infoCallback(depth, bestLine)
+
+            if(kind == DONE):
+                done.add(workerId)
+                stats = stats.merge(s.SearchStats.fromDict(line))
+
+                # the helpers stop with the main worker
+                if(workerId == 0):
+                    self.stopEvent.set()
+
+        for w in workers:
+            w.join()
+
+        self.completedDepth = bestDepth
+        self.stats = stats
+        self.workerNodes = {i: n + qn for i, (n, qn) in nodes.items()}
+
+        return bestLine
+
+
+def bench(fens: t.List[str], threadCounts: t.List[int], depth: int, hashSizeMB: float) -> None:
+    # time to depth on the same positions for every number of workers
+    baseTime: float = None
+
+    print(f'{"threads":>8} {"time":>9} {"nodes":>10} {"nps":>8} {"speedup":>8}')
+    for threads in threadCounts:
+        smp = LazySMP(depth, threads, hashSizeMB)
+
+        totalNodes: int = 0
+        start: float = time.perf_counter()
+        for fen in fens:
+            smp.tt.clear()
+            smp.search(chess.Board(fen))
+            totalNodes += smp.nodes + smp.qnodes
+
+        elapsed: float = time.perf_counter() - start
+        smp.close()
+
+        if(baseTime == None):
+            baseTime = elapsed
+
+        print(
+            f'{threads:>8} {elapsed:>8.2f}s {totalNodes:>10} '
+            f'{int(totalNodes / elapsed):>8} {baseTime / elapsed:>7.2f}x'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Lazy SMP scaling benchmark')
+    parser.add_argument('--threads', type = int, nargs = '+', default = [1, 2, 4])
+    parser.add_argument('--depth', type = int, default = 4)
+    parser.add_argument('--hash', type = float, default = 16, help = 'table size in MB')
+    parser.add_argument('--dataset', default = '../dataset.csv')
+    parser.add_argument('--positions', type = int, default = 10)
+    args = parser.parse_args()
+
+    with open(args.dataset) as fp:
+        fens = [row['Fen'] for row in csv.DictReader(fp)][:args.positions]
+
+    bench(fens, args.threads, args.depth, args.hash)
@@ -0,0 +1,351 @@
+import chess
+import chess.pgn
+import search as s
+
+import argparse
+import bz2
+import csv
+import io
+import multiprocessing as mp
+import os
+import random
+import re
+import time
+import typing as t
+import zlib
+from dataclasses import dataclass, field
+
+# Streams games out of (possibly compressed) PGN files, keeps the ones
+# whose headers match, samples positions of them and writes the positions
+# to csv shards with the columns of dataset.csv (San, Fen, UCI) and the
+# Result of the game.
+#
+# The main process only splits the text at game boundaries and filters
+# by header, the moves of the matching games are parsed by a pool of
+# workers. Positions are deduplicated by Zobrist key.
+
+HEADER_RE = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+OUTPUT_COLUMNS: t.List[str] = ['San', 'Fen', 'UCI', 'Result']
+
+
+@dataclass
+class GameFilter:
+    # headers a game has to match, None accepts anything
+    results: t.List[str] = field(default_factory = lambda: ['1-0', '0-1'])
+    minElo: t.Union[int, None] = None
+    event: t.Union[str, None] = None          # regex searched in Event
+    timeControl: t.Union[str, None] = None    # regex searched in TimeControl
+
+    def __post_init__(self) -> None:
+        self.eventRe = re.compile(self.event) if self.event != None else None
+        self.timeControlRe = re.compile(self.timeControl) if self.timeControl != None else None
+
+    def matches(self, headers: t.Dict[str, str]) -> bool:
+        if(self.results != None and headers.get('Result') not in self.results):
+            return False
+
+        if(self.minElo != None):
+            for key in ['WhiteElo', 'BlackElo']:
+                try:
+                    if(int(headers.get(key, '')) < self.minElo):
+                        return False
+                except ValueError:
+                    return False
+
+        if(self.eventRe != None and not self.eventRe.search(headers.get('Event', ''))):
+            return False
+
+        if(self.timeControlRe != None and not self.timeControlRe.search(headers.get('TimeControl', ''))):
+            return False
+
+        return True
+
+
+@dataclass
+class SamplingRules:
+    perGame: int = 1            # positions sampled from every game
+    minPly: int = 20            # first ply that can be sampled
+    maxPly: t.Union[int, None] = None
+    winnerToMove: bool = True   # only positions where the winner moves
+    skipChecks: bool = False    # no positions with the side to move in check
+    skipCaptures: bool = False  # no positions where the move played captures
+    seed: int = 0
+
+
+def openPGN(path: str) -> t.TextIO:
+    # text stream of a .pgn, .pgn.bz2 or .pgn.zst file
+    if(path.endswith('.bz2')):
+        return bz2.open(path, 'rt', encoding = 'utf-8', errors = 'replace')
+
+    if(path.endswith('.zst')):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('reading .zst files needs the zstandard package (pip install zstandard)')
+
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd = True)
+        return io.TextIOWrapper(reader, encoding = 'utf-8', errors = 'replace')
+
+    return open(path, encoding = 'utf-8', errors = 'replace')
+
+
+def iterGames(stream: t.TextIO) -> t.Iterator[t.Tuple[t.Dict[str, str], str]]:
+    # Yields (headers, text) of every game, a game starts with the first
+    # header line that follows movetext. The moves are not parsed.
+    headers: t.Dict[str, str] = {}
+    lines: t.List[str] = []
+    inMoves: bool = False
+
+    for line in stream:
+        if(line.startswith('[')):
+            if(inMoves):
+                yield headers, ''.join(lines)
+                headers, lines, inMoves = {}, [], False
+
+            match = HEADER_RE.match(line)
+            if(match):
+                headers[match.group(1)] = match.group(2)
+        elif(line.strip() != ''):
+            inMoves = True
+
+        lines.append(line)
+
+    if(len(lines) > 0 and (inMoves or len(headers) > 0)):
+        yield headers, ''.join(lines)
+
+
+def samplePositions(
+    text: str,
+    rules: SamplingRules,
+    zobrist: s.ZobristHash
+    ) -> t.List[t.Tuple[int, t.List[str]]]:
+
+    # (zobrist key, [San, Fen, UCI, Result]) of the positions sampled from
+    # the game, the sample only depends on the game and the seed
+    game = chess.pgn.read_game(io.StringIO(text))
+    if(game == None):
+        return []
+
+    result: str = game.headers.get('Result', '*')
+    winner: t.Union[chess.Color, None] = {'1-0': chess.WHITE, '0-1': chess.BLACK}.get(result)
+    if(rules.winnerToMove and winner == None):
+        return []
+
+    board = game.board()
+    key: int = zobrist.hashOfPosition(board)
+    candidates: t.List[t.Tuple[int, t.List[str]]] = []
+
+    for ply, move in enumerate(game.mainline_moves()):
+        if(ply >= rules.minPly and (rules.maxPly == None or ply <= rules.maxPly)
+            and (not rules.winnerToMove or board.turn == winner)
+            and (not rules.skipChecks or not board.is_check())
+            and (not rules.skipCaptures or not board.is_capture(move))
+        ):
+            candidates.append((key, [board.san(move), board.fen(), move.uci(), result]))
+
+        key = zobrist.makeMove(board, move, key)
+        board.push(move)
+
+    rand = random.Random(rules.seed ^ zlib.crc32(text.encode()))
+    if(len(candidates) <= rules.perGame):
+        return candidates
+
+    return [candidates[i] for i in sorted(rand.sample(range(len(candidates)), rules.perGame))]
+
+
+_workerRules: SamplingRules = None
+_workerZobrist: s.ZobristHash = None
+
+def _initWorker(rules: SamplingRules) -> None:
+    global _workerRules, _workerZobrist
+    _workerRules = rules
+    _workerZobrist = s.ZobristHash()
+
+def _sampleChunk(texts: t.List[str]) -> t.List[t.Tuple[int, t.List[str]]]:
+    out: t.List[t.Tuple[int, t.List[str]]] = []
+    for text in texts:
+        out += samplePositions(text, _workerRules, _workerZobrist)
+
+    return out
+
+
+class ShardWriter:
+    # csv files of at most shardSize rows: <prefix>-00000.csv, ...
+    def __init__(self, outDir: str, prefix: str = 'positions', shardSize: int = 100000) -> None:
+        self.outDir: str = outDir
+        self.prefix: str = prefix
+        self.shardSize: int = shardSize
+
+        self.paths: t.List[str] = []
+        self.rows: int = 0
+        self.fp: t.Union[t.TextIO, None] = None
+        self.writer = None
+
+        os.makedirs(outDir, exist_ok = True)
+
+    def write(self, row: t.List[str]) -> None:
+        if(self.fp == None or self.rows % self.shardSize == 0):
+            self._nextShard()
+
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def _nextShard(self) -> None:
+        self.close()
+
+        path: str = os.path.join(self.outDir, f'{self.prefix}-{len(self.paths):05d}.csv')
+        self.paths.append(path)
+        self.fp = open(path, 'w', newline = '')
+        self.writer = csv.writer(self.fp)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def close(self) -> None:
+        if(self.fp != None):
+            self.fp.close()
+            self.fp = None
+
+
+@dataclass
+class PipelineStats:
+    games: int = 0
+    matched: int = 0
+    positions: int = 0
+    duplicates: int = 0
+
+
+def _chunks(
+    games: t.Iterator[t.Tuple[t.Dict[str, str], str]],
+    gameFilter: GameFilter,
+    chunkGames: int,
+    maxGames: t.Union[int, None],
+    stats: PipelineStats
+    ) -> t.Iterator[t.List[str]]:
+
+    # texts of the matching games in lists of chunkGames
+    chunk: t.List[str] = []
+    for headers, text in games:
+        if(maxGames != None and stats.matched >= maxGames):
+            break
+
+        stats.games += 1
+        if(not gameFilter.matches(headers)):
+            continue
+
+        stats.matched += 1
+        chunk.append(text)
+
+        if(len(chunk) >= chunkGames):
+            yield chunk
+            chunk = []
+
+    if(len(chunk) > 0):
+        yield chunk
+
+
+def runPipeline(
+    inputs: t.List[str],
+    outDir: str,
+    gameFilter: GameFilter = None,
+    rules: SamplingRules = None,
+    processes: int = None,
+    chunkGames: int = 200,
+    shardSize: int = 100000,
+    maxGames: int = None
+    ) -> PipelineStats:
+
+    # processes: workers parsing the games, 1 parses in this process
+    # maxGames: stops after this many matching games
+    gameFilter = gameFilter if gameFilter != None else GameFilter()
+    rules = rules if rules != None else SamplingRules()
+
+    stats = PipelineStats()
+    seen: t.Set[int] = set()
+    writer = ShardWriter(outDir, shardSize = shardSize)
+
+    def games() -> t.Iterator[t.Tuple[t.Dict[str, str], str]]:
+        for path in inputs:
+            with openPGN(path) as stream:
+                yield from iterGames(stream)
+
+    chunks = _chunks(games(), gameFilter, chunkGames, maxGames, stats)
+
+    pool: t.Union[mp.pool.Pool, None] = None
+    if(processes == 1):
+        _initWorker(rules)
+        results = map(_sampleChunk, chunks)
+    else:
+        pool = mp.Pool(processes, initializer = _initWorker, initargs = (rules,))
+        # ordered, the output does not depend on the number of workers
+        results = pool.imap(_sampleChunk, chunks)
+
+    try:
+        for positions in results:
+            for key, row in positions:
+                if(key in seen):
+                    stats.duplicates += 1
+                    continue
+
+                seen.add(key)
+                writer.write(row)
+                stats.positions += 1
+    finally:
+        writer.close()
+        if(pool != None):
+            pool.terminate()
+            pool.join()
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Filter PGN games and sample positions to csv shards')
+    parser.add_argument('inputs', nargs = '+', help = '.pgn, .pgn.bz2 or .pgn.zst files')
+    parser.add_argument('--out', default = 'positions')
+    parser.add_argument('--results', nargs = '*', default = ['1-0', '0-1'], help = 'accepted results, none for any')
+    parser.add_argument('--min-elo', type = int, default = None)
+    parser.add_argument('--event', default = None, help = 'regex on the Event header')
+    parser.add_argument('--time-control', default = None, help = 'regex on the TimeControl header')
+    parser.add_argument('--per-game', type = int, default = 1)
+    parser.add_argument('--min-ply', type = int, default = 20)
+    parser.add_argument('--max-ply', type = int, default = None)
+    parser.add_argument('--any-side', action = 'store_true', help = 'sample positions of both sides, not only the winner')
+    parser.add_argument('--skip-checks', action = 'store_true')
+    parser.add_argument('--skip-captures', action = 'store_true')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--processes', type = int, default = None)
+    parser.add_argument('--chunk-games', type = int, default = 200)
+    parser.add_argument('--shard-size', type = int, default = 100000)
+    parser.add_argument('--max-games', type = int, default = None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = runPipeline(
+        args.inputs,
+        args.out,
+        GameFilter(
+            results = args.results if len(args.results) > 0 else None,
+            minElo = args.min_elo,
+            event = args.event,
+            timeControl = args.time_control
+        ),
+        SamplingRules(
+            perGame = args.per_game,
+            minPly = args.min_ply,
+            maxPly = args.max_ply,
+            winnerToMove = not args.any_side,
+            skipChecks = args.skip_checks,
+            skipCaptures = args.skip_captures,
+            seed = args.seed
+        ),
+        processes = args.processes,
+        chunkGames = args.chunk_games,
+        shardSize = args.shard_size,
+        maxGames = args.max_games
+    )
+
+    elapsed = time.perf_counter() - start
+    print(
+        f'games {stats.games} matched {stats.matched} positions {stats.positions} '
+        f'duplicates {stats.duplicates} in {elapsed:.1f}s ({stats.games / max(elapsed, 1e-9):.0f} games/s)'
+    )
@@ -0,0 +1,308 @@
+import chess
+from gameresult import parseResult
+
+import argparse
+import csv
+import os
+import time
+import typing as t
+
+import numpy as np
+
+# Packed binary store of dataset positions, so that consumers do not have
+# to keep the FEN text around and parse it again on every load.
+#
+# A store file is a 16 byte header (MAGIC, version, record size) followed
+# by fixed size records:
+#   occupied -> bitboard of the occupied squares
+#   pieces   -> 4 bit code of the piece on every occupied square, in
+#               square order, low nibble first (PIECE_CODES)
+#   flags    -> bit 0 white to move, bits 1-4 castling rights KQkq
+#   epSquare -> en passant square, NO_SQUARE if none
+#   halfmove, fullmove
+#   move     -> from | to << 6 | promotion piece type << 12, NO_MOVE if none
+#   score    -> centipawns from the side to move, NO_SCORE if none
+#   result   -> 2 white won, 1 draw, 0 black won, NO_RESULT if none
+# The file is read with np.memmap, records are decoded only when asked for.
+
+MAGIC: bytes = b'EVPS'
+VERSION: int = 1
+HEADER_SIZE: int = 16
+
+RECORD_DTYPE = np.dtype([
+    ('occupied', '<u8'),
+    ('pieces', 'u1', (16,)),
+    ('flags', 'u1'),
+    ('epSquare', 'u1'),
+    ('halfmove', 'u1'),
+    ('fullmove', '<u2'),
+    ('move', '<u2'),
+    ('score', '<i2'),
+    ('result', 'u1')
+])
+
+NO_SQUARE: int = 64
+NO_MOVE: int = 0xFFFF
+NO_SCORE: int = np.iinfo(np.int16).min
+NO_RESULT: int = 0xFF
+
+# piece codes 1-6 white pawn to king, 7-12 black pawn to king, 0 empty
+PIECE_CODES: t.List[t.Union[chess.Piece, None]] = [None] + \
+    [chess.Piece(pt, chess.WHITE) for pt in chess.PIECE_TYPES] + \
+    [chess.Piece(pt, chess.BLACK) for pt in chess.PIECE_TYPES]
+
+CASTLING_CORNERS: t.List[int] = [chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8]
+
+
+def pieceCode(piece: chess.Piece) -> int:
+    return piece.piece_type + (0 if piece.color == chess.WHITE else 6)
+
+
+def encodeMove(move: t.Union[chess.Move, None]) -> int:
+    if(move == None):
+        return NO_MOVE
+
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decodeMove(code: int) -> t.Union[chess.Move, None]:
+    if(code == NO_MOVE):
+        return None
+
+    return chess.Move(code & 63, code >> 6 & 63, (code >> 12) or None)
+
+
+def encodeResult(result: t.Union[float, None]) -> int:
+    # result: 1.0, 0.5 or 0.0 from white, as in gameresult.RESULTS
+    return NO_RESULT if result == None else int(round(result * 2))
+
+
+def encode(
+    board: chess.Board,
+    move: chess.Move = None,
+    score: int = None,
+    result: float = None,
+    out: np.void = None
+    ) -> np.void:
+
+    # record of the position, written into out (a record of an array) if given
+    record: np.void = out if out is not None else np.zeros(1, dtype = RECORD_DTYPE)[0]
+
+    pieces: bytearray = bytearray(16)
+    for i, square in enumerate(chess.scan_forward(board.occupied)):
+        if(i >= 32):
+            raise ValueError(f'more than 32 pieces: {board.fen()}')
+
+        pieces[i >> 1] |= pieceCode(board.piece_at(square)) << ((i & 1) * 4)
+
+    flags: int = 1 if board.turn == chess.WHITE else 0
+    for i, corner in enumerate(CASTLING_CORNERS):
+        if(board.castling_rights & corner):
+            flags |= 2 << i
+
+    record['occupied'] = board.occupied
+    record['pieces'] = np.frombuffer(bytes(pieces), dtype = np.uint8)
+    record['flags'] = flags
+    record['epSquare'] = NO_SQUARE if board.ep_square == None else board.ep_square
+    record['halfmove'] = min(board.halfmove_clock, 255)
+    record['fullmove'] = min(board.fullmove_number, 0xFFFF)
+    record['move'] = encodeMove(move)
+    record['score'] = NO_SCORE if score == None else score
+    record['result'] = encodeResult(result)
+
+    return record
+
+
+def decodeBoard(record: np.void) -> chess.Board:
+    occupied: int = int(record['occupied'])
+    pieces: bytes = record['pieces'].tobytes()
+
+    masks: t.List[int] = [0] * 13
+    for i, square in enumerate(chess.scan_forward(occupied)):
+        masks[pieces[i >> 1] >> ((i & 1) * 4) & 15] |= chess.BB_SQUARES[square]
+
+    # the bitboards are set directly, much faster than a FEN or a piece map
+    board = chess.Board(None)
+    board.pawns = masks[1] | masks[7]
+    board.knights = masks[2] | masks[8]
+    board.bishops = masks[3] | masks[9]
+    board.rooks = masks[4] | masks[10]
+    board.queens = masks[5] | masks[11]
+    board.kings = masks[6] | masks[12]
+    board.occupied_co[chess.WHITE] = masks[1] | masks[2] | masks[3] | masks[4] | masks[5] | masks[6]
+    board.occupied_co[chess.BLACK] = occupied & ~board.occupied_co[chess.WHITE]
+    board.occupied = occupied
+
+    flags: int = int(record['flags'])
+    board.turn = bool(flags & 1)
+    board.castling_rights = 0
+    for i, corner in enumerate(CASTLING_CORNERS):
+        if(flags & (2 << i)):
+            board.castling_rights |= corner
+
+    epSquare: int = int(record['epSquare'])
+    board.ep_square = None if epSquare == NO_SQUARE else epSquare
+    board.halfmove_clock = int(record['halfmove'])
+    board.fullmove_number = int(record['fullmove'])
+
+    return board
+
+
+class PositionWriter:
+    # Appends records to a store file, buffered in blocks of bufferSize.
+    def __init__(self, path: str, bufferSize: int = 4096) -> None:
+        self.path: str = path
+        self.buffer: np.ndarray = np.zeros(bufferSize, dtype = RECORD_DTYPE)
+        self.used: int = 0
+        self.count: int = 0
+
+        self.fp = open(path, 'wb')
+        self.fp.write(MAGIC + np.array([VERSION, RECORD_DTYPE.itemsize], dtype = '<u4').tobytes() + bytes(4))
+
+    def write(self, board: chess.Board, move: chess.Move = None, score: int = None, result: float = None) -> None:
+        encode(board, move, score, result, out = self.buffer[self.used])
+        self.used += 1
+        self.count += 1
+
+        if(self.used == len(self.buffer)):
+            self.flush()
+
+    def flush(self) -> None:
+        self.fp.write(self.buffer[:self.used].tobytes())
+        self.used = 0
+
+    def close(self) -> None:
+        if(self.fp != None):
+            self.flush()
+            self.fp.close()
+            self.fp = None
+
+    def __enter__(self) -> 'PositionWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class PositionStore:
+    # Memory-mapped reader of a store file. Records are only decoded when
+    # asked for, as chess.Board objects or as whole NumPy arrays.
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as fp:
+            header: bytes = fp.read(HEADER_SIZE)
+
+        if(len(header) < HEADER_SIZE or header[:4] != MAGIC):
+            raise ValueError(f'{path} is not a position store')
+
+        version, itemsize = np.frombuffer(header[4:12], dtype = '<u4')
+        if(version != VERSION or itemsize != RECORD_DTYPE.itemsize):
+            raise ValueError(f'{path} has version {version}, expected {VERSION}')
+
+        self.path: str = path
+        count: int = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self.records: np.ndarray = np.memmap(path, dtype = RECORD_DTYPE, mode = 'r', offset = HEADER_SIZE, shape = (count,)) \
+            if count > 0 else np.zeros(0, dtype = RECORD_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def board(self, i: int) -> chess.Board:
+        return decodeBoard(self.records[i])
+
+    def move(self, i: int) -> t.Union[chess.Move, None]:
+        return decodeMove(int(self.records[i]['move']))
+
+    def boards(self, start: int = 0, stop: int = None) -> t.Iterator[chess.Board]:
+        # lazily decoded boards of records start:stop
+        for record in self.records[start:stop]:
+            yield decodeBoard(record)
+
+    def samples(self, start: int = 0, stop: int = None) -> t.Iterator[t.Tuple[chess.Board, t.Union[chess.Move, None]]]:
+        for record in self.records[start:stop]:
+            yield decodeBoard(record), decodeMove(int(record['move']))
+
+    @property
+    def moves(self) -> np.ndarray:
+        return self.records['move']
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self.records['score']
+
+    @property
+    def results(self) -> np.ndarray:
+        # 1.0, 0.5 or 0.0 from white, nan where there is none
+        raw: np.ndarray = np.asarray(self.records['result'])
+        return np.where(raw == NO_RESULT, np.nan, raw / 2.0)
+
+    def pieceArrays(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # (n, 64) piece code of every square of records start:stop, vectorized
+        records: np.ndarray = self.records[start:stop]
+        occupied: np.ndarray = np.unpackbits(
+            np.ascontiguousarray(records['occupied']).astype('<u8').view(np.uint8).reshape(-1, 8),
+            axis = 1, bitorder = 'little'
+        ).astype(bool)
+
+        packed: np.ndarray = np.asarray(records['pieces'])
+        codes: np.ndarray = np.stack([packed & 15, packed >> 4], axis = 2).reshape(-1, 32)
+
+        # the k-th occupied square holds the k-th code
+        rank: np.ndarray = np.minimum(np.cumsum(occupied, axis = 1) - 1, 31).clip(0)
+        return np.where(occupied, np.take_along_axis(codes, rank, axis = 1), 0).astype(np.int8)
+
+    def bitboards(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # (n, 12) bitboards of records start:stop, in the order of PIECE_CODES[1:]
+        codes: np.ndarray = self.pieceArrays(start, stop)
+        planes: np.ndarray = codes[:, None, :] == np.arange(1, 13, dtype = np.int8)[None, :, None]
+        return np.packbits(planes, axis = 2, bitorder = 'little').view('<u8')[:, :, 0]
+
+
+def convertCSV(csvPath: str, storePath: str) -> int:
+    # Converts a dataset csv (Fen and UCI columns, optional Result and
+    # Score) to a store, returns the number of positions written.
+    with open(csvPath) as fp, PositionWriter(storePath) as writer:
+        for row in csv.DictReader(fp):
+            board = chess.Board(row['Fen'])
+            move: t.Union[chess.Move, None] = chess.Move.from_uci(row['UCI']) if row.get('UCI') else None
+            score: t.Union[int, None] = int(row['Score']) if row.get('Score') else None
+            result: t.Union[float, None] = parseResult(row.get('Result'))
+
+            writer.write(board, move, score, result)
+
+        return writer.count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Packed binary position store')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    convertParser = subparsers.add_parser('convert', help = 'convert a dataset csv to a store')
+    convertParser.add_argument('csv')
+    convertParser.add_argument('store')
+
+    infoParser = subparsers.add_parser('info', help = 'size and load times of a store against its csv')
+    infoParser.add_argument('store')
+    infoParser.add_argument('--csv', default = None)
+
+    args = parser.parse_args()
+
+    if(args.command == 'convert'):
+        start = time.perf_counter()
+        count = convertCSV(args.csv, args.store)
+        print(f'{count} positions written to {args.store} in {time.perf_counter() - start:.2f}s')
+    else:
+        start = time.perf_counter()
+        store = PositionStore(args.store)
+        boards = list(store.boards())
+        storeTime = time.perf_counter() - start
+        print(f'{len(store)} positions, {os.path.getsize(args.store)} bytes, boards in {storeTime:.3f}s')
+
+        start = time.perf_counter()
+        store.bitboards()
+        print(f'bitboards in {time.perf_counter() - start:.3f}s')
+
+        if(args.csv != None):
+            start = time.perf_counter()
+            with open(args.csv) as fp:
+                boards = [chess.Board(row['Fen']) for row in csv.DictReader(fp)]
+            print(f'csv {os.path.getsize(args.csv)} bytes, boards in {time.perf_counter() - start:.3f}s')
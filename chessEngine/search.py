@@ -1,4 +1,5 @@
 import chess
+import chess.polyglot
 import evalfuction as ef
 import oldevalfuction as oef
 
@@ -6,148 +7,192 @@ import utility as u
 
 import random as r
 import typing as t
-from dataclasses import dataclass 
+from dataclasses import dataclass, field, asdict
 import enum
+import struct
 import copy
+import json
+import time
+import threading
+
+# Keys of the piece-square table are stored in a flat list, the key of
+# a piece on a square is pieceSquareHash[PIECE_KEY_OFFSET[color][pieceType] + square].
+# The layout is the one of polyglot: 64 * (2 * (pieceType - 1) + color) + square
+PIECE_KEY_OFFSET: t.List[t.List[int]] = [
+    [0] + [64 * (2 * (p - 1) + c) for p in chess.PIECE_TYPES]
+    for c in [chess.BLACK, chess.WHITE]
+]
 
 class ZobristHash:
+    DEFAULT_SEED: int = 0x2545F4914F6CDD1D
+
+    # offsets into chess.polyglot.POLYGLOT_RANDOM_ARRAY
+    POLYGLOT_CASTLING: int = 768
+    POLYGLOT_EN_PASSANT: int = 772
+    POLYGLOT_TURN: int = 780
+
+    def __init__(self, 
+        debug: bool = False, 
+        seed: int = DEFAULT_SEED, 
+        polyglot: bool = False
+        ) -> None:
+
+        # seed: keys are the same in every process for the same seed
+        # polyglot: use the standard polyglot keys, the hash of a position
+        #           is then the one used by opening books and other tools
+        self.debug: bool = debug
+        self.seed: int = seed
+        self.polyglot: bool = polyglot
+
+        self.pieceSquareHash: t.List[int] = []
+
+        # indexed by the side to move, turnHash switches between them
+        self.sideHash: t.List[int] = [0, 0]
+        self.turnHash: int = 0
+
+        # indexed by the castle ID
+        self.castlingRightsHash: t.List[int] = [] 
+        self.passantFileHash: t.List[int] = []
+
+        if(polyglot):
+            self._genPolyglotArray()
+        else:
+            self._genRandomArray()
 
-    def __init__(self) -> None:
-        self.pieceSquareHash = {}
-        self.blackTurnHash = None
-        self.castlingRightsHash = {} 
-        self.passantFileHash = {}
-
-        self.randomNumbersUsed = []
-
-        self._genRandomArray()
+        self.turnHash = self.sideHash[chess.WHITE] ^ self.sideHash[chess.BLACK]
 
     def _genRandomArray(self) -> None:
-        
-        # (square, color, piece)
-        for s in chess.SQUARES:
-            for c in [chess.WHITE, chess.BLACK]:
-                for p in chess.PIECE_TYPES:
-                    self.pieceSquareHash[(s, c, p)] = self._getRandom()
+        rand = r.Random(self.seed)
+        used: t.Set[int] = set()
 
-        self.blackTurnHash = self._getRandom()
+        self.pieceSquareHash = [self._getRandom(rand, used) for _ in range(12 * 64)]
+        self.sideHash[chess.BLACK] = self._getRandom(rand, used)
 
         # (white kingside, white queenside, black kingside, black queenside)
+        self.castlingRightsHash = [self._getRandom(rand, used) for _ in range(16)]
+        self.passantFileHash = [self._getRandom(rand, used) for _ in range(8)]
+
+    def _genPolyglotArray(self) -> None:
+        keys: t.List[int] = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+        self.pieceSquareHash = list(keys[0:(12 * 64)])
+
+        # polyglot xors the turn key when white is to move
+        self.sideHash[chess.WHITE] = keys[self.POLYGLOT_TURN]
+
+        # polyglot has a key per right, the castle ID bits are in the same order
+        self.castlingRightsHash = [0] * 16
         for i in range(0, 16):
-            self.castlingRightsHash[i] = self._getRandom()
+            for bit in range(0, 4):
+                if(i & (1 << bit)):
+                    self.castlingRightsHash[i] ^= keys[self.POLYGLOT_CASTLING + bit]
 
-        for f in range(0, 8):
-            self.passantFileHash[f] = self._getRandom()
+        self.passantFileHash = list(keys[self.POLYGLOT_EN_PASSANT:(self.POLYGLOT_EN_PASSANT + 8)])
 
     def getInitalZobristKey(self) -> int:
-        key = 0
-        
-        # white pawns
-        key ^= self.pieceSquareHash[(chess.A2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.B2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.C2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.D2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.E2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.F2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.G2, chess.WHITE, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.H2, chess.WHITE, chess.PAWN)]
-
-        # white pieces
-        key ^= self.pieceSquareHash[(chess.A1, chess.WHITE, chess.ROOK)]
-        key ^= self.pieceSquareHash[(chess.B1, chess.WHITE, chess.KNIGHT)]
-        key ^= self.pieceSquareHash[(chess.C1, chess.WHITE, chess.BISHOP)]
-        key ^= self.pieceSquareHash[(chess.D1, chess.WHITE, chess.QUEEN)]
-        key ^= self.pieceSquareHash[(chess.E1, chess.WHITE, chess.KING)]
-        key ^= self.pieceSquareHash[(chess.F1, chess.WHITE, chess.BISHOP)]
-        key ^= self.pieceSquareHash[(chess.G1, chess.WHITE, chess.KNIGHT)]
-        key ^= self.pieceSquareHash[(chess.H1, chess.WHITE, chess.ROOK)]
-
-
-        # black pawns
-        key ^= self.pieceSquareHash[(chess.A7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.B7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.C7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.D7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.E7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.F7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.G7, chess.BLACK, chess.PAWN)]
-        key ^= self.pieceSquareHash[(chess.H7, chess.BLACK, chess.PAWN)]
-
-        # black pieces
-        key ^= self.pieceSquareHash[(chess.A8, chess.BLACK, chess.ROOK)]
-        key ^= self.pieceSquareHash[(chess.B8, chess.BLACK, chess.KNIGHT)]
-        key ^= self.pieceSquareHash[(chess.C8, chess.BLACK, chess.BISHOP)]
-        key ^= self.pieceSquareHash[(chess.D8, chess.BLACK, chess.QUEEN)]
-        key ^= self.pieceSquareHash[(chess.E8, chess.BLACK, chess.KING)]
-        key ^= self.pieceSquareHash[(chess.F8, chess.BLACK, chess.BISHOP)]
-        key ^= self.pieceSquareHash[(chess.G8, chess.BLACK, chess.KNIGHT)]
-        key ^= self.pieceSquareHash[(chess.H8, chess.BLACK, chess.ROOK)]
-
-        # all sides castling possible
-        key ^= self.castlingRightsHash[15]
-
-        return key
+        return self.hashOfPosition(chess.Board())
 
-    def _getCastlingRightsAfterMoveHash(self, 
+    def _epCapturers(self, 
         board: chess.Board, 
-        move: chess.Move
+        epSquare: chess.Square, 
+        color: chess.Color
         ) -> int:
 
-        beforeMoveCastleID: int = self._getCastleID(board)
-        board.push(move)
-        afterMoveCastleID: int = self._getCastleID(board)
-        board.pop()
+        # pawns of color that could capture en passant on epSquare,
+        # the en passant file is only hashed if there is at least one
+        # (same convention as polyglot)
+        return chess.BB_PAWN_ATTACKS[not color][epSquare] \
+            & board.pawns & board.occupied_co[color]
 
-        return self.castlingRightsHash[beforeMoveCastleID] ^ \
-        self.castlingRightsHash[afterMoveCastleID]
+    def makeMove(self, board: chess.Board, move: chess.Move, key: int) -> int:
+        # Returns the key after move is made on board. The change is derived
+        # from the move and the position before the move only, board is
+        # neither pushed nor modified.
+        color: chess.Color = board.turn
 
-    def _getPieceMoveHash(self, board: chess.Board, move: chess.Move) -> int:
-        fromSquare: chess.Square = move.from_square
-        toSquare: chess.Square = move.to_square
+        ## turn
+        newKey: int = key ^ self.turnHash
 
-        movedPiece = board.piece_at(fromSquare)
+        ## en passant file of the current position
+        epSquare: t.Union[chess.Square, None] = board.ep_square
+        if(epSquare != None and self._epCapturers(board, epSquare, color)):
+            newKey ^= self.passantFileHash[chess.square_file(epSquare)]
 
-        # None if no piece is captured
-        capturedPiece = board.piece_at(toSquare) 
+        if(move == chess.Move.null()):
+            return self._verify(board, move, newKey)
 
-        if(capturedPiece == None):
-            return \
-               self.pieceSquareHash[(fromSquare, movedPiece.color, movedPiece.piece_type)]\
-            ^  self.pieceSquareHash[(toSquare, movedPiece.color, movedPiece.piece_type)] 
-
-        return \
-           self.pieceSquareHash[(fromSquare, movedPiece.color, movedPiece.piece_type)]\
-        ^  self.pieceSquareHash[(toSquare, movedPiece.color, movedPiece.piece_type)]\
-        ^  self.pieceSquareHash[(toSquare, capturedPiece.color, capturedPiece.piece_type)]
- 
-    def _getEnPassantFileHash(self, board: chess.Board, move: chess.Move) -> int:
-        beforeEnPassantFiles = self._getEnPassantFiles(board)
-        board.push(move)
-        afterEnPassantFiles = self._getEnPassantFiles(board)
-        board.pop()
+        fromSquare: chess.Square = move.from_square
+        toSquare: chess.Square = move.to_square
 
-        finalHash = 0
-        for f in (beforeEnPassantFiles + afterEnPassantFiles):
-            finalHash ^= self.passantFileHash[f]
+        movedPiece: int = board.piece_type_at(fromSquare)
+        capturedPiece: t.Union[int, None] = board.piece_type_at(toSquare)
+        toBB: int = chess.BB_SQUARES[toSquare]
 
-        return finalHash 
+        ## piece move
+        if(movedPiece == chess.KING and (
+            abs(chess.square_file(toSquare) - chess.square_file(fromSquare)) == 2 
+            or board.occupied_co[color] & toBB
+        )):
+            # castling, given as e1g1 or as king takes own rook (e1h1)
+            rank: int = chess.square_rank(fromSquare)
+            aSide: bool = chess.square_file(toSquare) < chess.square_file(fromSquare)
+
+            if(board.occupied_co[color] & toBB):
+                rookFrom: chess.Square = toSquare 
+            else:
+                rookFrom: chess.Square = chess.square(0 if aSide else 7, rank)
 
-    def makeMove(self, board: chess.Board, move: chess.Move, key: int) -> int:
-        p = board.piece_at(move.to_square)
+            kingTo: chess.Square = chess.square(2 if aSide else 6, rank)
+            rookTo: chess.Square = chess.square(3 if aSide else 5, rank)
 
-        if(p == chess.KING or p == chess.ROOK):
-            key ^= self._getCastlingRightsAfterMoveHash(board, move) 
-            
-        ## piece move
-        if(move != chess.Move.null()):
-            key ^= self._getPieceMoveHash(board, move) 
-        
-        ## turn
-        key ^= self.blackTurnHash 
+            newKey ^= self.pieceSquareHash[PIECE_KEY_OFFSET[color][chess.KING] + fromSquare] \
+                ^ self.pieceSquareHash[PIECE_KEY_OFFSET[color][chess.KING] + kingTo] \
+                ^ self.pieceSquareHash[PIECE_KEY_OFFSET[color][chess.ROOK] + rookFrom] \
+                ^ self.pieceSquareHash[PIECE_KEY_OFFSET[color][chess.ROOK] + rookTo]
+        else:
+            if(capturedPiece != None):
+                newKey ^= self.pieceSquareHash[PIECE_KEY_OFFSET[not color][capturedPiece] + toSquare]
+            elif(movedPiece == chess.PAWN and toSquare == epSquare):
+                # en passant, the captured pawn is behind the target square
+                capturedSquare = toSquare - 8 if color == chess.WHITE else toSquare + 8 
+                newKey ^= self.pieceSquareHash[PIECE_KEY_OFFSET[not color][chess.PAWN] + capturedSquare]
+
+            placedPiece: int = move.promotion if move.promotion else movedPiece
+
+            newKey ^= self.pieceSquareHash[PIECE_KEY_OFFSET[color][movedPiece] + fromSquare] \
+                ^ self.pieceSquareHash[PIECE_KEY_OFFSET[color][placedPiece] + toSquare]
+
+        ## castling rights, cleaned as in hashOfPosition (a FEN may give
+        ## rights without the king or rook on its square)
+        rights: int = board.clean_castling_rights()
+        if(rights):
+            rightsAfter: int = rights & ~(chess.BB_SQUARES[fromSquare] | toBB)
+            if(movedPiece == chess.KING):
+                rightsAfter &= ~(chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8)
+
+            if(rightsAfter != rights):
+                newKey ^= self.castlingRightsHash[self._castleIDOfRights(rights)] \
+                    ^ self.castlingRightsHash[self._castleIDOfRights(rightsAfter)]
+
+        ## en passant file after a double pawn push
+        if(movedPiece == chess.PAWN and abs(toSquare - fromSquare) == 16):
+            newEpSquare: chess.Square = (fromSquare + toSquare) // 2
+
+            if(self._epCapturers(board, newEpSquare, not color)):
+                newKey ^= self.passantFileHash[chess.square_file(newEpSquare)]
+
+        return self._verify(board, move, newKey)
+
+    def _verify(self, board: chess.Board, move: chess.Move, key: int) -> int:
+        # debug mode, compares the incremental key with the full hash
+        if(self.debug):
+            board.push(move)
+            fullKey: int = self.hashOfPosition(board)
+            fen: str = board.fen()
+            board.pop()
 
-        ## en passant
-        if(p == chess.PAWN):
-            key ^= self._getEnPassantFileHash(board, move)
+            assert key == fullKey, \
+                f'incremental hash mismatch after {move}: {key} != {fullKey} ({fen})'
 
         return key
 
@@ -160,43 +205,38 @@ class ZobristHash:
         piecePositionHash: int = 0
         for s, p in pieceMap.items():
 
-            piecePositionHash ^= self.pieceSquareHash[(
-                s, p.color, p.piece_type 
-            )]
+            piecePositionHash ^= self.pieceSquareHash[PIECE_KEY_OFFSET[p.color][p.piece_type] + s]
         
         # turn
-        blackTurnHash = self.blackTurnHash if board.turn == chess.BLACK else 0
+        turnHash = self.sideHash[board.turn]
 
-        # en passant files
+        # en passant file
         enPassantHash = 0
-        for f in self._getEnPassantFiles(board):
-            enPassantHash ^= self.passantFileHash[f]               
+        epSquare = board.ep_square
+        if(epSquare != None and self._epCapturers(board, epSquare, board.turn)):
+            enPassantHash = self.passantFileHash[chess.square_file(epSquare)]               
 
-        return castlingHash ^ piecePositionHash ^ enPassantHash ^ blackTurnHash 
-    
-    def _getEnPassantFiles(self, board: chess.Board) -> t.List[int]:
-        legalMoves = board.legal_moves
-
-        return [
-            chess.square_file(move.to_square) 
-            for move in legalMoves 
-                if (board.is_en_passant(move))
-            ]
+        return castlingHash ^ piecePositionHash ^ enPassantHash ^ turnHash 
 
-    def _getCastleID(self, board: chess.Board) -> int:
-        wk = int(board.has_kingside_castling_rights(chess.WHITE))
-        wq = int(board.has_queenside_castling_rights(chess.WHITE))
-        bk = int(board.has_kingside_castling_rights(chess.BLACK))
-        bq = int(board.has_queenside_castling_rights(chess.BLACK))
+    def _castleIDOfRights(self, rights: int) -> int:
+        # (white kingside, white queenside, black kingside, black queenside)
+        wk = (rights >> chess.H1) & 1
+        wq = (rights >> chess.A1) & 1
+        bk = (rights >> chess.H8) & 1
+        bq = (rights >> chess.A8) & 1
 
         return u.listToBinary([wk, wq, bk, bq]) 
 
-    def _getRandom(self) -> int: 
-        num = r.getrandbits(64)
-        while(num in self.randomNumbersUsed):
-            num = r.getrandbits(64)
+    def _getCastleID(self, board: chess.Board) -> int:
+        return self._castleIDOfRights(board.clean_castling_rights()) 
+
+    @staticmethod
+    def _getRandom(rand: r.Random, used: t.Set[int]) -> int: 
+        num = rand.getrandbits(64)
+        while(num in used):
+            num = rand.getrandbits(64)
 
-        self.randomNumbersUsed.append(num)
+        used.add(num)
         return num 
 
 @enum.unique
@@ -214,20 +254,216 @@ class TTEntry:
 
 
 class TranspositionTable:
-    def __init__(self) -> None:
-        self.table: t.Dict[int, TTEntry] = {}
+    # Fixed size table made of buckets with two slots, indexed by hash & mask.
+    # Slot 0 of a bucket is depth-preferred, slot 1 is always replaced.
+    # Entries are stored in three preallocated arrays of 64 bit words:
+    #   keys   -> zobrist key ^ value bits ^ data
+    #   values -> bits of the value as a double
+    #   data   -> packed fields
+    #             bits  0 - 15: best move (from | to << 6 | promotion << 12)
+    #             bits 16 - 23: depth
+    #             bits 24 - 25: node type
+    #             bits 26 - 31: generation of the search that stored it
+    # The key is stored xored with the other two words (lockless hashing), 
+    # when several processes share the table an entry that was written by 
+    # two of them at the same time fails the key check instead of mixing 
+    # the fields of different positions.
+    ENTRY_SIZE: int  = 24
+    BUCKET_SIZE: int = 2
+    MAX_GENERATION: int = 0x3F
+
+    NODE_TYPES: t.List[NodeType] = [
+        None, 
+        NodeType.UPPERBOUND, 
+        NodeType.LOWERBOUND, 
+        NodeType.EXACT
+    ]
+
+    NODE_TYPE_IDS: t.Dict[NodeType, int] = {
+        NodeType.UPPERBOUND: 1,
+        NodeType.LOWERBOUND: 2,
+        NodeType.EXACT: 3
+    }
+
+    DOUBLE: struct.Struct = struct.Struct('d')
+    QWORD: struct.Struct = struct.Struct('Q')
+
+    def __init__(self, sizeMB: float = 16, buffer = None) -> None:
+        # buffer: memory to store the table in (e.g. the buf of a 
+        #         multiprocessing.shared_memory.SharedMemory), at least
+        #         bufferSize(sizeMB) bytes, a new bytearray if None
+        self.numBuckets: int = self._numBuckets(sizeMB)
+        self.mask: int = self.numBuckets - 1
+        self.size: int = self.numBuckets * self.BUCKET_SIZE
+        self.generation: int = 0
+
+        if(buffer == None):
+            buffer = bytearray(self.size * self.ENTRY_SIZE)
+
+        self.buffer = buffer
+        self._mapArrays(self.buffer)
+
+    @classmethod
+    def _numBuckets(cls, sizeMB: float) -> int:
+        numEntries: int = int(sizeMB * 1024 * 1024) // cls.ENTRY_SIZE
+        numBuckets: int = max(numEntries // cls.BUCKET_SIZE, 1)
+
+        # rounded down to a power of two so the index is a mask
+        return 1 << (numBuckets.bit_length() - 1)
+
+    @classmethod
+    def bufferSize(cls, sizeMB: float) -> int:
+        return cls._numBuckets(sizeMB) * cls.BUCKET_SIZE * cls.ENTRY_SIZE
+
+    def _mapArrays(self, buffer) -> None:
+        self.view = memoryview(buffer)
+        n: int = self.size * 8
+
+        self.keys = self.view[0:n].cast('Q')
+        self.valueBits = self.view[n:(2 * n)].cast('Q')
+        self.data = self.view[(2 * n):(3 * n)].cast('Q')
+
+    def release(self) -> None:
+        # has to be called before closing a shared memory buffer
+        for v in [self.keys, self.valueBits, self.data, self.view]:
+            v.release()
+
+    @classmethod
+    def _valueBits(cls, value: float) -> int:
+        return cls.QWORD.unpack(cls.DOUBLE.pack(value))[0]
+
+    @classmethod
+    def _bitsValue(cls, bits: int) -> float:
+        return cls.DOUBLE.unpack(cls.QWORD.pack(bits))[0]
 
-    def isInTable(self, hash:int) -> bool:
-        return hash in self.table
+    @staticmethod
+    def _packMove(move: chess.Move) -> int:
+        if(move == None):
+            return 0
+
+        promotion: int = move.promotion if move.promotion != None else 0
+        return move.from_square | (move.to_square << 6) | (promotion << 12)
+
+    @staticmethod
+    def _unpackMove(packed: int) -> t.Union[chess.Move, None]:
+        if(packed == 0):
+            return None
 
-    def add(self, hash: int, value: float, depth: int, nodeType: NodeType):
-        self.table[hash] = TTEntry(value = value, depth = depth, nodeType = nodeType)
+        promotion: int = packed >> 12
+        return chess.Move(
+            packed & 0x3F, 
+            (packed >> 6) & 0x3F, 
+            promotion if promotion != 0 else None
+        )
+
+    def _probe(self, hash: int) -> t.Tuple[int, int, int]:
+        # every word is read once, returns (index, data, value bits) 
+        # of the verified entry or index -1
+        index: int = (hash & self.mask) << 1
+
+        for i in [index, index + 1]:
+            data: int = self.data[i]
+            valueBits: int = self.valueBits[i]
+
+            if(data != 0 and (self.keys[i] ^ data ^ valueBits) == hash):
+                return i, data, valueBits
+
+        return -1, 0, 0
+
+    def newSearch(self) -> None:
+        # entries of older searches are replaced first
+        self.generation = (self.generation + 1) & self.MAX_GENERATION
+
+    def clear(self) -> None:
+        self.buffer[:] = bytes(len(self.buffer))
+        self.generation = 0
+
+    def isInTable(self, hash:int) -> bool:
+        return self._probe(hash)[0] != -1
 
     def add(self, hash: int, entry: TTEntry):
-        self.table[hash] = entry 
+        index: int = (hash & self.mask) << 1
+        
+        old: int = self.data[index]
+        oldDepth: int = (old >> 16) & 0xFF
+        oldGeneration: int = (old >> 26) & self.MAX_GENERATION
+
+        depth: int = max(0, min(entry.depth, 0xFF))
+
+        # depth-preferred slot is kept unless it is empty, stale or shallower
+        if(old != 0 and oldGeneration == self.generation and depth < oldDepth):
+            index += 1
+
+        data: int = \
+            self._packMove(entry.bestMove) \
+            | (depth << 16) \
+            | (self.NODE_TYPE_IDS[entry.nodeType] << 24) \
+            | (self.generation << 26)
+
+        valueBits: int = self._valueBits(entry.value)
+
+        self.keys[index] = hash ^ valueBits ^ data
+        self.valueBits[index] = valueBits
+        self.data[index] = data
 
     def get(self, hash: int) -> t.Union[TTEntry, None]:
-        return self.table.get(hash, None) 
+        index, data, valueBits = self._probe(hash)
+
+        if(index == -1):
+            return None
+
+        return TTEntry(
+            value = self._bitsValue(valueBits),
+            depth = (data >> 16) & 0xFF,
+            nodeType = self.NODE_TYPES[(data >> 24) & 0x3],
+            bestMove = self._unpackMove(data & 0xFFFF)
+        )
+
+class EvalCache:
+    # Static evaluations by zobrist key. Direct mapped (index hash & mask),
+    # a new entry always replaces the old one. The full key is stored
+    # next to the value to verify that a slot holds the position probed.
+    ENTRY_SIZE: int = 16
+
+    def __init__(self, sizeMB: float = 4) -> None:
+        numEntries: int = max(int(sizeMB * 1024 * 1024) // self.ENTRY_SIZE, 1)
+
+        # rounded down to a power of two so the index is a mask
+        self.size: int = 1 << (numEntries.bit_length() - 1)
+        self.mask: int = self.size - 1
+
+        self.buffer = bytearray(self.size * self.ENTRY_SIZE)
+        view = memoryview(self.buffer)
+        self.keys = view[0:(self.size * 8)].cast('Q')
+        self.values = view[(self.size * 8):].cast('d')
+
+        # evaluation the entries were computed with, see validate
+        self.evaluationKey: t.Tuple = ()
+
+    def clear(self) -> None:
+        self.buffer[:] = bytes(len(self.buffer))
+
+    def validate(self, evaluation: ef.EvalFunc) -> None:
+        # drops the entries when the evaluation function or its 
+        # parameters changed since they were stored
+        evaluationKey = (id(evaluation), evaluation.mobility, tuple(vars(evaluation.parameters).values()))
+
+        if(evaluationKey != self.evaluationKey):
+            self.clear()
+            self.evaluationKey = evaluationKey
+
+    def get(self, hash: int) -> t.Union[float, None]:
+        index: int = hash & self.mask
+        if(self.keys[index] == hash):
+            return self.values[index]
+
+        return None
+
+    def add(self, hash: int, value: float) -> None:
+        index: int = hash & self.mask
+        self.keys[index] = hash
+        self.values[index] = value
+
 
 class MoveOrdering:
     
@@ -274,7 +510,12 @@ class MoveOrdering:
 
         return 0 
 
-    def orderMoves(self, board: chess.Board, depth: int) -> t.List[chess.Move]:
+    def orderMoves(self, 
+        board: chess.Board, 
+        depth: int, 
+        hashMove: chess.Move = None
+        ) -> t.List[chess.Move]:
+
         moves = []
 
         for move in board.legal_moves:
@@ -287,14 +528,25 @@ class MoveOrdering:
             if(not isCapture):
                 priority += self._killerMoveBonus(depth, move)
 
-            # if(move == self.bestMove):
-            #     priority += self.BESTOVE_BONUS
+            # best move of an earlier (shallower) search of this position
+            if(move == hashMove):
+                priority += self.BESTOVE_BONUS
 
             moves.append((priority, move))
 
         moves = sorted(moves, key = lambda k: k[0], reverse = True)
         return [m[1] for m in moves] 
 
+    def orderCaptures(self, board: chess.Board) -> t.List[chess.Move]:
+        # most valuable victim / least valuable attacker
+        moves = [
+            (self._capturedPieceBonus(board, move)[0], move)
+            for move in board.generate_legal_captures()
+        ]
+
+        moves = sorted(moves, key = lambda k: k[0], reverse = True)
+        return [m[1] for m in moves] 
+
     def setBestMove(self, move: chess.Move) -> None:
         self.bestMove = move
 
@@ -308,28 +560,417 @@ class MoveOrdering:
         else:
             self.killerMoves[depth] = [move]
         
+@dataclass
+class SearchStats:
+    # Counters collected during a search, cheap enough to be always on.
+    nodes: int = 0
+    qnodes: int = 0
+    ttProbes: int = 0
+    ttHits: int = 0
+    ttCutoffs: int = 0
+    nullMoveTries: int = 0
+    nullMoveCutoffs: int = 0
+    failHighs: int = 0
+    failHighsFirst: int = 0
+    evalProbes: int = 0
+    evalHits: int = 0
+    pawnProbes: int = 0
+    pawnHits: int = 0
+    time: float = 0.0
+    searches: int = 0
+
+    # nodes + qnodes of every completed iteration, index 0 is depth 1
+    iterationNodes: t.List[int] = field(default_factory = list)
+
+    @property
+    def totalNodes(self) -> int:
+        return self.nodes + self.qnodes
+
+    @property
+    def nps(self) -> float:
+        return self.totalNodes / self.time if self.time > 0 else 0.0
+
+    @property
+    def ttHitRate(self) -> float:
+        return self.ttHits / self.ttProbes if self.ttProbes > 0 else 0.0
+
+    @property
+    def evalHitRate(self) -> float:
+        return self.evalHits / self.evalProbes if self.evalProbes > 0 else 0.0
+
+    @property
+    def pawnHitRate(self) -> float:
+        return self.pawnHits / self.pawnProbes if self.pawnProbes > 0 else 0.0
+
+    @property
+    def firstMoveFailHighRate(self) -> float:
+        # how often the cutoff came from the first move searched, a measure
+        # of the move ordering
+        return self.failHighsFirst / self.failHighs if self.failHighs > 0 else 0.0
+
+    @property
+    def branchingFactors(self) -> t.List[float]:
+        # effective branching factor of depth d: nodes(d) / nodes(d - 1)
+        n = self.iterationNodes
+        return [n[i] / n[i - 1] if n[i - 1] > 0 else 0.0 for i in range(1, len(n))]
+
+    def merge(self, other: 'SearchStats') -> 'SearchStats':
+        # sum of both, e.g. to aggregate the searches of a batch run
+        out = SearchStats()
+        for name in [
+            'nodes', 'qnodes', 'ttProbes', 'ttHits', 'ttCutoffs', 
+            'nullMoveTries', 'nullMoveCutoffs', 'failHighs', 
+            'failHighsFirst', 'evalProbes', 'evalHits', 'pawnProbes', 
+            'pawnHits', 'time', 'searches'
+        ]:
+            setattr(out, name, getattr(self, name) + getattr(other, name))
+
+        length = max(len(self.iterationNodes), len(other.iterationNodes))
+        out.iterationNodes = [
+            (self.iterationNodes[i] if i < len(self.iterationNodes) else 0) + 
+            (other.iterationNodes[i] if i < len(other.iterationNodes) else 0)
+            for i in range(length)
+        ]
+
+        return out
+
+    def toDict(self) -> t.Dict[str, t.Any]:
+        out = asdict(self)
+        out['nps'] = self.nps
+        out['ttHitRate'] = self.ttHitRate
+        out['evalHitRate'] = self.evalHitRate
+        out['pawnHitRate'] = self.pawnHitRate
+        out['firstMoveFailHighRate'] = self.firstMoveFailHighRate
+        out['branchingFactors'] = self.branchingFactors
+
+        return out
+
+    def toJSON(self) -> str:
+        return json.dumps(self.toDict())
+
+    @classmethod
+    def fromDict(cls, d: t.Dict[str, t.Any]) -> 'SearchStats':
+        names = cls.__dataclass_fields__.keys()
+        return cls(**{k: v for k, v in d.items() if k in names})
+
 class NegaSearch:
-    def __init__(self, maxDepth: int) -> None:
+    def __init__(self, 
+        maxDepth: int, 
+        hashSizeMB: float = 16,
+        quiescence: bool = True,
+        qsearchChecks: bool = False,
+        debugHash: bool = False,
+        tt: TranspositionTable = None,
+        sharedStop = None,
+        incrementalEval: bool = True,
+        debugEval: bool = False,
+        evalCacheSizeMB: float = 4
+        ) -> None:
+
+        # tt: table to use instead of a new one of hashSizeMB (e.g. shared
+        #     between processes)
+        # sharedStop: event shared with other searches (e.g. a 
+        #     multiprocessing.Event), stops the search when set and, unlike 
+        #     stopEvent, is never cleared by it
+        # incrementalEval: material and piece-square sums are updated on
+        #     make/unmake instead of being recomputed at every leaf, 
+        #     debugEval checks them against the full computation
+        # evalCacheSizeMB: size of the cache of static evaluations, 0 
+        #     evaluates every leaf
+
         self.maxDepth: int = maxDepth
         self.evaluation: ef.EvalFunc = ef.EvalFunc() 
 
-        self.tt: TranspositionTable = TranspositionTable()
-        self.hashFunc = ZobristHash()
+        self.tt: TranspositionTable = tt if tt != None else TranspositionTable(hashSizeMB)
+        self.hashFunc = ZobristHash(debugHash)
         self.ordering = MoveOrdering()
         self.NULLMOVE_DEPTH = 2
 
+        # incremental evaluation, the state is created for the root of 
+        # every search
+        self.incrementalEval: bool = incrementalEval
+        self.debugEval: bool = debugEval
+        self.evalState: t.Union[ef.EvalState, None] = None
+        self.evalCache: t.Union[EvalCache, None] = \
+            EvalCache(evalCacheSizeMB) if evalCacheSizeMB > 0 else None
+
+        # quiescence search
+        self.useQuiescence: bool = quiescence
+        self.qsearchChecks: bool = qsearchChecks
+        self.DELTA_MARGIN: float = 200
+        self.QS_CHECK_PLIES: int = 1
+        self.pieceValues: t.Dict[int, float] = {}
+        self._updatePieceValues()
+
+        # time control
+        self.TIME_CHECK_INTERVAL: int = 64 
+        self.MOVES_TO_GO: int         = 30
+        self.MOVE_OVERHEAD: float     = 0.05
+
+        self.stopEvent: threading.Event = threading.Event()
+        self.sharedStop = sharedStop
+        self.stopped: bool = False
+        self.deadline: t.Union[float, None] = None
+        self.startTime: float = 0.0
+        self.completedDepth: int = 0
+
+        # statistics of the last search
+        self.stats: SearchStats = SearchStats()
+
+    def clear(self) -> None:
+        # forgets what earlier searches left behind (table, killer moves,
+        # cached evaluations and pawn structures), the next search gives 
+        # the same result as one of a new NegaSearch
+        self.tt.clear()
+        self.ordering = MoveOrdering()
+
+        if(self.evalCache != None):
+            self.evalCache.clear()
+
+        if(self.evaluation.pawnHash != None):
+            self.evaluation.pawnHash.clear()
+
+    def config(self) -> t.Dict[str, t.Any]:
+        # keyword arguments of NegaSearch (and of its EvalFunc under 
+        # 'evaluation') that build a search configured like this one
+        return {
+            'maxDepth': self.maxDepth,
+            'hashSizeMB': self.tt.size * TranspositionTable.ENTRY_SIZE / (1024 * 1024),
+            'quiescence': self.useQuiescence,
+            'qsearchChecks': self.qsearchChecks,
+            'incrementalEval': self.incrementalEval,
+            'debugEval': self.debugEval,
+            'evalCacheSizeMB': 0 if self.evalCache == None \
+                else self.evalCache.size * EvalCache.ENTRY_SIZE / (1024 * 1024),
+            'evaluation': {
+                'params': self.evaluation.parameters,
+                'mobility': self.evaluation.mobility,
+                'pawnHashEntries': 0 if self.evaluation.pawnHash == None else self.evaluation.pawnHash.size
+            }
+        }
+
+    @classmethod
+    def fromConfig(cls, config: t.Dict[str, t.Any]) -> 'NegaSearch':
+        config = dict(config)
+        evaluation: t.Dict[str, t.Any] = config.pop('evaluation')
+
+        ns = cls(**config)
+        ns.evaluation = ef.EvalFunc(**evaluation)
+
+        return ns
+
+    @property
+    def nodes(self) -> int:
+        return self.stats.nodes
+
+    @property
+    def qnodes(self) -> int:
+        return self.stats.qnodes
+
     def search(self, board: chess.Board) -> None:
         initalHash = self.hashFunc.hashOfPosition(board)
 
+        self._startSearch(board, None)
+        self.completedDepth = 0
         self.auxSearch(board, self.maxDepth, initalHash)
+        self.completedDepth = self.maxDepth
+
+        self.stats.iterationNodes.append(self.stats.totalNodes)
+        self._updateStats()
 
         return self.getPVLine(board, initalHash)
+
+    def iterativeSearch(self, 
+        board: chess.Board,
+        maxDepth: int = None,
+        movetime: int = None,
+        wtime: int = None,
+        btime: int = None,
+        winc: int = 0,
+        binc: int = 0,
+        movestogo: int = None,
+        startDepth: int = 1,
+        infoCallback: t.Callable[[int, t.List[t.Tuple[chess.Move, float]]], None] = None
+        ) -> t.List[t.Tuple[chess.Move, float]]:
+
+        # Searches depth startDepth, startDepth + 1 ... until maxDepth is 
+        # reached or the time budget runs out. Times are in milliseconds 
+        # (as in UCI). The transposition table is kept between iterations 
+        # so that the best moves of shallower iterations are searched first
+        # in deeper ones. Returns the PV of the deepest completed iteration.
+        # infoCallback(depth, line) is called after every completed iteration.
+
+        if(maxDepth == None):
+            maxDepth = self.maxDepth
+
+        initalHash = self.hashFunc.hashOfPosition(board)
+        budget = self._allocateTime(board, movetime, wtime, btime, winc, binc, movestogo)
+
+        self._startSearch(board, budget)
+        self.completedDepth = 0
+
+        line: t.List[t.Tuple[chess.Move, float]] = []
+        previousNodes: int = 0
+        for depth in range(startDepth, maxDepth + 1):
+            self.auxSearch(board, depth, initalHash)
+
+            # the aborted iteration is incomplete, keep the previous line
+            if(self.stopped):
+                break
+
+            line = self.getPVLine(board, initalHash, depth)
+            self.completedDepth = depth
+
+            self.stats.iterationNodes.append(self.stats.totalNodes - previousNodes)
+            previousNodes = self.stats.totalNodes
+            self._updateStats()
+
+            if(infoCallback != None):
+                infoCallback(depth, line)
+
+            # the next iteration takes several times longer than this one,
+            # do not start it if it cannot finish
+            if(budget != None and self._elapsed() > budget / 2):
+                break
+
+        self._updateStats()
+        return line
+
+    def stop(self) -> None:
+        # Can be called from another thread, the search returns the
+        # last completed iteration.
+        self.stopEvent.set()
+
+    def _startSearch(self, board: chess.Board, budget: t.Union[float, None]) -> None:
+        self.tt.newSearch()
+        self.startTime = time.perf_counter()
+        self.deadline = None if budget == None else self.startTime + budget
+        self.stopped = False
+        self.stopEvent.clear()
+        self.stats = SearchStats(searches = 1)
+
+        # the evaluation parameters can change between searches
+        self._updatePieceValues()
+        self.evaluation.newSearch()
+
+        if(self.evalCache != None):
+            self.evalCache.validate(self.evaluation)
+
+        self.evalState = None
+        if(self.incrementalEval):
+            self.evalState = ef.EvalState(self.evaluation, self.debugEval)
+            self.evalState.reset(board)
+
+    def _updatePieceValues(self) -> None:
+        params: ef.Parameters = self.evaluation.parameters
+        self.pieceValues = {
+            chess.PAWN: params.pValue,
+            chess.KNIGHT: params.kValue,
+            chess.BISHOP: params.bValue,
+            chess.ROOK: params.rValue,
+            chess.QUEEN: params.qValue,
+            chess.KING: 0
+        }
+
+    def _push(self, board: chess.Board, move: chess.Move) -> None:
+        if(self.evalState != None and self.evalState.tracks(board)):
+            self.evalState.push(board, move)
+        else:
+            board.push(move)
+
+    def _pop(self, board: chess.Board) -> None:
+        if(self.evalState != None and self.evalState.tracks(board)):
+            self.evalState.pop(board)
+        else:
+            board.pop()
+
+    def _childHash(self, board: chess.Board, move: chess.Move, hash: int) -> t.Union[int, None]:
+        # keys below the leaves are only needed by the evaluation cache
+        if(hash == None or self.evalCache == None):
+            return None
+
+        return self.hashFunc.makeMove(board, move, hash)
+
+    def _evaluate(self, board: chess.Board, hash: int = None) -> float:
+        # hash: key of board, looked up in the evaluation cache
+        cache: t.Union[EvalCache, None] = self.evalCache if hash != None else None
+
+        if(cache != None):
+            self.stats.evalProbes += 1
+            value = cache.get(hash)
+
+            if(value != None):
+                self.stats.evalHits += 1
+                return value
+
+        if(self.evalState != None and self.evalState.tracks(board)):
+            value = self.evaluation.testEval2(board, self.evalState)
+        else:
+            value = self.evaluation.testEval2(board)
+
+        if(cache != None):
+            cache.add(hash, value)
+
+        return value
+
+    def _updateStats(self) -> None:
+        self.stats.time = self._elapsed()
+
+        pawnHash: t.Union[ef.PawnHashTable, None] = self.evaluation.pawnHash
+        if(pawnHash != None):
+            self.stats.pawnProbes = pawnHash.probes
+            self.stats.pawnHits = pawnHash.hits
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self.startTime
+
+    def _allocateTime(self, 
+        board: chess.Board,
+        movetime: int,
+        wtime: int,
+        btime: int,
+        winc: int,
+        binc: int,
+        movestogo: int
+        ) -> t.Union[float, None]:
+
+        # returns the budget in seconds, None means no time limit
+        if(movetime != None):
+            return max(movetime / 1000 - self.MOVE_OVERHEAD, 0.0)
+
+        remaining = wtime if board.turn == chess.WHITE else btime 
+        increment = winc if board.turn == chess.WHITE else binc
+
+        if(remaining == None):
+            return None
+
+        movesLeft = movestogo if movestogo else self.MOVES_TO_GO
+        budget = remaining / movesLeft + increment * 0.75
+        budget = min(budget, remaining / 2)
+
+        return max(budget / 1000 - self.MOVE_OVERHEAD, 0.0)
+
+    def _checkStop(self) -> None:
+        # the first iteration is always completed so there is a move to play
+        if(self.completedDepth == 0):
+            return
+
+        if(self.stopEvent.is_set()):
+            self.stopped = True
+        elif(self.sharedStop != None and self.sharedStop.is_set()):
+            self.stopped = True
+        elif(self.deadline != None and time.perf_counter() >= self.deadline):
+            self.stopped = True
     
     def getPVLine(self, 
         board: chess.Board, 
-        hash: int
+        hash: int,
+        maxLength: int = None
         ) -> t.List[t.Tuple[chess.Move, float]]:
 
+        if(maxLength == None):
+            maxLength = self.maxDepth
+
         line: t.List[t.Tuple[chess.Move, float]] = []
 
         ttEntry = self.tt.get(hash)
@@ -338,7 +979,7 @@ class NegaSearch:
         while(
             ttEntry != None and 
             ttEntry.bestMove != None and 
-            lineLen <= self.maxDepth
+            lineLen <= maxLength
         ):
             line.append((ttEntry.bestMove, ttEntry.value))
             hash = self.hashFunc.makeMove(tempBoard, ttEntry.bestMove, hash) 
@@ -365,6 +1006,102 @@ class NegaSearch:
 
         return True 
 
+    def _capturedValue(self, board: chess.Board, move: chess.Move) -> float:
+        if(board.is_en_passant(move)):
+            return self.pieceValues[chess.PAWN]
+
+        value: float = self.pieceValues[board.piece_type_at(move.to_square)]
+        if(move.promotion != None):
+            value += self.pieceValues[move.promotion] - self.pieceValues[chess.PAWN]
+
+        return value
+
+    def quiesce(self, 
+        board: chess.Board, 
+        alpha: float, 
+        beta: float, 
+        qdepth: int = 0,
+        hash: int = None
+        ) -> float:
+
+        # Searches captures (and, optionally, checks on the first plies)
+        # until the position is quiet so leaves are not evaluated in the
+        # middle of an exchange. hash: key of board for the evaluation 
+        # cache, the positions are evaluated without it when None.
+
+        self.stats.qnodes += 1
+        if(self.stats.qnodes % self.TIME_CHECK_INTERVAL == 0):
+            self._checkStop()
+
+        if(self.stopped):
+            return 0.0
+
+        # with checks enabled a check has to be answered, standing pat
+        # is not an option
+        if(self.qsearchChecks and board.is_check()):
+            bestEval = float('-inf')
+            for move in self.ordering.orderMoves(board, 0):
+                newHash = self._childHash(board, move, hash)
+                self._push(board, move)
+                value = -self.quiesce(board, -beta, -alpha, qdepth + 1, newHash)
+                self._pop(board)
+
+                if(self.stopped):
+                    return 0.0
+
+                bestEval = max(bestEval, value)
+                alpha = max(alpha, value)
+                if(alpha >= beta):
+                    break
+
+            # checkmate
+            if(bestEval == float('-inf')):
+                return -u.FLOAT_MAX
+
+            return bestEval
+
+        standPat: float = self._evaluate(board, hash)
+        if(standPat >= beta):
+            return standPat
+
+        # delta pruning, not even winning a queen would raise alpha 
+        if(standPat + self.pieceValues[chess.QUEEN] + self.DELTA_MARGIN < alpha):
+            return standPat
+
+        alpha = max(alpha, standPat)
+        bestEval: float = standPat
+
+        moves: t.List[chess.Move] = self.ordering.orderCaptures(board)
+        if(self.qsearchChecks and qdepth < self.QS_CHECK_PLIES):
+            moves += [
+                move for move in board.legal_moves
+                if (not board.is_capture(move)) and board.gives_check(move)
+            ]
+
+        for move in moves:
+            isCapture: bool = board.is_capture(move)
+
+            # delta pruning, this capture cannot raise alpha
+            if(isCapture and 
+                standPat + self._capturedValue(board, move) + self.DELTA_MARGIN <= alpha
+            ):
+                continue
+
+            newHash = self._childHash(board, move, hash)
+            self._push(board, move)
+            value = -self.quiesce(board, -beta, -alpha, qdepth + 1, newHash)
+            self._pop(board)
+
+            if(self.stopped):
+                return 0.0
+
+            bestEval = max(bestEval, value)
+            alpha = max(alpha, value)
+            if(alpha >= beta):
+                break
+
+        return bestEval
+
     def auxSearch(self, 
         board: chess.Board, 
         depth: int, 
@@ -372,14 +1109,28 @@ class NegaSearch:
         alpha: float = float('-inf'), 
         beta: float = float('inf')) -> float:
 
+        stats: SearchStats = self.stats
+
+        stats.nodes += 1
+        if(stats.nodes % self.TIME_CHECK_INTERVAL == 0):
+            self._checkStop()
+
+        if(self.stopped):
+            return 0.0
+
         alphaOrg: float = alpha
         # Checking the transposition table
+        stats.ttProbes += 1
         entry: t.Union[TTEntry, None] = self.tt.get(hash) 
+        if(entry != None):
+            stats.ttHits += 1
+
         if(entry != None and (entry.depth >= depth)):
 
             value: float = entry.value
 
             if(entry.nodeType == NodeType.EXACT):
+                stats.ttCutoffs += 1
                 return value
             elif (entry.nodeType == NodeType.LOWERBOUND):
                 alpha = max(alpha, value)
@@ -387,11 +1138,15 @@ class NegaSearch:
                 beta = min(beta, value)
 
             if(alpha >= beta):
+                stats.ttCutoffs += 1
                 return value
 
         # Reached the leaf node
         if(depth <= 0):
-            return self.evaluation.testEval2(board)
+            if(self.useQuiescence):
+                return self.quiesce(board, alpha, beta, hash = hash)
+
+            return self._evaluate(board, hash)
 
         # checkmate or stalemate
         if(board.legal_moves.count() == 0):
@@ -402,19 +1157,25 @@ class NegaSearch:
 
         if(NegaSearch._canReduce(board) and not NegaSearch._possibleZugzawng(board)):
 
-            board.push(chess.Move.null())
+            stats.nullMoveTries += 1
             newHash = self.hashFunc.makeMove(board, chess.Move.null(), hash)
+            self._push(board, chess.Move.null())
             value = - self.auxSearch(board, depth - 1 - self.NULLMOVE_DEPTH, newHash, -beta, -alpha) 
-            board.pop()
+            self._pop(board)
+
+            if(self.stopped):
+                return 0.0
 
             if(value >= beta):
+                stats.nullMoveCutoffs += 1
                 return value
 
 
         # search 
         newEntry: TTEntry = TTEntry(float('-inf'), depth, NodeType.EXACT, None)
 
-        orderedMoves: t.List[chess.Move] = self.ordering.orderMoves(board, depth)
+        hashMove: chess.Move = entry.bestMove if entry != None else None
+        orderedMoves: t.List[chess.Move] = self.ordering.orderMoves(board, depth, hashMove)
         bestEval = float('-inf')
         for i, move in enumerate(orderedMoves):
 
@@ -425,24 +1186,28 @@ class NegaSearch:
 
             value = 0
             if(i == 0):
-                board.push(move)
+                self._push(board, move)
                 value = -self.auxSearch(board, depth - 1, newHash, -beta, -alpha) 
-                board.pop()
+                self._pop(board)
             else:
-                board.push(move)
+                self._push(board, move)
                 value = -self.auxSearch(board, depth - 1, newHash, -alpha - 1, -alpha)
-                board.pop()
+                self._pop(board)
 
                 if(alpha < value < beta):
-                    board.push(move)
+                    self._push(board, move)
                     value = -self.auxSearch(board, depth - 1, newHash, -beta, -value)
-                    board.pop()
+                    self._pop(board)
 
 
             #board.push(move)
             #value = -self.auxSearch(board, depth - 1, newHash, -beta, -alpha) 
             #board.pop()
 
+            # results of an aborted search must not reach the table
+            if(self.stopped):
+                return 0.0
+
             if(value > bestEval):
                 bestEval = value
                 newEntry.bestMove = move
@@ -450,13 +1215,14 @@ class NegaSearch:
             alpha = max(value, alpha)
 
             if(alpha >= beta):
+                stats.failHighs += 1
+                if(i == 0):
+                    stats.failHighsFirst += 1
+
                 if(not board.is_capture(move)):
                     self.ordering.addKillerMove(move, depth)
                 break
 
-            if(depth == self.maxDepth):
-                print(move, " ", value, " ", (move, bestEval))
-
         newEntry.value = bestEval 
 
         if(bestEval <= alphaOrg):
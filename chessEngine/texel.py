@@ -0,0 +1,350 @@
+import chess
+import evalfuction as ef
+import search as s
+from gameresult import parseResult
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing as mp
+import os
+import time
+import typing as t
+
+import numpy as np
+
+# Texel tuning: the evaluation of a quiet position, through a logistic
+# function, predicts the result of the game it comes from. The Parameters
+# are fitted by minimizing the logistic loss (cross entropy) between the
+# prediction and the result with Adam over mini-batches. As the evaluation
+# is linear in the parameters (EvalFunc.features) the gradient of a batch
+# is one matrix product.
+#
+# The training set is a feature matrix and a result vector in .npy files,
+# read memory-mapped batch by batch. With several processes every worker
+# maps the files and computes the gradient of a part of each batch.
+
+def positionResult(row: t.Dict[str, str]) -> t.Union[float, None]:
+    # result of the game of the position from white's point of view, None
+    # if the row has none (the position is not used)
+    return parseResult(row.get('Result'))
+
+
+_extractSearch: s.NegaSearch = None
+
+def _initExtractor() -> None:
+    global _extractSearch
+    _extractSearch = s.NegaSearch(0, hashSizeMB = 1, evalCacheSizeMB = 0)
+
+def _extractChunk(task: t.Tuple[t.List[t.Dict[str, str]], bool]) -> t.Tuple[np.ndarray, np.ndarray]:
+    rows, quietOnly = task
+    evaluation: ef.EvalFunc = _extractSearch.evaluation
+
+    features: t.List[np.ndarray] = []
+    results: t.List[float] = []
+
+    for row in rows:
+        result = positionResult(row)
+        if(result == None):
+            continue
+
+        board = chess.Board(row['Fen'])
+        if(board.is_game_over()):
+            continue
+
+        # quiet: the capture search does not change the static evaluation
+        if(quietOnly):
+            static: float = evaluation.testEval2(board)
+            if(_extractSearch.quiesce(board, float('-inf'), float('inf')) != static):
+                continue
+
+        # from white's point of view like the result
+        sign: int = 1 if board.turn == chess.WHITE else -1
+        features.append(sign * evaluation.features(board))
+        results.append(result)
+
+    numParams: int = len(ef.Parameters.names())
+    if(len(features) == 0):
+        return np.zeros((0, numParams), dtype = np.int16), np.zeros(0, dtype = np.float32)
+
+    return np.stack(features).astype(np.int16), np.array(results, dtype = np.float32)
+
+
+def buildTrainingSet(
+    datasetPath: t.Union[str, t.List[str]],
+    outDir: str,
+    processes: int = None,
+    quietOnly: bool = True,
+    chunkSize: int = 1000,
+    seed: int = 0
+    ) -> t.Tuple[str, str]:
+
+    # Writes features.npy and results.npy of the positions of csv files
+    # with Fen and Result columns (e.g. the shards of pgnpipeline) to
+    # outDir, shuffled so that contiguous batches are random samples.
+    # Rows without a result are skipped. Returns both paths.
+    paths: t.List[str] = [datasetPath] if isinstance(datasetPath, str) else list(datasetPath)
+    if(len(paths) == 0):
+        raise ValueError('no dataset given')
+
+    rows: t.List[t.Dict[str, str]] = []
+    for path in paths:
+        with open(path) as fp:
+            reader = csv.DictReader(fp)
+            if('Result' not in (reader.fieldnames or [])):
+                raise ValueError(f'{path} has no Result column, the positions need the result of their game')
+
+            rows += list(reader)
+
+    tasks = [(rows[i:(i + chunkSize)], quietOnly) for i in range(0, len(rows), chunkSize)]
+
+    if(processes == 1):
+        _initExtractor()
+        parts = [_extractChunk(task) for task in tasks]
+    else:
+        with mp.Pool(processes, initializer = _initExtractor) as pool:
+            parts = pool.map(_extractChunk, tasks)
+
+    features: np.ndarray = np.concatenate([p[0] for p in parts])
+    results: np.ndarray = np.concatenate([p[1] for p in parts])
+
+    order: np.ndarray = np.random.default_rng(seed).permutation(len(results))
+
+    os.makedirs(outDir, exist_ok = True)
+    outPaths = (os.path.join(outDir, 'features.npy'), os.path.join(outDir, 'results.npy'))
+    np.save(outPaths[0], features[order])
+    np.save(outPaths[1], results[order])
+
+    return outPaths
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def batchGradient(
+    features: np.ndarray,
+    results: np.ndarray,
+    weights: np.ndarray,
+    scale: float
+    ) -> t.Tuple[np.ndarray, float]:
+
+    # sum over the batch of the gradient and of the loss of
+    #   -(r log p + (1 - r) log (1 - p)),  p = sigmoid(scale * F @ w)
+    F: np.ndarray = np.asarray(features, dtype = np.float64)
+    r: np.ndarray = np.asarray(results, dtype = np.float64)
+
+    z: np.ndarray = scale * (F @ weights)
+    p: np.ndarray = _sigmoid(z)
+
+    # log(1 + e^-|z|) form, stable for large evaluations
+    loss: float = float(np.sum(np.maximum(z, 0) - z * r + np.log1p(np.exp(-np.abs(z)))))
+    gradient: np.ndarray = scale * (F.T @ (p - r))
+
+    return gradient, loss
+
+
+_trainFeatures: np.ndarray = None
+_trainResults: np.ndarray = None
+
+def _initTrainer(featuresPath: str, resultsPath: str) -> None:
+    global _trainFeatures, _trainResults
+    _trainFeatures = np.load(featuresPath, mmap_mode = 'r')
+    _trainResults = np.load(resultsPath, mmap_mode = 'r')
+
+def _gradientTask(task: t.Tuple[int, int, np.ndarray, float]) -> t.Tuple[np.ndarray, float]:
+    start, end, weights, scale = task
+    return batchGradient(_trainFeatures[start:end], _trainResults[start:end], weights, scale)
+
+
+class TexelTuner:
+    def __init__(self,
+        featuresPath: str,
+        resultsPath: str,
+        params: ef.Parameters = None,
+        frozen: t.Tuple[str, ...] = ('pValue',),
+        batchSize: int = 16384,
+        learningRate: float = 1.0,
+        processes: int = 1,
+        seed: int = 0
+        ) -> None:
+
+        # params: starting point, the defaults if None
+        # frozen: names of the parameters that are not changed, the pawn
+        #         value keeps the scale of the evaluation in centipawns
+        # learningRate: step of Adam, in units of the parameters
+        # processes: workers computing parts of every batch
+        self.featuresPath: str = featuresPath
+        self.resultsPath: str = resultsPath
+
+        self.features: np.ndarray = np.load(featuresPath, mmap_mode = 'r')
+        self.results: np.ndarray = np.load(resultsPath, mmap_mode = 'r')
+
+        self.names: t.List[str] = ef.Parameters.names()
+        self.weights: np.ndarray = (params if params != None else ef.Parameters()).toVector()
+        self.trainable: np.ndarray = np.array([name not in frozen for name in self.names], dtype = np.float64)
+
+        self.batchSize: int = batchSize
+        self.learningRate: float = learningRate
+        self.processes: int = processes
+        self.rng = np.random.default_rng(seed)
+
+        # logistic scale, evaluation in centipawns to log-odds
+        self.scale: float = np.log(10) / 400
+
+        # Adam
+        self.BETA1: float = 0.9
+        self.BETA2: float = 0.999
+        self.EPSILON: float = 1e-8
+        self.m: np.ndarray = np.zeros_like(self.weights)
+        self.v: np.ndarray = np.zeros_like(self.weights)
+        self.steps: int = 0
+
+        self.pool: t.Union[mp.pool.Pool, None] = None
+        if(processes > 1):
+            self.pool = mp.Pool(processes, initializer = _initTrainer, initargs = (featuresPath, resultsPath))
+
+    def close(self) -> None:
+        if(self.pool != None):
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    @property
+    def numPositions(self) -> int:
+        return len(self.results)
+
+    def _gradient(self, start: int, end: int, weights: np.ndarray, scale: float) -> t.Tuple[np.ndarray, float]:
+        # sum of the gradient and the loss of positions start:end
+        if(self.pool == None):
+            return batchGradient(self.features[start:end], self.results[start:end], weights, scale)
+
+        bounds = np.linspace(start, end, self.processes + 1).astype(int)
+        tasks = [(bounds[i], bounds[i + 1], weights, scale) for i in range(self.processes)]
+
+        parts = self.pool.map(_gradientTask, tasks)
+        return sum(p[0] for p in parts), sum(p[1] for p in parts)
+
+    def loss(self, weights: np.ndarray = None, scale: float = None) -> float:
+        # mean loss over the whole training set
+        if(weights is None):
+            weights = self.weights
+        if(scale == None):
+            scale = self.scale
+
+        total: float = 0.0
+        for start in range(0, self.numPositions, self.batchSize):
+            end: int = min(start + self.batchSize, self.numPositions)
+            total += self._gradient(start, end, weights, scale)[1]
+
+        return total / max(self.numPositions, 1)
+
+    def fitScale(self, low: float = 0.1, high: float = 10.0, iterations: int = 30) -> float:
+        # Scale of the logistic function that fits the current parameters
+        # best (golden section search on a multiple of the default), so
+        # that the tuning changes the parameters and not the scale.
+        base: float = self.scale
+        ratio: float = (np.sqrt(5) - 1) / 2
+
+        a, b = low, high
+        for _ in range(iterations):
+            c = b - ratio * (b - a)
+            d = a + ratio * (b - a)
+
+            if(self.loss(scale = base * c) < self.loss(scale = base * d)):
+                b = d
+            else:
+                a = c
+
+        self.scale = base * (a + b) / 2
+        return self.scale
+
+    def step(self, start: int, end: int) -> float:
+        # one Adam step on positions start:end, returns the mean loss
+        gradient, loss = self._gradient(start, end, self.weights, self.scale)
+        gradient = gradient / (end - start) * self.trainable
+
+        self.steps += 1
+        self.m = self.BETA1 * self.m + (1 - self.BETA1) * gradient
+        self.v = self.BETA2 * self.v + (1 - self.BETA2) * gradient ** 2
+
+        mHat: np.ndarray = self.m / (1 - self.BETA1 ** self.steps)
+        vHat: np.ndarray = self.v / (1 - self.BETA2 ** self.steps)
+        self.weights = self.weights - self.learningRate * mHat / (np.sqrt(vHat) + self.EPSILON)
+
+        return loss / (end - start)
+
+    def train(self,
+        epochs: int = 10,
+        callback: t.Callable[[int, float], None] = None
+        ) -> ef.Parameters:
+
+        # Runs epochs over the training set (batches in random order) and
+        # returns the tuned Parameters. callback(epoch, loss) after each.
+        starts: np.ndarray = np.arange(0, self.numPositions, self.batchSize)
+
+        for epoch in range(epochs):
+            for start in self.rng.permutation(starts):
+                self.step(start, min(start + self.batchSize, self.numPositions))
+
+            if(callback != None):
+                callback(epoch, self.loss())
+
+        return self.parameters()
+
+    def parameters(self) -> ef.Parameters:
+        return ef.Parameters.fromVector(self.weights)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Texel tuning of the evaluation parameters')
+    parser.add_argument('--dataset', nargs = '+', default = None,
+        help = 'csv files with Fen and Result columns, the pgnpipeline shards in positions/ by default')
+    parser.add_argument('--workdir', default = 'texel', help = 'directory of the training set')
+    parser.add_argument('--rebuild', action = 'store_true', help = 'extract the training set again')
+    parser.add_argument('--all', action = 'store_true', help = 'keep positions that are not quiet')
+    parser.add_argument('--epochs', type = int, default = 20)
+    parser.add_argument('--batch', type = int, default = 16384)
+    parser.add_argument('--lr', type = float, default = 1.0)
+    parser.add_argument('--processes', type = int, default = 1)
+    parser.add_argument('--output', default = None, help = 'json file for the tuned parameters')
+    args = parser.parse_args()
+
+    featuresPath = os.path.join(args.workdir, 'features.npy')
+    resultsPath = os.path.join(args.workdir, 'results.npy')
+
+    if(args.rebuild or not os.path.exists(featuresPath)):
+        datasets = args.dataset if args.dataset != None else sorted(glob.glob(os.path.join('positions', '*.csv')))
+        if(len(datasets) == 0):
+            parser.error('no dataset, run pgnpipeline.py first or give --dataset')
+
+        start = time.perf_counter()
+        featuresPath, resultsPath = buildTrainingSet(
+            datasets, args.workdir, args.processes, quietOnly = not args.all
+        )
+        print(f'training set built in {time.perf_counter() - start:.1f}s')
+
+    tuner = TexelTuner(
+        featuresPath, resultsPath,
+        batchSize = args.batch, learningRate = args.lr, processes = args.processes
+    )
+
+    try:
+        print(f'positions {tuner.numPositions}')
+        print(f'scale {tuner.fitScale():.5f} loss {tuner.loss():.5f}')
+
+        start = time.perf_counter()
+        params = tuner.train(
+            args.epochs,
+            lambda epoch, loss: print(f'epoch {epoch + 1} loss {loss:.5f} ({time.perf_counter() - start:.1f}s)')
+        )
+    finally:
+        tuner.close()
+
+    tuned = vars(params)
+    print(f'Parameters(**{json.dumps(tuned)})')
+
+    if(args.output != None):
+        with open(args.output, 'w') as fp:
+            json.dump(tuned, fp, indent = 4)
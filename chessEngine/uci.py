@@ -0,0 +1,227 @@
+import chess
+import search as s
+from lazysmp import LazySMP
+import utility as u
+
+import sys
+import threading
+import time
+import typing as t
+
+# UCI front-end, reads commands from stdin and writes the replies to stdout.
+# The search runs on a background thread so that isready and stop are
+# answered while it is running.
+
+class UCIEngine:
+    NAME: str = 'EvoChess'
+    AUTHOR: str = 'EvoChess developers'
+
+    MAX_DEPTH: int = 64
+    DEFAULT_HASH: int = 16
+    MAX_HASH: int = 4096
+    MAX_THREADS: int = 64
+
+    # go parameters that are passed on to the search
+    LIMITS: t.List[str] = ['movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo']
+
+    def __init__(self, output: t.TextIO = sys.stdout) -> None:
+        self.output: t.TextIO = output
+        self.outputLock: threading.Lock = threading.Lock()
+
+        self.hashSizeMB: int = self.DEFAULT_HASH
+        self.threads: int = 1
+
+        self.ns: s.NegaSearch = s.NegaSearch(self.MAX_DEPTH, self.hashSizeMB)
+        self.smp: t.Union[LazySMP, None] = None
+
+        self.board: chess.Board = chess.Board()
+        self.searchThread: t.Union[threading.Thread, None] = None
+        self.searchStart: float = 0.0
+
+    def send(self, line: str) -> None:
+        with self.outputLock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, input: t.TextIO = sys.stdin) -> None:
+        for line in input:
+            if(not self.handle(line)):
+                return
+
+        # end of input, lets a piped go command finish
+        self.wait()
+        self._closeSMP()
+
+    def handle(self, line: str) -> bool:
+        # returns False after quit
+        tokens: t.List[str] = line.split()
+
+        if(len(tokens) == 0):
+            return True
+
+        command: str = tokens[0]
+
+        if(command == 'uci'):
+            self.send(f'id name {self.NAME}')
+            self.send(f'id author {self.AUTHOR}')
+            self.send(f'option name Hash type spin default {self.DEFAULT_HASH} min 1 max {self.MAX_HASH}')
+            self.send(f'option name Threads type spin default 1 min 1 max {self.MAX_THREADS}')
+            self.send('uciok')
+        elif(command == 'isready'):
+            self.send('readyok')
+        elif(command == 'setoption'):
+            self.stopSearch()
+            self._setOption(tokens[1:])
+        elif(command == 'ucinewgame'):
+            self.stopSearch()
+
+            # killer moves, cached evaluations and pawn structures of the
+            # old game are dropped too, the Lazy SMP workers start from a
+            # new search anyway and only share the table
+            self.ns.clear()
+            if(self.smp != None):
+                self.smp.tt.clear()
+        elif(command == 'position'):
+            self.stopSearch()
+            self._setPosition(tokens[1:])
+        elif(command == 'go'):
+            self.stopSearch()
+            self._go(tokens[1:])
+        elif(command == 'stop'):
+            self.stopSearch()
+        elif(command == 'quit'):
+            self.stopSearch()
+            self._closeSMP()
+            return False
+
+        return True
+
+    def wait(self) -> None:
+        # blocks until the running search (if any) has sent its bestmove
+        if(self.searchThread != None):
+            self.searchThread.join()
+            self.searchThread = None
+
+    def stopSearch(self) -> None:
+        if(self.searchThread != None):
+            if(self.smp != None):
+                self.smp.stop()
+            else:
+                self.ns.stop()
+
+        self.wait()
+
+    def _closeSMP(self) -> None:
+        if(self.smp != None):
+            self.smp.close()
+            self.smp = None
+
+    def _setOption(self, tokens: t.List[str]) -> None:
+        # setoption name <name> value <value>
+        if('name' not in tokens or 'value' not in tokens):
+            return
+
+        name: str = ' '.join(tokens[(tokens.index('name') + 1):tokens.index('value')])
+        value: str = ' '.join(tokens[(tokens.index('value') + 1):])
+
+        try:
+            number: int = int(value)
+        except ValueError:
+            return
+
+        if(name.lower() == 'hash'):
+            self.hashSizeMB = max(1, min(number, self.MAX_HASH))
+        elif(name.lower() == 'threads'):
+            self.threads = max(1, min(number, self.MAX_THREADS))
+        else:
+            return
+
+        # a new table of the new size, searches with more than one thread
+        # use Lazy SMP with a table in shared memory
+        self._closeSMP()
+        if(self.threads > 1):
+            self.smp = LazySMP(self.MAX_DEPTH, self.threads, self.hashSizeMB)
+        else:
+            self.ns.tt = s.TranspositionTable(self.hashSizeMB)
+
+    def _setPosition(self, tokens: t.List[str]) -> None:
+        # position [startpos | fen <fen>] [moves <move> ...]
+        moves: t.List[str] = []
+        if('moves' in tokens):
+            moves = tokens[(tokens.index('moves') + 1):]
+            tokens = tokens[:tokens.index('moves')]
+
+        if(len(tokens) > 0 and tokens[0] == 'fen'):
+            board = chess.Board(' '.join(tokens[1:]))
+        else:
+            board = chess.Board()
+
+        for m in moves:
+            board.push_uci(m)
+
+        # the table is kept, positions of the same game share entries
+        self.board = board
+
+    def _go(self, tokens: t.List[str]) -> None:
+        maxDepth: int = self.MAX_DEPTH
+        limits: t.Dict[str, int] = {}
+
+        for i, token in enumerate(tokens):
+            if(i + 1 >= len(tokens)):
+                break
+
+            if(token == 'depth'):
+                maxDepth = int(tokens[i + 1])
+            elif(token in self.LIMITS):
+                limits[token] = int(tokens[i + 1])
+
+        # infinite: no limits, runs until stop
+        self.searchStart = time.perf_counter()
+        self.searchThread = threading.Thread(
+            target = self._search,
+            args = (self.board.copy(), maxDepth, limits),
+            daemon = True
+        )
+        self.searchThread.start()
+
+    def _search(self, board: chess.Board, maxDepth: int, limits: t.Dict[str, int]) -> None:
+        if(self.smp != None):
+            line = self.smp.search(board, maxDepth, self._info, **limits)
+        else:
+            line = self.ns.iterativeSearch(
+                board, maxDepth = maxDepth, infoCallback = self._info, **limits
+            )
+
+        if(len(line) == 0):
+            self.send('bestmove 0000')
+        elif(len(line) == 1):
+            self.send(f'bestmove {line[0][0].uci()}')
+        else:
+            self.send(f'bestmove {line[0][0].uci()} ponder {line[1][0].uci()}')
+
+    def _nodes(self) -> int:
+        searcher = self.smp if self.smp != None else self.ns
+        return searcher.nodes + searcher.qnodes
+
+    def _info(self, depth: int, line: t.List[t.Tuple[chess.Move, float]]) -> None:
+        elapsed: float = time.perf_counter() - self.searchStart
+        nodes: int = self._nodes()
+        nps: int = int(nodes / elapsed) if elapsed > 0 else 0
+        value: float = line[0][1] if len(line) > 0 else 0.0
+
+        # the search does not keep the distance to mate, the PV length is used
+        if(abs(value) >= u.FLOAT_MAX / 2):
+            moves: int = (len(line) + 1) // 2
+            score: str = f'mate {moves if value > 0 else -moves}'
+        else:
+            score: str = f'cp {int(round(value))}'
+
+        pv: str = ' '.join(m.uci() for m, _ in line)
+        self.send(
+            f'info depth {depth} score {score} nodes {nodes} nps {nps} '
+            f'time {int(elapsed * 1000)} pv {pv}'
+        )
+
+
+if __name__ == '__main__':
+    UCIEngine().run()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import time
+import typing as t
+
+import numpy as np
+from numpy.typing import NDArray
+
+import simpleGA as ga
+from testfunctions import FunctionND, FUNCTIONS_ND
+
+# Throughput of the optimizers of simpleGA on the FunctionND suite:
+# evaluations per second and the number of evaluations until the best
+# point is within target of the optimum, for every function, dimension
+# and optimizer.
+
+
+class CountingFitness:
+    # Wraps a FunctionND, counts the evaluated points and remembers after
+    # how many evaluations the error first got to target. The points are
+    # evaluated by evaluator if given.
+    def __init__(self, function: FunctionND, target: float, evaluator: ga.Evaluator = None) -> None:
+        self.function: FunctionND = function
+        self.target: float = target
+        self.evaluator: t.Union[ga.Evaluator, None] = evaluator
+
+        self.evaluations: int = 0
+        self.bestError: float = np.inf
+        self.evaluationsToTarget: t.Union[int, None] = None
+
+    def evaluatePopulation(self, v: NDArray[np.float64]) -> NDArray[np.float64]:
+        fitness: NDArray[np.float64] = self.function.evaluatePopulation(v) if self.evaluator == None \
+            else self.evaluator.evaluatePopulation(v)
+        errors: NDArray[np.float64] = self.function.error(fitness)
+
+        if(self.evaluationsToTarget == None):
+            hits: NDArray[np.int64] = np.flatnonzero(errors <= self.target)
+            if(len(hits) > 0):
+                self.evaluationsToTarget = self.evaluations + int(hits[0]) + 1
+
+        if(len(errors) > 0):
+            self.bestError = min(self.bestError, float(errors.min()))
+
+        self.evaluations += len(v)
+        return fitness
+
+    def evaluateSingle(self, v: NDArray[np.float64]) -> np.float64:
+        return self.evaluatePopulation(np.asarray(v)[None, :])[0]
+
+
+def _listGA(fitness: CountingFitness, orgData: t.Dict, popSize: int, mutationRate: float, seed: int) -> t.Callable:
+    opt = ga.GeneticAlgorithm.initRandomPop(popSize, orgData, fitness, mutationRate = mutationRate)
+
+    def step() -> None:
+        parents, _ = opt.selection()
+        children = opt.crossover(parents)
+        opt.mutation(children)
+        opt.updateOrgList(parents, children)
+
+    return step
+
+def _vectorGA(fitness: CountingFitness, orgData: t.Dict, popSize: int, mutationRate: float, seed: int) -> t.Callable:
+    opt = ga.VectorGeneticAlgorithm.initRandomPop(popSize, orgData, fitness, mutationRate = mutationRate, seed = seed)
+    return opt.generation
+
+def _listDE(fitness: CountingFitness, orgData: t.Dict, popSize: int, mutationRate: float, seed: int) -> t.Callable:
+    opt = ga.DifferentialEvolution.initRandomPop(popSize, orgData, fitness, p = 0.9, w = 0.5)
+    return opt.crossover
+
+def _vectorDE(fitness: CountingFitness, orgData: t.Dict, popSize: int, mutationRate: float, seed: int) -> t.Callable:
+    opt = ga.VectorDifferentialEvolution.initRandomPop(popSize, orgData, fitness, p = 0.9, w = 0.5, seed = seed)
+    return opt.crossover
+
+# name -> (optimizer keeps the higher fitness, factory of a generation step)
+# the list based optimizers use the unseeded module generator of simpleGA
+OPTIMIZERS: t.Dict[str, t.Tuple[bool, t.Callable]] = {
+    'ga': (False, _listGA),
+    'vga': (False, _vectorGA),
+    'de': (True, _listDE),
+    'vde': (True, _vectorDE)
+}
+
+
+def runOptimizer(
+    optimizer: str,
+    functionClass: t.Type[FunctionND],
+    dim: int,
+    popSize: int = 100,
+    generations: int = 200,
+    target: float = 1e-2,
+    mutation: float = 0.02,
+    shifted: bool = True,
+    rotate: bool = False,
+    seed: int = 0,
+    backend: str = None,
+    **evaluatorArgs
+    ) -> t.Dict:
+
+    # mutation: mutation rate of the GAs as a fraction of the bound
+    # backend: evaluator of simpleGA.EVALUATORS for the points, with
+    # evaluatorArgs (workers, batchSize), None evaluates in place
+    maximize, factory = OPTIMIZERS[optimizer]
+    function: FunctionND = functionClass.shiftedRotated(dim, seed, rotate, maximize) if shifted \
+        else functionClass(dim, maximize = maximize)
+
+    evaluator: t.Union[ga.Evaluator, None] = None
+    if(backend != None):
+        fitnessFactory = functools.partial(functionClass, dim, function.shift, function.rotation, maximize)
+        evaluator = ga.makeEvaluator(backend, fitnessFactory, **evaluatorArgs)
+
+    fitness = CountingFitness(function, target, evaluator)
+    orgData: t.Dict = {'len': dim, 'min': -function.bound, 'max': function.bound}
+    step: t.Callable = factory(fitness, orgData, popSize, mutation * function.bound, seed)
+
+    try:
+        start: float = time.perf_counter()
+        for _ in range(generations):
+            step()
+        elapsed: float = time.perf_counter() - start
+    finally:
+        if(evaluator != None):
+            evaluator.close()
+
+    return {
+        'function': function.graphtitle,
+        'optimizer': optimizer,
+        'evaluations': fitness.evaluations,
+        'evalsPerSecond': fitness.evaluations / max(elapsed, 1e-9),
+        'bestError': fitness.bestError,
+        'evaluationsToTarget': fitness.evaluationsToTarget,
+        'time': elapsed
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Optimizer throughput on the FunctionND suite')
+    parser.add_argument('--functions', nargs = '+', default = list(FUNCTIONS_ND), choices = list(FUNCTIONS_ND))
+    parser.add_argument('--dims', nargs = '+', type = int, default = [2, 10, 25])
+    parser.add_argument('--optimizers', nargs = '+', default = list(OPTIMIZERS), choices = list(OPTIMIZERS))
+    parser.add_argument('--popsize', type = int, default = 100)
+    parser.add_argument('--generations', type = int, default = 200)
+    parser.add_argument('--target', type = float, default = 1e-2, help = 'error counted as reaching the optimum')
+    parser.add_argument('--mutation', type = float, default = 0.02, help = 'GA mutation rate as a fraction of the bound')
+    parser.add_argument('--unshifted', action = 'store_true')
+    parser.add_argument('--rotate', action = 'store_true')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--backend', default = None, choices = list(ga.EVALUATORS), help = 'evaluator of the points')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--batchsize', type = int, default = 64)
+    args = parser.parse_args()
+
+    print(f'{"function":<18}{"optimizer":<10}{"evals":>10}{"evals/s":>12}{"best error":>14}{"evals to target":>17}')
+    for name in args.functions:
+        for dim in args.dims:
+            for optimizer in args.optimizers:
+                r = runOptimizer(
+                    optimizer, FUNCTIONS_ND[name], dim,
+                    popSize = args.popsize,
+                    generations = args.generations,
+                    target = args.target,
+                    mutation = args.mutation,
+                    shifted = not args.unshifted,
+                    rotate = args.rotate,
+                    seed = args.seed,
+                    backend = args.backend,
+                    workers = args.workers,
+                    batchSize = args.batchsize
+                )
+
+                toTarget: str = '-' if r['evaluationsToTarget'] == None else str(r['evaluationsToTarget'])
+                print(
+                    f'{r["function"]:<18}{r["optimizer"]:<10}{r["evaluations"]:>10}'
+                    f'{r["evalsPerSecond"]:>12.0f}{r["bestError"]:>14.4g}{toTarget:>17}'
+                )
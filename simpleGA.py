@@ -10,6 +10,16 @@ import matplotlib.pyplot as plt
 import typing as t
 import tqdm as bar
 
+import collections
+import concurrent.futures as cf
+from abc import ABC, abstractmethod
+import multiprocessing as mp
+import threading
+import time
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import wait
+
 from testfunctions import ShafferF62D, Function2D, ValueOutOFRange, Rastrigin2D 
 import animations as a
 
@@ -47,6 +57,21 @@ class Organism:
 
         return Organism(childChrom)
   
+def evaluatePopulation(fitFunc: Function2D, chromosomes: np.ndarray) -> np.ndarray:
+    # fitness of every row of chromosomes, in one call if the fitness
+    # function has a batched evaluatePopulation
+    if(hasattr(fitFunc, 'evaluatePopulation')):
+        return np.asarray(fitFunc.evaluatePopulation(chromosomes), dtype = np.float64)
+
+    fitness: np.ndarray = np.empty(len(chromosomes), dtype = np.float64)
+    for i, c in enumerate(chromosomes):
+        try:
+            fitness[i] = fitFunc.evaluateSingle(c)
+        except ValueOutOFRange:
+            fitness[i] = np.finfo('float32').min
+
+    return fitness
+
 class Population:
     
     def __init__(self, 
@@ -83,11 +108,9 @@ class Population:
 
    
     def truncationSelection(self, topCount: int) -> (t.List, t.List):
-        for o in self.orgList:
-            try:
-                o.fitness = self.fitFunc.evaluateSingle(o.chromosome)
-            except ValueOutOFRange:
-                o.fitness = np.finfo('float32').min
+        fitness: np.ndarray = evaluatePopulation(self.fitFunc, np.stack([o.chromosome for o in self.orgList]))
+        for o, f in zip(self.orgList, fitness):
+            o.fitness = f
         
         s = sorted(self.orgList, key = lambda o : o.fitness)
         parents = s[:topCount] 
@@ -104,6 +127,59 @@ class Population:
            
         return out 
 
+class VectorPopulation:
+    # Population stored as one (popSize, chromLen) array of chromosomes
+    # and a fitness vector, a generation costs a few NumPy calls instead
+    # of a Python iteration per organism.
+
+    def __init__(self,
+            chromosomes: np.ndarray = None,
+            fitness: Function2D = None
+            ) -> None:
+
+        self.chromosomes: np.ndarray = np.asarray(chromosomes, dtype = np.float64)
+        self.fitness: np.ndarray = np.zeros(len(self.chromosomes), dtype = np.float64)
+        self.fitFunc: Function2D = fitness
+
+    @property
+    def popSize(self) -> int:
+        return len(self.chromosomes)
+
+    @classmethod
+    def initFromRandomOrgs(cls,
+            popSize: int = 100,
+            orgData: t.Dict = {
+                'len': 2,
+                'min': np.finfo('float32').min,
+                'max': np.finfo('float32').max
+                },
+            fitness: Function2D = None,
+            generator: np.random.Generator = None
+            ) -> VectorPopulation:
+
+        generator = generator if generator != None else rng
+        chromosomes: np.ndarray = generator.uniform(
+                size = (popSize, orgData['len']),
+                low = orgData['min'],
+                high = orgData['max'])
+
+        return cls(chromosomes, fitness)
+
+    def evaluate(self) -> np.ndarray:
+        self.fitness = evaluatePopulation(self.fitFunc, self.chromosomes)
+        return self.fitness
+
+    def truncationSelection(self, topCount: int) -> (np.ndarray, np.ndarray):
+        # lowest fitness first, like Population.truncationSelection
+        self.evaluate()
+        order: np.ndarray = np.argsort(self.fitness, kind = 'stable')
+
+        return self.chromosomes[order[:topCount]], self.chromosomes[order[topCount:]]
+
+    def updateOrgList(self, parents: np.ndarray, children: np.ndarray):
+        self.chromosomes = np.concatenate((parents, children))
+        self.fitness = np.zeros(len(self.chromosomes), dtype = np.float64)
+
 class GeneticAlgorithm():  
     # kwarg: selectPer, interpolFac, mutationRate  
     def __init__(self, 
@@ -161,6 +237,67 @@ class GeneticAlgorithm():
         self.population.updateOrgList(parentsList, childrenList)
 
 
+class VectorGeneticAlgorithm(GeneticAlgorithm):
+    # GeneticAlgorithm over a VectorPopulation, parents and children are
+    # (n, chromLen) arrays and crossover and mutation are whole-array
+    # operations.
+    # kwarg: selectPer, interpolFac, mutationRate,
+    #        seed or generator: random numbers of the algorithm
+
+    def __init__(self,
+            population: VectorPopulation = None, **kwargs
+            ) -> None:
+
+        seed: t.Union[int, None] = kwargs.pop('seed', None)
+        generator: np.random.Generator = kwargs.pop('generator', None)
+        super().__init__(population, **kwargs)
+
+        if(generator == None):
+            generator = rng if seed == None else np.random.default_rng(seed)
+
+        self.rng: np.random.Generator = generator
+
+    @classmethod
+    def initRandomPop(cls,
+            popSize: int = 100,
+            orgData: t.Dict = {
+                'len': 2,
+                'min': np.finfo('float32').min,
+                'max': np.finfo('float32').max
+                },
+            fitness: Function2D = None,
+            **kwargs,
+            ) -> VectorGeneticAlgorithm:
+
+        seed: t.Union[int, None] = kwargs.pop('seed', None)
+        generator: np.random.Generator = kwargs.pop('generator', None)
+        if(generator == None):
+            generator = rng if seed == None else np.random.default_rng(seed)
+
+        p = VectorPopulation.initFromRandomOrgs(popSize, orgData, fitness, generator)
+
+        return cls(p, generator = generator, **kwargs)
+
+    def crossover(self, parents: np.ndarray) -> np.ndarray:
+        numChildren: int = self.population.popSize - self.k
+        pairs: np.ndarray = self.rng.integers(low = 0, high = len(parents), size = (numChildren, 2))
+
+        return parents[pairs[:, 0]] * self.interpolFac + (1 - self.interpolFac) * parents[pairs[:, 1]]
+
+    def mutation(self, children: np.ndarray):
+        children += self.rng.normal(loc = 0, scale = self.mutRate, size = children.shape)
+
+    def generation(self) -> (np.ndarray, np.ndarray):
+        # one selection, crossover and mutation step, returns the parents
+        # and the rejected organisms of the generation
+        parents, rejected = self.selection()
+        children = self.crossover(parents)
+        self.mutation(children)
+        self.updateOrgList(parents, children)
+
+        return parents, rejected
+
+
 class DifferentialEvolution():
 
     # kwargs: p: crossover probability
@@ -215,19 +352,432 @@ class DifferentialEvolution():
                 else:
                     new[i] = x[i]
             
-            try:
-                newfitness = self.population.fitFunc.evaluateSingle(new)
-            except ValueOutOFRange: 
-                newfitness = np.finfo('float32').min
-
-            try:
-                oldfitness = self.population.fitFunc.evaluateSingle(x) 
-            except ValueOutOFRange: 
-                oldfitness = np.finfo('float32').min
+            newfitness, oldfitness = evaluatePopulation(self.population.fitFunc, np.stack([new, x]))
 
             if(newfitness > oldfitness):
                 o.chromosome = new
 
+
+class VectorDifferentialEvolution(DifferentialEvolution):
+    # DE/rand/1/bin over a VectorPopulation: donors, crossover mask and
+    # trial fitness are computed for the whole population at once, and
+    # the fitness of the parents is kept between generations.
+    # kwargs: p, w, n as in DifferentialEvolution,
+    #         seed or generator: random numbers of the algorithm
+
+    def __init__(self, population: VectorPopulation = None, **kwargs):
+        seed: t.Union[int, None] = kwargs.pop('seed', None)
+        generator: np.random.Generator = kwargs.pop('generator', None)
+        super().__init__(population, **kwargs)
+
+        if(generator == None):
+            generator = rng if seed == None else np.random.default_rng(seed)
+
+        self.rng: np.random.Generator = generator
+        self.fitness: t.Union[np.ndarray, None] = None
+
+    @classmethod
+    def initRandomPop(cls, popSize: int = 100,
+            orgData: t.Dict = {
+                'len': 2,
+                'min': np.finfo('float32').min,
+                'max': np.finfo('float32').max
+                },
+            fitness: Function2D = None, **kwargs):
+
+        seed: t.Union[int, None] = kwargs.pop('seed', None)
+        generator: np.random.Generator = kwargs.pop('generator', None)
+        if(generator == None):
+            generator = rng if seed == None else np.random.default_rng(seed)
+
+        p = VectorPopulation.initFromRandomOrgs(popSize, orgData, fitness, generator)
+
+        return cls(p, n = orgData['len'], generator = generator, **kwargs)
+
+    def resetFitness(self) -> None:
+        # to be called when the chromosomes are changed from outside
+        self.fitness = None
+
+    def donorIndices(self, count: int = 3) -> np.ndarray:
+        # (popSize, count) distinct indices per organism, none of them
+        # the organism itself
+        popSize: int = self.population.popSize
+        if(popSize <= count):
+            raise ValueError(f'population of {popSize} is too small for {count} donors')
+
+        excluded: np.ndarray = np.arange(popSize)[:, None]
+        for k in range(count):
+            # uniform over the indices not taken yet: draw among the
+            # remaining ones and step over the excluded ones in order
+            r: np.ndarray = self.rng.integers(low = 0, high = popSize - 1 - k, size = popSize)
+            for e in np.sort(excluded, axis = 1).T:
+                r += r >= e
+
+            excluded = np.concatenate((excluded, r[:, None]), axis = 1)
+
+        return excluded[:, 1:]
+
+    def crossover(self, count: int = 3) -> None:
+        x: np.ndarray = self.population.chromosomes
+        if(self.fitness is None or len(self.fitness) != len(x)):
+            self.fitness = evaluatePopulation(self.population.fitFunc, x)
+
+        donors: np.ndarray = self.donorIndices(count)
+        z: np.ndarray = x[donors[:, 0]] + self.w * (x[donors[:, 1]] - x[donors[:, 2]])
+
+        # binomial crossover, one gene per organism always from z
+        mask: np.ndarray = self.rng.uniform(size = x.shape) <= self.p
+        mask[np.arange(len(x)), self.rng.integers(low = 0, high = self.n, size = len(x))] = True
+        trial: np.ndarray = np.where(mask, z, x)
+
+        trialFitness: np.ndarray = evaluatePopulation(self.population.fitFunc, trial)
+        better: np.ndarray = trialFitness > self.fitness
+
+        x[better] = trial[better]
+        self.fitness[better] = trialFitness[better]
+        self.population.fitness = self.fitness
+
+# Evaluator backends: fitness objects with evaluatePopulation that split
+# the chromosomes in batches and evaluate them serially, on threads, on a
+# process pool or on a pool of worker processes. They are built from a
+# picklable fitnessFactory called once per worker, so that every worker
+# keeps its own warm fitness (engine, dataset), e.g.
+#     functools.partial(MoveMatchFitness.load, 'dataset.csv')
+# and are used as the fitness of a population:
+#     VectorPopulation.initFromRandomOrgs(100, orgData, ProcessEvaluator(factory))
+# Every batch lands at its own rows, so for a deterministic fitness the
+# result does not depend on the backend, the number of workers or on
+# retries, and a seeded optimizer gives the same run on every backend.
+
+class Evaluator(ABC):
+    def __init__(self, fitnessFactory: t.Callable, batchSize: int = 64) -> None:
+        self.fitnessFactory: t.Callable = fitnessFactory
+        self.batchSize: int = max(1, batchSize)
+
+    def batches(self, n: int) -> t.List[t.Tuple[int, int]]:
+        return [(start, min(start + self.batchSize, n)) for start in range(0, n, self.batchSize)]
+
+    @abstractmethod
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        pass
+
+    def evaluateSingle(self, v: np.ndarray) -> float:
+        return self.evaluatePopulation(np.asarray(v)[None, :])[0]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> Evaluator:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class SerialEvaluator(Evaluator):
+    def __init__(self, fitnessFactory: t.Callable, batchSize: int = 64) -> None:
+        super().__init__(fitnessFactory, batchSize)
+        self.fitness = fitnessFactory()
+
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        chromosomes = np.asarray(chromosomes, dtype = np.float64)
+        out: np.ndarray = np.empty(len(chromosomes), dtype = np.float64)
+        for start, stop in self.batches(len(chromosomes)):
+            out[start:stop] = evaluatePopulation(self.fitness, chromosomes[start:stop])
+
+        return out
+
+class ThreadEvaluator(Evaluator):
+    # One fitness per thread, useful when the fitness releases the GIL
+    # (NumPy, an external engine). Threads cannot be stopped, so there is
+    # no straggler timeout.
+    def __init__(self, fitnessFactory: t.Callable, workers: int = None, batchSize: int = 64) -> None:
+        super().__init__(fitnessFactory, batchSize)
+        self.local = threading.local()
+        self.pool = cf.ThreadPoolExecutor(workers)
+
+    def _evaluateBatch(self, chromosomes: np.ndarray) -> np.ndarray:
+        if(not hasattr(self.local, 'fitness')):
+            self.local.fitness = self.fitnessFactory()
+
+        return evaluatePopulation(self.local.fitness, chromosomes)
+
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        chromosomes = np.asarray(chromosomes, dtype = np.float64)
+        out: np.ndarray = np.empty(len(chromosomes), dtype = np.float64)
+        futures = {self.pool.submit(self._evaluateBatch, chromosomes[start:stop]): (start, stop)
+            for start, stop in self.batches(len(chromosomes))}
+
+        for f in cf.as_completed(futures):
+            start, stop = futures[f]
+            out[start:stop] = f.result()
+
+        return out
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+_workerFitness = None
+
+def _initEvaluatorWorker(fitnessFactory: t.Callable) -> None:
+    global _workerFitness
+    _workerFitness = fitnessFactory()
+
+def _evaluateWorkerBatch(chromosomes: np.ndarray) -> np.ndarray:
+    return evaluatePopulation(_workerFitness, chromosomes)
+
+class _TrackingContext:
+    # multiprocessing context that keeps the processes started through
+    # it, so that the workers of a pool can be killed
+    def __init__(self, context) -> None:
+        self.context = context
+        self.processes: t.List[mp.Process] = []
+
+    def Process(self, *args, **kwargs) -> mp.Process:
+        process = self.context.Process(*args, **kwargs)
+        self.processes.append(process)
+        return process
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(self.context, name)
+
+class ProcessEvaluator(Evaluator):
+    # Batches on a concurrent.futures process pool. If a worker dies (also
+    # between calls), or the batches of a call take longer than timeout
+    # seconds, the pool is restarted and the unfinished batches are
+    # submitted again, at most retries times. Errors raised by the fitness
+    # are not retried.
+    def __init__(self,
+            fitnessFactory: t.Callable,
+            workers: int = None,
+            batchSize: int = 64,
+            timeout: float = None,
+            retries: int = 2) -> None:
+
+        super().__init__(fitnessFactory, batchSize)
+        self.workers: int = workers
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.restarts: int = 0
+        self.context: _TrackingContext = None
+        self.futures: t.Dict[cf.Future, t.Tuple[int, int]] = {}
+        self.pool: cf.ProcessPoolExecutor = self._startPool()
+
+    def _startPool(self) -> cf.ProcessPoolExecutor:
+        self.context = _TrackingContext(mp.get_context())
+        return cf.ProcessPoolExecutor(self.workers,
+                mp_context = self.context,
+                initializer = _initEvaluatorWorker,
+                initargs = (self.fitnessFactory,))
+
+    def _restartPool(self) -> None:
+        # hung workers would keep shutdown waiting, they are killed first
+        for process in self.context.processes:
+            if(process.is_alive()):
+                process.terminate()
+
+        self._cancel()
+        self.pool.shutdown(wait = False)
+        self.pool = self._startPool()
+        self.restarts += 1
+
+    def _cancel(self) -> None:
+        # shutdown(cancel_futures = True) needs Python 3.9
+        for f in self.futures:
+            f.cancel()
+
+        self.futures = {}
+
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        chromosomes = np.asarray(chromosomes, dtype = np.float64)
+        out: np.ndarray = np.empty(len(chromosomes), dtype = np.float64)
+        remaining: t.List[t.Tuple[int, int]] = self.batches(len(chromosomes))
+
+        for attempt in range(self.retries + 1):
+            try:
+                # a worker that died since the last call breaks the pool
+                # already on submit
+                for start, stop in remaining:
+                    self.futures[self.pool.submit(_evaluateWorkerBatch, chromosomes[start:stop])] = (start, stop)
+
+                for f in cf.as_completed(self.futures, timeout = self.timeout):
+                    start, stop = self.futures[f]
+                    out[start:stop] = f.result()
+                    remaining.remove((start, stop))
+
+                self.futures = {}
+                return out
+            except (BrokenProcessPool, cf.TimeoutError):
+                self._restartPool()
+            except BaseException:
+                # error of the fitness, the other batches are not needed
+                self._cancel()
+                raise
+
+        raise RuntimeError(f'{len(remaining)} batches failed after {self.retries} retries')
+
+    def close(self) -> None:
+        self._cancel()
+        self.pool.shutdown()
+
+def _poolWorker(conn, fitnessFactory: t.Callable) -> None:
+    fitness = fitnessFactory()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+
+        if(message is None):
+            break
+
+        try:
+            conn.send(('ok', evaluatePopulation(fitness, message)))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+class WorkerPoolEvaluator(Evaluator):
+    # Pool of long lived worker processes, each connected to this process
+    # by a socket pair (multiprocessing.Pipe) and fed one batch at a time.
+    # A worker that dies or takes longer than timeout seconds on a batch
+    # is killed and replaced, and its batch is queued again, at most
+    # retries times per batch. Errors raised by the fitness are raised here.
+    def __init__(self,
+            fitnessFactory: t.Callable,
+            workers: int = None,
+            batchSize: int = 64,
+            timeout: float = None,
+            retries: int = 2) -> None:
+
+        super().__init__(fitnessFactory, batchSize)
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.restarts: int = 0
+        self.workers: t.List[t.Tuple[mp.Process, t.Any]] = \
+            [self._spawn() for _ in range(workers if workers != None else os.cpu_count())]
+
+    def _spawn(self) -> t.Tuple[mp.Process, t.Any]:
+        conn, childConn = mp.Pipe()
+        process = mp.Process(target = _poolWorker, args = (childConn, self.fitnessFactory), daemon = True)
+        process.start()
+        childConn.close()
+
+        return process, conn
+
+    def _replace(self, i: int) -> None:
+        process, conn = self.workers[i]
+        process.terminate()
+        process.join()
+        conn.close()
+
+        self.workers[i] = self._spawn()
+        self.restarts += 1
+
+    def evaluatePopulation(self, chromosomes: np.ndarray) -> np.ndarray:
+        chromosomes = np.asarray(chromosomes, dtype = np.float64)
+        out: np.ndarray = np.empty(len(chromosomes), dtype = np.float64)
+
+        pending = collections.deque(self.batches(len(chromosomes)))
+        failures: t.Dict[t.Tuple[int, int], int] = collections.defaultdict(int)
+        busy: t.Dict[int, t.Tuple[t.Tuple[int, int], float]] = {}   # worker -> (batch, start time)
+
+        def fail(i: int) -> None:
+            batch, _ = busy.pop(i)
+            self._replace(i)
+
+            failures[batch] += 1
+            if(failures[batch] > self.retries):
+                raise RuntimeError(f'batch {batch} failed after {self.retries} retries')
+
+            pending.appendleft(batch)
+
+        try:
+            while(len(pending) > 0 or len(busy) > 0):
+                for i, (_, conn) in enumerate(self.workers):
+                    if(i not in busy and len(pending) > 0):
+                        start, stop = pending.popleft()
+                        busy[i] = ((start, stop), time.monotonic())
+
+                        # the worker may have died since the last call
+                        try:
+                            conn.send(chromosomes[start:stop])
+                        except (BrokenPipeError, OSError):
+                            fail(i)
+
+                if(len(busy) == 0):
+                    continue
+
+                waitTimeout: t.Union[float, None] = None
+                if(self.timeout != None):
+                    oldest: float = min(started for _, started in busy.values())
+                    waitTimeout = max(0.0, oldest + self.timeout - time.monotonic())
+
+                handles = [self.workers[i][1] for i in busy] + [self.workers[i][0].sentinel for i in busy]
+                ready = wait(handles, waitTimeout)
+
+                for i in list(busy):
+                    process, conn = self.workers[i]
+                    (start, stop), started = busy[i]
+
+                    if(conn in ready):
+                        try:
+                            status, result = conn.recv()
+                        except (EOFError, OSError):
+                            fail(i)
+                            continue
+
+                        if(status == 'error'):
+                            busy.pop(i)
+                            raise RuntimeError(f'fitness raised in a worker:\n{result}')
+
+                        out[start:stop] = result
+                        busy.pop(i)
+                    elif(process.sentinel in ready or
+                            (self.timeout != None and time.monotonic() - started >= self.timeout)):
+                        fail(i)
+        except BaseException:
+            # the results still owed by the other workers would be read by
+            # the next call
+            for i in list(busy):
+                busy.pop(i)
+                self._replace(i)
+
+            raise
+
+        return out
+
+    def close(self) -> None:
+        for process, conn in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+
+        for process, conn in self.workers:
+            process.join(timeout = 1.0)
+            if(process.is_alive()):
+                process.terminate()
+
+            conn.close()
+
+        self.workers = []
+
+EVALUATORS: t.Dict[str, t.Type[Evaluator]] = {
+    'serial': SerialEvaluator,
+    'threads': ThreadEvaluator,
+    'processes': ProcessEvaluator,
+    'workers': WorkerPoolEvaluator
+}
+
+def makeEvaluator(backend: str, fitnessFactory: t.Callable, **kwargs) -> Evaluator:
+    # kwargs: workers, batchSize, timeout, retries as taken by the backend
+    if(backend == 'serial'):
+        kwargs.pop('workers', None)
+    if(backend in ['serial', 'threads']):
+        kwargs.pop('timeout', None)
+        kwargs.pop('retries', None)
+
+    return EVALUATORS[backend](fitnessFactory, **kwargs)
+
 def GA():
     sf = ShafferF62D(xshift = np.float32(30.0), yshift = np.float32(-30.0))
 
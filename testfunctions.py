@@ -65,6 +65,22 @@ class Function2D(ABC):
             raise ValueOutOFRange(axis)
 
         return self._func(x, y)
+
+    def evaluatePopulation(self, 
+            v: NDArray[np.float32], 
+            penalty: np.float32 = np.finfo('float32').min) -> NDArray[np.float64]:
+        # fitness of every row of the (n, 2) array v in one pass, rows out
+        # of range get penalty instead of raising ValueOutOFRange
+        v = np.asarray(v)
+        x: NDArray[np.float32] = v[:, 0]
+        y: NDArray[np.float32] = v[:, 1]
+
+        inRange: NDArray[np.bool_] = (self.xmin <= x) & (x <= self.xmax) & (self.ymin <= y) & (y <= self.ymax)
+
+        fitness: NDArray[np.float64] = np.full(len(v), penalty, dtype = np.float64)
+        fitness[inRange] = self._func(x[inRange], y[inRange])
+
+        return fitness
  
     def show(self, ax = None) -> None:
         x: NDArray[np.float32] = np.linspace(self.xmin, self.xmax, self.xiter) 
@@ -154,8 +170,8 @@ class ShafferF62D(Function2D):
         super().__init__(xshift, yshift, xiter, yiter)
         
     def _func(self, x: NDArray[np.float32], y: NDArray[np.float32]) -> NDArray[np.float32]:
-        x += self.xshift
-        y += self.yshift
+        x = x + self.xshift
+        y = y + self.yshift
 
         return 0.5 + ((np.sin(np.sqrt(x**2 + y**2)))**2 - 0.5)/((1 + 0.001 * (x**2 + y**2))**2)
 
@@ -167,12 +183,183 @@ class Rastrigin2D(Function2D):
     graphtitle = 'Rastrigin - 2D'
        
     def _func(self, x: NDArray[np.float32], y: NDArray[np.float32]) -> NDArray[np.float32]:
-        x += self.xshift
-        y += self.yshift
+        x = x + self.xshift
+        y = y + self.yshift
 
         return ((x**2 - 10.0 * np.cos(2.0 * np.pi * x)) + (y**2 - 10.0 * np.cos(2.0 * np.pi * y)) + 20.0) * -1.0
 
 
+def randomRotation(dim: int, generator: np.random.Generator = None) -> NDArray[np.float64]:
+    # uniformly distributed orthogonal matrix (QR of a gaussian matrix)
+    generator = generator if generator is not None else np.random.default_rng()
+    q, r = np.linalg.qr(generator.normal(size = (dim, dim)))
+
+    return q * np.sign(np.diag(r))
+
+
+class FunctionND(ABC):
+    # Benchmark function of any dimension, minimized at optimum with the
+    # value optimumValue. Points are evaluated at z = R(x - shift), so a
+    # shift moves the optimum and a rotation makes the function
+    # non-separable. maximize negates the values, for the optimizers that
+    # keep the higher fitness (DifferentialEvolution).
+    _bound = np.float64(100.0)      # every coordinate in [-bound, bound]
+    _optimumZ = np.float64(0.0)     # optimum coordinate before shift/rotation
+    _optimumValue = np.float64(0.0)
+    _graphtitle = '-x-'
+
+    def __init__(self,
+            dim: int = 2,
+            shift: NDArray[np.float64] = None,
+            rotation: NDArray[np.float64] = None,
+            maximize: bool = False) -> None:
+
+        self.dim: int = dim
+        self.shift: NDArray[np.float64] = np.zeros(dim) if shift is None else np.asarray(shift, dtype = np.float64)
+        self.rotation: t.Union[NDArray[np.float64], None] = rotation
+        self.maximize: bool = maximize
+
+        if(not np.all(np.abs(self.optimum) <= self.bound)):
+            raise ValueError(f'the optimum of {self.graphtitle} is out of the bounds after the shift and rotation')
+
+    @classmethod
+    def shiftedRotated(cls,
+            dim: int = 2,
+            seed: int = None,
+            rotate: bool = True,
+            maximize: bool = False) -> 'FunctionND':
+        # optionally a random rotation and a random shift of the (rotated)
+        # optimum by at most half of its distance to the bounds
+        generator: np.random.Generator = np.random.default_rng(seed)
+        u: NDArray[np.float64] = generator.uniform(-0.5, 0.5, size = dim)
+        rotation = randomRotation(dim, generator) if rotate else None
+
+        optimumZ: NDArray[np.float64] = np.full(dim, cls._optimumZ)
+        if(rotation is not None):
+            optimumZ = optimumZ @ rotation
+
+        return cls(dim, u * (cls._bound - np.abs(optimumZ)), rotation, maximize)
+
+    def transform(self, v: NDArray[np.float64]) -> NDArray[np.float64]:
+        z: NDArray[np.float64] = v - self.shift
+        return z if self.rotation is None else z @ self.rotation.T
+
+    def evaluatePopulation(self,
+            v: NDArray[np.float64],
+            penalty: np.float64 = None) -> NDArray[np.float64]:
+        # fitness of every row of the (n, dim) array v, rows out of range get
+        # penalty, by default the worst float32 for the direction
+        v = np.asarray(v, dtype = np.float64)
+        inRange: NDArray[np.bool_] = np.all(np.abs(v) <= self.bound, axis = 1)
+
+        if(penalty is None):
+            penalty = np.finfo('float32').min if self.maximize else np.finfo('float32').max
+
+        fitness: NDArray[np.float64] = np.full(len(v), penalty, dtype = np.float64)
+        values: NDArray[np.float64] = self._func(self.transform(v[inRange]))
+        fitness[inRange] = -values if self.maximize else values
+
+        return fitness
+
+    def evaluateSingle(self, v: NDArray[np.float64]) -> np.float64:
+        v = np.asarray(v, dtype = np.float64)
+        if(np.any(np.abs(v) > self.bound)):
+            raise ValueOutOFRange('x')
+
+        return self.evaluatePopulation(v[None, :])[0]
+
+    def error(self, fitness: NDArray[np.float64]) -> NDArray[np.float64]:
+        # distance of fitness values to the value at the optimum
+        values: NDArray[np.float64] = -fitness if self.maximize else fitness
+        return values - self.optimumValue
+
+    @abstractmethod
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        pass
+
+    @property
+    def bound(self) -> np.float64:
+        return self._bound
+
+    @property
+    def optimum(self) -> NDArray[np.float64]:
+        z: NDArray[np.float64] = np.full(self.dim, self._optimumZ)
+        return self.shift + (z if self.rotation is None else z @ self.rotation)
+
+    @property
+    def optimumValue(self) -> np.float64:
+        return self._optimumValue
+
+    @property
+    def graphtitle(self) -> str:
+        return f'{self._graphtitle} - {self.dim}D'
+
+class Sphere(FunctionND):
+    _bound = np.float64(5.12)
+    _graphtitle = 'Sphere'
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        return np.sum(z**2, axis = 1)
+
+class Rastrigin(FunctionND):
+    _bound = np.float64(5.12)
+    _graphtitle = 'Rastrigin'
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        return 10.0 * z.shape[1] + np.sum(z**2 - 10.0 * np.cos(2.0 * np.pi * z), axis = 1)
+
+class Rosenbrock(FunctionND):
+    _bound = np.float64(5.0)
+    _optimumZ = np.float64(1.0)
+    _graphtitle = 'Rosenbrock'
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        return np.sum(100.0 * (z[:, 1:] - z[:, :-1]**2)**2 + (1.0 - z[:, :-1])**2, axis = 1)
+
+class Ackley(FunctionND):
+    _bound = np.float64(32.768)
+    _graphtitle = 'Ackley'
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        return -20.0 * np.exp(-0.2 * np.sqrt(np.mean(z**2, axis = 1))) \
+            - np.exp(np.mean(np.cos(2.0 * np.pi * z), axis = 1)) + 20.0 + np.e
+
+class Griewank(FunctionND):
+    _bound = np.float64(600.0)
+    _graphtitle = 'Griewank'
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        i: NDArray[np.float64] = np.arange(1, z.shape[1] + 1)
+        return 1.0 + np.sum(z**2, axis = 1) / 4000.0 - np.prod(np.cos(z / np.sqrt(i)), axis = 1)
+
+class Schwefel(FunctionND):
+    # the optimum is near a corner, a rotation moves it out of the bounds
+    # so shiftedRotated only shifts
+    _bound = np.float64(500.0)
+    _optimumZ = np.float64(420.968746)
+    _graphtitle = 'Schwefel'
+
+    @classmethod
+    def shiftedRotated(cls,
+            dim: int = 2,
+            seed: int = None,
+            rotate: bool = True,
+            maximize: bool = False) -> 'FunctionND':
+        return super().shiftedRotated(dim, seed, False, maximize)
+
+    def _func(self, z: NDArray[np.float64]) -> NDArray[np.float64]:
+        return 418.9828872724339 * z.shape[1] - np.sum(z * np.sin(np.sqrt(np.abs(z))), axis = 1)
+
+FUNCTIONS_ND: t.Dict[str, t.Type[FunctionND]] = {
+    'sphere': Sphere,
+    'rastrigin': Rastrigin,
+    'rosenbrock': Rosenbrock,
+    'ackley': Ackley,
+    'griewank': Griewank,
+    'schwefel': Schwefel
+}
+
+
 
 if __name__ == '__main__':
     suppress_qt_warnings()